@@ -1,12 +1,9 @@
-from datetime import datetime, timedelta
 from typing import List, Any
-import csv
-from io import StringIO
 
 from sqladmin import ModelView, expose
 from wtforms import FileField, BooleanField
 from starlette.requests import Request
-from starlette.responses import Response, PlainTextResponse, HTMLResponse
+from starlette.responses import Response, PlainTextResponse, HTMLResponse, StreamingResponse
 
 import os
 from uuid import uuid4
@@ -14,29 +11,19 @@ from uuid import uuid4
 from models import Car, Dealership
 from backend_settings import settings
 from db import engine
-from sqlmodel import Session, select, func
-
-def _csv_response(filename: str, rows: List[dict]) -> Response:
-    buf = StringIO()
-    writer = csv.DictWriter(buf, fieldnames=list(rows[0].keys()) if rows else [])
-    writer.writeheader()
-    for r in rows:
-        writer.writerow(r)
-    return Response(
-        buf.getvalue(),
-        media_type="text/csv",
-        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
-    )
+import exports
+import rollups
+from sqlmodel import Session, select
 
 class CarAdmin(ModelView, model=Car):
     name = "Car"
     name_plural = "Cars"
     icon = "fa-solid fa-car"
 
-    column_list = [Car.id, Car.year, Car.make, Car.model, Car.dealership_id, Car.vin, Car.source, Car.url, Car.created_at]
-    column_sortable_list = [Car.year, Car.make, Car.model, Car.created_at, Car.source]
+    column_list = [Car.id, Car.year, Car.make, Car.model, Car.dealership_id, Car.vin, Car.source, Car.url, Car.posted_at]
+    column_sortable_list = [Car.year, Car.make, Car.model, Car.posted_at, Car.source]
     column_searchable_list = [Car.vin, Car.make, Car.model, Car.source]
-    column_default_sort = ("created_at", True)
+    column_default_sort = ("posted_at", True)
 
     column_formatters = {
         Car.url: lambda m, a: f'<a href="{m.url}" target="_blank">Open</a>' if m.url else "",
@@ -44,13 +31,13 @@ class CarAdmin(ModelView, model=Car):
         Car.dealership_id: lambda m, a: f'<span class="badge dealership">{m.dealership.name}</span>' if m.dealership else "",
     }
 
-    column_filters = [Car.source, Car.make, Car.year, Car.created_at, Car.dealership_id]
+    column_filters = [Car.source, Car.make, Car.year, Car.posted_at, Car.dealership_id]
 
     column_labels = {Car.dealership_id: "Dealership"}
 
     form_columns = [Car.vin, Car.year, Car.make_id, Car.model_id, Car.category_id, Car.trim, Car.price, Car.mileage, Car.currency,
                     Car.city, Car.state, Car.auction_status, Car.lot_number, Car.source, Car.url, Car.title, Car.image_url,
-                    Car.description, Car.seller_name, Car.seller_rating, Car.seller_reviews, Car.posted_at, Car.dealership_id]
+                    Car.seller_name, Car.seller_rating, Car.seller_reviews, Car.posted_at, Car.dealership_id]
     form_ajax_refs = {
         "dealership": {
             "fields": (Dealership.name,),
@@ -73,19 +60,14 @@ class CarAdmin(ModelView, model=Car):
     async def action_export_csv(self, ids: List[Any]) -> Response:
         if not ids:
             return PlainTextResponse("No rows selected.", status_code=400)
-        with Session(engine) as s:
-            items = s.exec(select(Car).where(Car.id.in_(ids))).all()
-        rows = [{
-            "id": str(i.id),
-            "year": i.year,
-            "make": i.make,
-            "model": i.model,
-            "vin": i.vin,
-            "source": i.source,
-            "url": i.url,
-            "created_at": i.created_at.isoformat() if getattr(i, "created_at", None) else ""
-        } for i in items]
-        return _csv_response("cars_export.csv", rows)
+        ids = [int(i) for i in ids]
+        cols = ["id", "year", "make", "model", "vin", "source", "url", "posted_at"]
+        where = f"cars.id IN ({', '.join(str(i) for i in ids)})"
+        return StreamingResponse(
+            exports.encode(exports.iter_rows(engine, cols, where), "csv", cols),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="cars_export.csv"'},
+        )
 
     async def action_delete_selected(self, ids: List[Any]) -> Response:
         if not ids:
@@ -149,11 +131,9 @@ class DashboardView(ModelView):
 
     @expose("/dashboard", methods=["GET"])
     async def dashboard(self, request: Request) -> HTMLResponse:
-        with Session(engine) as s:
-            total = s.exec(select(func.count()).select_from(Car)).one()
-            by_source = s.exec(select(Car.source, func.count()).group_by(Car.source)).all()
-            since = datetime.utcnow() - timedelta(days=7)
-            last7 = s.exec(select(func.count()).where(Car.created_at >= since)).one()
+        # Served from the trigger-maintained rollups, never a scan of cars.
+        with engine.connect() as conn:
+            stats = rollups.summary(conn, days=7)
 
         html = """
         <div class="kpi-grid">
@@ -168,11 +148,11 @@ class DashboardView(ModelView):
           </table>
         </div>
         """.format(
-            total=total or 0,
-            last7=last7 or 0,
+            total=stats["total"],
+            last7=stats["new_7d"],
             rows="".join(
                 f'<tr><td><span class="badge source {(src or "unknown").lower()}">{src or "unknown"}</span></td><td>{cnt}</td></tr>'
-                for src, cnt in by_source
+                for src, cnt in ((r["key"], r["cars"]) for r in stats["by_source"])
             )
         )
         return HTMLResponse(html)
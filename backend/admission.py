@@ -0,0 +1,181 @@
+"""Admission control: per-route-class concurrency budgets with load shedding.
+
+Sync endpoints run on a bounded threadpool.  Without a gate, a traffic spike
+queues every request behind every other one, and admin actions slow down
+with the public API.  ``AdmissionControl`` is an ASGI middleware that sorts
+requests into classes (``classify``).  Each class gets:
+
+* ``limit``: how many of its requests may run at once;
+* ``queue``: how many more may wait for a slot;
+* ``wait``: how long a waiter may wait, in seconds.
+
+A request that finds its queue full, or that waits past its deadline, gets
+an immediate 503 with ``Retry-After``.  Waiting longer would only make the
+client time out anyway.
+
+All classes also share ``total`` slots.  The last ``reserve`` of them are
+kept for priority-0 classes (admin).  When a slot frees up, waiters are
+served in priority order, then in arrival order.  State lives on the event
+loop, one ``Limiter`` per worker.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import math
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+
+@dataclass
+class RouteClass:
+    name: str
+    limit: int
+    queue: int
+    wait: float
+    priority: int = 1  # lower is served first; 0 may use the reserve
+
+
+# name -> priority
+PRIORITIES = {"admin": 0, "detail": 1, "list": 1, "import": 2}
+
+# Long-lived responses hold a slot for as long as they stream.  They are
+# bounded elsewhere, so they are not admitted here.
+UNGATED = ("/cars/stream", "/static/", "/uploads/", "/assets/")
+
+
+def classify(method: str, path: str) -> Optional[str]:
+    """The route class of a request, or ``None`` to let it through ungated."""
+    if path.startswith(UNGATED):
+        return None
+    if method == "POST" and (
+        path in ("/cars/bulk", "/admin/cars/import", "/admin/imports/run")
+        or (path.startswith("/admin/imports/") and path.endswith("/resume"))
+    ):
+        return "import"
+    if path == "/admin" or path.startswith("/admin/") or path == "/stats/runtime":
+        return "admin"
+    if path.startswith("/cars/"):
+        return "detail" if path[len("/cars/"):].isdigit() else "list"
+    if path in ("/cars", "/dealerships", "/public/settings", "/stats/summary") or path.startswith("/analytics/"):
+        return "list"
+    return None
+
+
+class Limiter:
+    def __init__(self, classes=(), total: int = 0, reserve: int = 0, retry_after: float = 1.0):
+        self.configure(classes, total, reserve, retry_after)
+
+    def configure(self, classes, total: int, reserve: int = 0, retry_after: float = 1.0) -> None:
+        self.classes = {c.name: c for c in classes}
+        self.total = total or sum(c.limit for c in self.classes.values())
+        self.reserve = reserve
+        self.retry_after = retry_after
+        self.in_use = 0
+        self.active = dict.fromkeys(self.classes, 0)
+        self.queued = dict.fromkeys(self.classes, 0)
+        self.shed = dict.fromkeys(self.classes, 0)
+        self._waiters: list = []  # (priority, arrival, name, future)
+        self._arrival = itertools.count()
+
+    def _fits(self, c: RouteClass) -> bool:
+        free = self.total - self.in_use
+        return self.active[c.name] < c.limit and free > (0 if c.priority == 0 else self.reserve)
+
+    def _take(self, c: RouteClass) -> None:
+        self.active[c.name] += 1
+        self.in_use += 1
+
+    async def acquire(self, name: str) -> bool:
+        """Take a slot for class ``name``; ``False`` means shed the request."""
+        c = self.classes[name]
+        # Every release hands freed slots to fitting waiters first, so a
+        # request that fits now is not jumping ahead of anyone.
+        if self._fits(c):
+            self._take(c)
+            return True
+        if self.queued[name] >= c.queue:
+            self.shed[name] += 1
+            return False
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (c.priority, next(self._arrival), name, fut))
+        self.queued[name] += 1
+        try:
+            return await asyncio.wait_for(fut, c.wait)
+        except asyncio.TimeoutError:
+            self.queued[name] -= 1
+            self.shed[name] += 1
+            return False
+        except asyncio.CancelledError:  # client went away
+            if fut.done() and not fut.cancelled():
+                self.release(name)  # granted just before the cancellation
+            else:
+                self.queued[name] -= 1
+            raise
+
+    def release(self, name: str) -> None:
+        self.active[name] -= 1
+        self.in_use -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        skipped = []
+        while self._waiters and self.in_use < self.total:
+            entry = heapq.heappop(self._waiters)
+            _, _, name, fut = entry
+            if fut.done():  # timed out
+                continue
+            c = self.classes[name]
+            if not self._fits(c):
+                skipped.append(entry)
+                continue
+            self._take(c)
+            self.queued[name] -= 1
+            fut.set_result(True)
+        for entry in skipped:
+            heapq.heappush(self._waiters, entry)
+
+    def stats(self) -> dict:
+        return {
+            name: {"active": self.active[name], "queued": self.queued[name], "shed": self.shed[name]}
+            for name in self.classes
+        }
+
+
+class AdmissionControl:
+    """ASGI middleware gating HTTP requests through a ``Limiter``.
+
+    A limiter without classes (before startup configured it) lets
+    everything through.
+    """
+
+    def __init__(self, app, limiter: Limiter, classify: Callable[[str, str], Optional[str]] = classify):
+        self.app = app
+        self.limiter = limiter
+        self.classify = classify
+
+    async def __call__(self, scope, receive, send):
+        name = None
+        if scope["type"] == "http":
+            name = self.classify(scope["method"], scope["path"])
+        if name not in self.limiter.classes:
+            return await self.app(scope, receive, send)
+        if not await self.limiter.acquire(name):
+            return await self._busy(send)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release(name)
+
+    async def _busy(self, send) -> None:
+        body = json.dumps({"detail": "Server busy, please retry"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(self.limiter.retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
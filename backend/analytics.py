@@ -0,0 +1,165 @@
+"""Market statistics per make/model/year, computed with NumPy.
+
+One SELECT pulls the few columns involved into arrays; grouping, the
+percentiles and the per-group price/mileage regressions are then vectorized
+(``lexsort`` + ``bincount``) instead of looping over cars or issuing a query
+per group.  Results are cached per catalog version (``MAX(car_changes.seq)``),
+so repeated dashboard loads cost one indexed lookup until the catalog
+changes.
+"""
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+QUANTILES = (0.1, 0.5, 0.9)
+MILEAGE_POINTS = (0, 10_000, 25_000, 50_000, 75_000, 100_000, 150_000, 200_000)
+CLOSED = ("SOLD", "RESERVE_NOT_MET", "ENDED")  # auctions that had their chance
+CACHE_SIZE = 64
+
+_cache: "OrderedDict[tuple, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def catalog_version(conn) -> int:
+    return conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM car_changes")).scalar()
+
+
+def _load(conn, where: str, args: dict):
+    rows = conn.execute(
+        text(
+            "SELECT make, model, year, price, mileage, auction_status FROM cars "
+            f"WHERE deleted_ts = 0 AND {where}"
+        ),
+        args,
+    ).all()
+    if not rows:
+        return None
+    make, model, year, price, mileage, status = zip(*rows)
+    as_float = lambda xs: np.array([np.nan if x is None else x for x in xs], dtype=float)
+    return {
+        "make": np.array([(m or "").strip() for m in make], dtype=object),
+        "model": np.array([(m or "").strip() for m in model], dtype=object),
+        "year": np.array([-1 if y is None else int(y) for y in year], dtype=np.int64),
+        "price": as_float(price),
+        "mileage": as_float(mileage),
+        "status": np.array([(s or "").upper() for s in status], dtype=object),
+    }
+
+
+def _group_quantiles(group: np.ndarray, values: np.ndarray, n_groups: int) -> tuple[np.ndarray, np.ndarray]:
+    """Linear-interpolated ``QUANTILES`` of ``values`` per group, NaNs ignored.
+
+    Returns ``(quantiles[len(QUANTILES), n_groups], valid_counts)``.
+    """
+    valid = ~np.isnan(values)
+    order = np.lexsort((values, ~valid, group))  # by group, NaNs last, then value
+    v = values[order]
+    counts = np.bincount(group, minlength=n_groups)
+    n_valid = np.bincount(group, weights=valid, minlength=n_groups).astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    out = np.full((len(QUANTILES), n_groups), np.nan)
+    has = n_valid > 0
+    for i, q in enumerate(QUANTILES):
+        pos = starts[has] + q * (n_valid[has] - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out[i, has] = v[lo] + (v[hi] - v[lo]) * (pos - lo)
+    return out, n_valid
+
+
+def _group_regression(group, x, y, n_groups):
+    """Per-group least squares ``y = a + b*x`` over rows where both are known."""
+    ok = ~(np.isnan(x) | np.isnan(y))
+    g, x, y = group[ok], x[ok], y[ok]
+    n = np.bincount(g, minlength=n_groups).astype(float)
+    sx = np.bincount(g, weights=x, minlength=n_groups)
+    sy = np.bincount(g, weights=y, minlength=n_groups)
+    sxx = np.bincount(g, weights=x * x, minlength=n_groups)
+    sxy = np.bincount(g, weights=x * y, minlength=n_groups)
+    denom = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where((n >= 3) & (denom > 0), (n * sxy - sx * sy) / denom, np.nan)
+        intercept = (sy - slope * sx) / n
+    lo = np.full(n_groups, np.inf)
+    hi = np.full(n_groups, -np.inf)
+    np.minimum.at(lo, g, x)
+    np.maximum.at(hi, g, x)
+    return slope, intercept, lo, hi
+
+
+def _num(x, digits=0):
+    return None if x is None or np.isnan(x) else round(float(x), digits) if digits else int(round(float(x)))
+
+
+def market(engine, where: str = "1 = 1", args: Optional[dict] = None,
+           min_count: int = 1, limit: int = 200) -> dict:
+    """Statistics per (make, model, year) for cars matching ``where``."""
+    args = args or {}
+    with engine.connect() as conn:
+        version = catalog_version(conn)
+        key = (str(engine.url), version, where, tuple(sorted(args.items())), min_count, limit)
+        with _lock:
+            if key in _cache:
+                _cache.move_to_end(key)
+                return _cache[key]
+        cols = _load(conn, where, args)
+    result = {"version": version, "groups": []}
+    if cols is not None:
+        result["groups"] = _aggregate(cols, min_count, limit)
+    with _lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def _aggregate(cols: dict, min_count: int, limit: int) -> list[dict]:
+    # Group ids from the composite (make, model, year) key.
+    keys = np.array(
+        [f"{a}\x1f{b}\x1f{c}" for a, b, c in zip(cols["make"], cols["model"], cols["year"])],
+        dtype=object,
+    )
+    uniq, group = np.unique(keys, return_inverse=True)
+    n_groups = len(uniq)
+    counts = np.bincount(group, minlength=n_groups)
+
+    price_q, n_priced = _group_quantiles(group, cols["price"], n_groups)
+    mileage_q, _ = _group_quantiles(group, cols["mileage"], n_groups)
+    slope, intercept, m_lo, m_hi = _group_regression(group, cols["mileage"], cols["price"], n_groups)
+    status = cols["status"]
+    sold = np.bincount(group, weights=(status == "SOLD"), minlength=n_groups)
+    closed = np.bincount(group, weights=np.isin(status, CLOSED), minlength=n_groups)
+    live = np.bincount(group, weights=(status == "LIVE"), minlength=n_groups)
+
+    ranked = np.lexsort((np.arange(n_groups), -counts))
+    out = []
+    for gi in ranked:
+        if counts[gi] < min_count:
+            break
+        make, model, year = uniq[gi].split("\x1f")
+        curve = []
+        if not np.isnan(slope[gi]):
+            points = [m for m in MILEAGE_POINTS if m_lo[gi] <= m <= m_hi[gi]]
+            curve = [{"mileage": m, "price": _num(intercept[gi] + slope[gi] * m)} for m in points]
+        out.append({
+            "make": make or None,
+            "model": model or None,
+            "year": None if year == "-1" else int(year),
+            "count": int(counts[gi]),
+            "priced": int(n_priced[gi]),
+            "price_p10": _num(price_q[0, gi]),
+            "price_median": _num(price_q[1, gi]),
+            "price_p90": _num(price_q[2, gi]),
+            "mileage_median": _num(mileage_q[1, gi]),
+            "price_per_10k_miles": _num(slope[gi] * 10_000),
+            "price_curve": curve,
+            "live": int(live[gi]),
+            "sold": int(sold[gi]),
+            "sold_through": _num(sold[gi] / closed[gi], 3) if closed[gi] else None,
+        })
+        if len(out) >= limit:
+            break
+    return out
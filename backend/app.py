@@ -1,15 +1,18 @@
 from secrets import token_urlsafe
 import hmac
 from fastapi import FastAPI, Request, Depends, Form, UploadFile, File, Response, HTTPException, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from typing import Optional
 from sqlmodel import Session as DBSession, select
-from sqlalchemy import text
-from datetime import datetime, timedelta, timezone
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timezone
 from pathlib import Path
 from sqlalchemy import func
 
@@ -20,7 +23,8 @@ def require_admin(
     request: Request,
     credentials: HTTPBasicCredentials = Depends(security),
 ):
-    if request.session.get("admin_user"):
+    # API clients (importer scripts) have no session, only Basic auth.
+    if "session" in request.scope and request.session.get("admin_user"):
         return True
     username_ok = hmac.compare_digest(credentials.username or "", settings.ADMIN_USER)
     password_ok = hmac.compare_digest(credentials.password or "", settings.ADMIN_PASS)
@@ -32,10 +36,30 @@ def require_admin(
         )
     return True
 
-import io, csv, json, os, secrets, time
+import asyncio, json, secrets, codecs, shutil
 from db import engine, init_db
 from admin_db import engine as admin_engine, init_db as init_admin_db
-from models import Car, ImportJob, Setting, AdminAudit, Dealership
+from models import Car, ImportJob, AdminAudit, Dealership
+from ingest import (
+    CONTENT_FIELDS, DETAIL_FIELDS, CarImport, JSONArrayParser, NDJSONParser, READ_CHUNK, update_job, now_iso,
+    recall_batch, remember_batch, parse_images as _parse_images, to_epoch,
+)
+from jobs import ImportRunner, HANDLERS as IMPORT_HANDLERS, UPLOAD_SOURCE
+import dedup
+import textpack
+import exports
+import analytics
+import rollups
+import catalog
+import snapshot
+import ratelimit
+from admission import PRIORITIES, AdmissionControl, Limiter, RouteClass
+from cache import PayloadCache
+from middleware import PathScoped
+from singleflight import SingleFlight
+from live import Broadcaster, ChangeTailer, attach as attach_live
+from auctions import AuctionScheduler, apply_live_fields
+from catalog import ColumnarCatalog
 try:
     from models import Make, Model, Category
 except Exception:  # during tests models may be stubbed
@@ -43,38 +67,135 @@ except Exception:  # during tests models may be stubbed
 
 app = FastAPI(title="Vinfreak Backend")
 
-@app.middleware("http")
-async def _force_admin(request, call_next):
-    return await call_next(request)
-
 templates = Jinja2Templates(directory="templates")
 
-app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+# Only the admin UI uses sessions; public JSON and static files skip the
+# cookie handling.  /stats/runtime accepts the admin session too.
+SESSION_PATHS = ("/admin", "/stats/runtime")
+app.add_middleware(
+    PathScoped, middleware=SessionMiddleware, prefixes=SESSION_PATHS, secret_key=settings.SECRET_KEY
+)
+# Configured on startup; until then (and in tests) it admits everything.
+admission = Limiter()
+app.add_middleware(AdmissionControl, limiter=admission)
+# Outside admission control, so refused clients never take a queue spot.
+rate_limiter = ratelimit.RateLimiter()
+app.add_middleware(ratelimit.RateLimit, limiter=rate_limiter)
 Path(settings.UPLOAD_DIR).mkdir(parents=True, exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
 
-# CORS (loose for dev)
-try:
-    from fastapi.middleware.cors import CORSMiddleware
+# Outermost, so 429/503 answers carry CORS headers too.  No origins
+# disables CORS (same-origin deployments).
+if settings.CORS_ORIGINS:
     app.add_middleware(
         CORSMiddleware,
-        allow_origins=["*"],
-        allow_credentials=True,
+        allow_origins=settings.CORS_ORIGINS,
+        allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
         allow_methods=["*"],
         allow_headers=["*"],
     )
-except Exception:
-    pass
+
+import_runner: ImportRunner | None = None
+change_tailer: ChangeTailer | None = None
+auction_scheduler: AuctionScheduler | None = None
+catalog_index: ColumnarCatalog | None = None
+snapshot_writer: snapshot.SnapshotWriter | None = None
+payload_cache: PayloadCache | None = None
+flights = SingleFlight()
+broadcaster = Broadcaster()
+
+
+def notify_changes():
+    """Wake the change tailer after a local write so SSE clients hear now."""
+    if change_tailer:
+        change_tailer.poke()
+
 
 @app.on_event("startup")
 def on_start():
+    global import_runner, change_tailer, auction_scheduler, catalog_index, snapshot_writer, payload_cache
     init_db()
     init_admin_db()
+    if settings.ADMISSION_CONTROL:
+        admission.configure(
+            [
+                RouteClass(
+                    name, limit,
+                    queue=settings.ADMISSION_QUEUES.get(name, 0),
+                    wait=settings.ADMISSION_WAIT_SECONDS.get(name, 1.0),
+                    priority=PRIORITIES.get(name, 1),
+                )
+                for name, limit in settings.ADMISSION_LIMITS.items()
+            ],
+            total=settings.ADMISSION_TOTAL,
+            reserve=settings.ADMISSION_ADMIN_RESERVE,
+            retry_after=settings.ADMISSION_RETRY_AFTER,
+        )
+    rate_limiter.configure(
+        settings.RATE_LIMIT_DB or None,
+        settings.RATE_LIMITS,
+        ratelimit.networks(settings.TRUSTED_PROXIES),
+    )
+    payload_cache = PayloadCache(
+        settings.PAYLOAD_CACHE or None,
+        l1_bytes=settings.PAYLOAD_CACHE_L1_BYTES,
+        l2_bytes=settings.PAYLOAD_CACHE_L2_BYTES,
+    )
+    with engine.connect() as conn:
+        payload_cache.sync(analytics.catalog_version(conn))
+    textpack.configure(settings.TEXT_COMPRESSION, engine=engine)
+    change_tailer = ChangeTailer(
+        engine, interval=settings.LIVE_POLL_SECONDS, compact_interval=settings.LIVE_COMPACT_SECONDS
+    )
+    attach_live(change_tailer, broadcaster)
+    auction_scheduler = AuctionScheduler(engine, on_end=lambda ids: notify_changes())
+    change_tailer.add_listener(auction_scheduler.on_changes, ("end_time", "auction_status"))
+    since = None
+    if settings.COLUMNAR_CATALOG:
+        catalog_index = ColumnarCatalog()
+        change_tailer.add_listener(catalog_index.on_changes, catalog.COLUMNS)
+        if settings.CATALOG_SNAPSHOT:
+            # A snapshot makes this worker warm at once; the tailer replays
+            # whatever changed since it was written.
+            since = snapshot.restore(catalog_index, settings.CATALOG_SNAPSHOT, engine)
+            snapshot_writer = snapshot.SnapshotWriter(
+                catalog_index, change_tailer, settings.CATALOG_SNAPSHOT,
+                source=str(engine.url), interval=settings.CATALOG_SNAPSHOT_SECONDS,
+            )
+            snapshot_writer.acquire()
+            change_tailer.add_listener(snapshot_writer.on_changes)
+    change_tailer.start(since)
+    # Load after the tailer has its starting seq so no change falls in between.
+    auction_scheduler.load()
+    if catalog_index and not catalog_index.ready:
+        catalog_index.load(engine)
+        if snapshot_writer and snapshot_writer.leader:
+            snapshot_writer.write()
+    auction_scheduler.start()
+    import_runner = ImportRunner(
+        engine,
+        max_workers=settings.IMPORT_MAX_RUNNING,
+        poll_seconds=settings.IMPORT_POLL_SECONDS,
+        on_batch=_audit_import_batch,
+        pause=settings.IMPORT_BATCH_PAUSE,
+        stale_seconds=settings.IMPORT_STALE_SECONDS,
+    )
+    import_runner.start()
 
-# -------- helpers: auth/flash/csrf/audit ----------
-FAILED_LOGINS = {}  # ip -> [timestamps]
 
+@app.on_event("shutdown")
+def on_stop():
+    if import_runner:
+        import_runner.stop()
+    if change_tailer:
+        change_tailer.stop()
+    if snapshot_writer:
+        snapshot_writer.flush()
+    if auction_scheduler:
+        auction_scheduler.stop()
+
+# -------- helpers: auth/flash/csrf/audit ----------
 def flash(request: Request, message: str, category: str = "success"):
     request.session.setdefault("flash", []).append({"cat": category, "msg": message})
 
@@ -84,7 +205,8 @@ def pop_flash(request: Request):
     return msgs
 
 def get_ip(request: Request) -> str:
-    return request.headers.get("x-forwarded-for") or request.client.host
+    peer = request.client.host if request.client else ""
+    return ratelimit.client_ip(peer, request.headers.get("x-forwarded-for"), rate_limiter.trusted)
 
 def admin_session_required(request: Request):
     if not request.session.get("admin_user"):
@@ -134,6 +256,42 @@ def audit(
         session.commit()
 
 
+def audit_many(
+    actor: str,
+    action: str,
+    table: str,
+    entries: list[tuple],
+    ip: str,
+):
+    """Write one audit row per ``(row_id, before, after)`` entry in a single executemany."""
+    if not entries:
+        return
+    ts = datetime.now(timezone.utc).isoformat()
+    rows = [
+        {
+            "actor": actor,
+            "action": action,
+            "table_name": table,
+            "row_id": str(row_id),
+            "before_json": json.dumps(before, ensure_ascii=False) if before else None,
+            "after_json": json.dumps(after, ensure_ascii=False) if after else None,
+            "ip": ip,
+            "created_at": ts,
+        }
+        for row_id, before, after in entries
+    ]
+    with admin_engine.begin() as conn:
+        conn.execute(AdminAudit.__table__.insert(), rows)
+
+
+def _audit_import_batch(ctx, created, updated):
+    """Audit rows written by a background import job, one executemany per batch."""
+    actor = f"import_job:{ctx.job_id}"
+    audit_many(actor, "create", "cars", [(cid, None, row) for cid, row in created], "-")
+    audit_many(actor, "update", "cars", [(cid, None, row) for cid, row in updated], "-")
+    notify_changes()
+
+
 def _to_int(value):
     """Coerce form values to int or None.
 
@@ -167,19 +325,147 @@ def admin_logout(request: Request):
 
 # -------- public API used by frontend --------
 @app.get("/cars")
-def list_cars(dealership_id: int | None = Query(None)):
-    """List cars with optional dealership filtering."""
-    if not isinstance(dealership_id, (int, type(None))):
-        dealership_id = None
+def list_cars(
+    dealership_id: int | None = Query(None),
+    posted_after: str | None = Query(None),
+    posted_before: str | None = Query(None),
+    ends_before: str | None = Query(None),
+    min_rating: float | None = Query(None),
+    make: str | None = Query(None),
+    model: str | None = Query(None),
+    year_min: int | None = Query(None),
+    year_max: int | None = Query(None),
+    price_min: float | None = Query(None),
+    price_max: float | None = Query(None),
+    mileage_max: int | None = Query(None),
+    transmission: str | None = Query(None),
+    drivetrain: str | None = Query(None),
+    body_type: str | None = Query(None),
+    status: str | None = Query(None),
+    state: str | None = Query(None),
+    q: str | None = Query(None),
+    sort: str | None = Query(None),
+    page: int | None = Query(None),
+    page_size: int | None = Query(None),
+):
+    """List live cars, filtered, sorted and optionally paged.
+
+    ``posted_after``/``posted_before``/``ends_before`` take ISO timestamps or
+    epoch seconds and, like the other bounds, are range scans on typed
+    columns.  ``transmission``/``drivetrain``/``body_type``/``status``/
+    ``state`` take comma-separated values.  ``sort`` is one of
+    ``catalog.SORTS`` (newest first by default).  Without ``page`` the whole
+    list is returned; with it, ``{"items", "total", "page", "page_size"}``.
+
+    With ``COLUMNAR_CATALOG`` on, the in-memory catalog picks the ids and
+    only the page is read from SQL; otherwise (and for ``q``) it is all SQL.
+    """
+    def arg(value, *types):
+        # Query() defaults arrive as FieldInfo when called directly.
+        return value if isinstance(value, types) else None
+
+    spec = {"ranges": [], "in": {}}
+    if arg(dealership_id, int) is not None:
+        spec["dealership_id"] = dealership_id
+    for name, value in (("make", make), ("model", model), ("q", q)):
+        if arg(value, str) and value.strip():
+            spec[name] = value.strip()
+    for col, op, value in (
+        ("posted_ts", ">=", posted_after), ("posted_ts", "<", posted_before), ("end_ts", "<", ends_before),
+    ):
+        if arg(value, str, int, float) is not None and to_epoch(value):
+            spec["ranges"].append((col, op, to_epoch(value)))
+    for col, op, value in (
+        ("seller_rating", ">=", min_rating), ("year", ">=", year_min), ("year", "<=", year_max),
+        ("price", ">=", price_min), ("price", "<=", price_max), ("mileage", "<=", mileage_max),
+    ):
+        if arg(value, int, float) is not None:
+            spec["ranges"].append((col, op, value))
+    for col, value in (
+        ("transmission", transmission), ("drivetrain", drivetrain), ("body_type", body_type),
+        ("auction_status", status), ("state", state),
+    ):
+        values = [v.strip().upper() for v in (arg(value, str) or "").split(",") if v.strip()]
+        if values:
+            spec["in"][col] = values
+    sort = sort if arg(sort, str) in catalog.SORTS else "newest"
+    paged = arg(page, int) is not None or arg(page_size, int) is not None
+    page = max(1, arg(page, int) or 1)
+    size = max(1, min(arg(page_size, int) or 24, 500))
+    offset, limit = ((page - 1) * size, size) if paged else (0, None)
+
+    def compute():
+        hit = catalog_index.query(spec, sort, offset, limit) if catalog_index else None
+        if hit is not None:
+            ids, total = hit
+            return [_cars_by_ids(ids), total]
+        return list(_list_cars_sql(spec, sort, offset, limit))
+
+    items, total = _serve(
+        "cars:" + json.dumps([spec, sort, offset, limit], sort_keys=True),
+        compute,
+        lambda cached: [[apply_live_fields(c) for c in cached[0]], cached[1]],
+    )
+    if not paged:
+        return items
+    return {"items": items, "total": total, "page": page, "page_size": size}
+
+
+def _catalog_version() -> int:
+    with engine.connect() as conn:
+        return analytics.catalog_version(conn)
+
+
+def _serve(key: str, compute, refresh):
+    """``compute()`` through the payload cache and request coalescing.
+
+    Concurrent calls with the same ``key`` share one execution.  ``refresh``
+    brings a cached value up to date (live auction fields).  The result
+    may be shared between requests and must not be mutated.
+    """
+    def load():
+        if not payload_cache:
+            return compute()
+        version = _catalog_version()
+        cached = payload_cache.get(key, version)
+        if cached is not None:
+            return refresh(cached)
+        value = compute()
+        payload_cache.put(key, version, value)
+        return value
+
+    return flights.do(key, load)
+
+
+def _cars_by_ids(ids: list[int]) -> list[dict]:
+    """``/cars`` payloads for ``ids``, in that order."""
+    rows = {}
+    with engine.connect() as conn:
+        for i in range(0, len(ids), 500):
+            found = conn.execute(
+                text(_car_with_dealership_sql() + " WHERE cars.id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": ids[i:i + 500]},
+            ).mappings()
+            rows.update({r["id"]: r for r in found})
+    return [_car_payload(rows[i]) for i in ids if i in rows]
+
+
+def _list_cars_sql(spec: dict, sort: str, offset: int, limit: int | None) -> tuple[list[dict], int]:
+    where, args = catalog.where_sql(spec)
+    order = catalog.order_sql(sort)
     # ORM first
     try:
         with DBSession(engine) as s:
-            stmt = select(Car).where((Car.deleted_at.is_(None)))
-            if dealership_id is not None:
-                stmt = stmt.where(Car.dealership_id == dealership_id)
-            # order by posted_at desc if present else id desc
-            order_col = getattr(Car, "posted_at", Car.id)
-            cars = s.exec(stmt.order_by(order_col.desc())).all()
+            cond = text(where).bindparams(**args)
+            stmt = select(Car).where(cond).order_by(text(order)).offset(offset)
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            cars = s.exec(stmt).all()
+            total = len(cars)
+            if limit is not None:
+                total = s.exec(select(func.count()).select_from(Car).where(cond)).one()
             ids = {getattr(c, "dealership_id", None) for c in cars if getattr(c, "dealership_id", None)}
             dealerships = {}
             if ids:
@@ -190,10 +476,8 @@ def list_cars(dealership_id: int | None = Query(None)):
                     data = c.model_dump()
                 except Exception:
                     data = {k: getattr(c, k, None) for k in ("id","vin","year","make","model","price","currency","source","url","title","description","image_url","posted_at","dealership_id")}
-                imgs = _parse_images(getattr(c, "images_json", None))
-                data["images"] = imgs
-                if not data.get("image_url") and imgs:
-                    data["image_url"] = imgs[0]
+                # The gallery lives in car_details; listings only carry the hero image.
+                data["images"] = [data["image_url"]] if data.get("image_url") else []
                 d = dealerships.get(getattr(c, "dealership_id", None))
                 if d:
                     try:
@@ -202,42 +486,135 @@ def list_cars(dealership_id: int | None = Query(None)):
                         data["dealership"] = {"id": d.id, "name": d.name, "logo_url": getattr(d, "logo_url", None)}
                 else:
                     data["dealership"] = None
-                result.append(data)
-            return result
+                result.append(apply_live_fields(data))
+            return result, total
     except Exception:
         pass
     # raw fallback
     with DBSession(engine) as s:
-        sql = """
-            SELECT cars.*, d.id AS d_id, d.name AS d_name, d.logo_url AS d_logo
-            FROM cars LEFT JOIN dealerships d ON cars.dealership_id = d.id
-            WHERE cars.deleted_at IS NULL
-        """
-        args = {}
-        if dealership_id is not None:
-            sql += " AND cars.dealership_id = :dealership_id"
-            args["dealership_id"] = dealership_id
-        sql += " ORDER BY COALESCE(cars.posted_at,'') DESC, cars.id DESC"
+        sql = _car_with_dealership_sql() + f" WHERE {where} ORDER BY {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
         rows = s.exec(text(sql).bindparams(**args)).mappings().all()
-        res = []
-        for r in rows:
-            car = dict(r)
-            d = None
-            if r.get("d_id") is not None:
-                d = {"id": r["d_id"], "name": r["d_name"], "logo_url": r["d_logo"]}
-            car.pop("d_id", None)
-            car.pop("d_name", None)
-            car.pop("d_logo", None)
-            car["dealership"] = d
-            imgs = _parse_images(car.get("images_json"))
-            car["images"] = imgs
-            if not car.get("image_url") and imgs:
-                car["image_url"] = imgs[0]
-            res.append(car)
-        return res
+        total = len(rows)
+        if limit is not None:
+            total = s.exec(text(f"SELECT COUNT(*) FROM cars WHERE {where}").bindparams(**args)).first()[0]
+        return [_car_payload(r) for r in rows], total
+
+
+def _car_columns() -> str:
+    """The ``cars`` columns ``Car`` maps, for raw SELECTs.
+
+    Not ``cars.*``: databases from before the ``car_details`` split keep
+    stale copies of ``DETAIL_FIELDS`` in ``cars`` until the legacy columns
+    are dropped, and list scans must not drag that text along.
+    """
+    return ", ".join(f"cars.{c.name}" for c in Car.__table__.columns)
+
+
+def _car_with_dealership_sql() -> str:
+    return (
+        f"SELECT {_car_columns()}, d.id AS d_id, d.name AS d_name, d.logo_url AS d_logo "
+        "FROM cars LEFT JOIN dealerships d ON cars.dealership_id = d.id"
+    )
+
+
+def _car_payload(r) -> dict:
+    """Public shape of a ``_car_with_dealership_sql`` row."""
+    car = dict(r)
+    d = None
+    if r.get("d_id") is not None:
+        d = {"id": r["d_id"], "name": r["d_name"], "logo_url": r["d_logo"]}
+    car.pop("d_id", None)
+    car.pop("d_name", None)
+    car.pop("d_logo", None)
+    car["dealership"] = d
+    car["images"] = [car["image_url"]] if car.get("image_url") else []
+    return apply_live_fields(car)
+
+
+@app.get("/cars/changes")
+def car_changes(since: int = 0, limit: int = 500):
+    """Cars changed after change-log sequence ``since``, for incremental sync.
+
+    Each car appears once, in the order of its latest change: live cars in
+    ``upserted`` (same shape as ``/cars``), removed or soft-deleted ones as
+    ids in ``deleted``.  Pass ``next`` back as ``since`` until ``more`` is
+    false.
+    """
+    limit = max(1, min(limit, 5000))
+    with DBSession(engine) as s:
+        latest = s.exec(text("SELECT COALESCE(MAX(seq), 0) FROM car_changes")).first()[0]
+        changes = s.exec(
+            text(
+                "SELECT car_id, MAX(seq) AS seq FROM car_changes WHERE seq > :since "
+                "GROUP BY car_id ORDER BY seq LIMIT :limit"
+            ).bindparams(since=since, limit=limit)
+        ).mappings().all()
+        ids = [c["car_id"] for c in changes]
+        live = {}
+        if ids:
+            rows = s.exec(
+                text(
+                    _car_with_dealership_sql()
+                    + " WHERE cars.id IN :ids AND cars.deleted_ts = 0"
+                ).bindparams(bindparam("ids", expanding=True), ids=ids)
+            ).mappings().all()
+            live = {r["id"]: r for r in rows}
+    nxt = changes[-1]["seq"] if changes else latest
+    return {
+        "since": since,
+        "next": nxt,
+        "latest": latest,
+        "more": nxt < latest,
+        "upserted": [_car_payload(live[i]) for i in ids if i in live],
+        "deleted": [i for i in ids if i not in live],
+    }
+
+@app.get("/cars/stream")
+async def cars_stream(request: Request, ids: Optional[str] = None, status: Optional[str] = None):
+    """Server-Sent Events with compact deltas of live auction fields.
+
+    ``ids`` (comma separated) and ``status`` narrow the stream.  Events are
+    ``car`` (``{"id": .., <changed fields>}`` or ``{"id": .., "deleted": true}``)
+    and ``reset``, sent when this client fell further behind than its buffer
+    allows; it should then resync from ``/cars/changes``.
+    """
+    wanted = None
+    if isinstance(ids, str) and ids.strip():
+        wanted = {int(x) for x in ids.split(",") if x.strip().isdigit()}
+    status = status.strip().upper() if isinstance(status, str) and status.strip() else None
+    heartbeat = settings.LIVE_HEARTBEAT_SECONDS
+    sub = broadcaster.subscribe(wanted, status, settings.LIVE_BUFFER_BYTES)
+    seq = change_tailer.seq if change_tailer else 0
+
+    async def events():
+        try:
+            yield f"retry: 3000\nevent: ready\ndata: {json.dumps({'seq': seq})}\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(sub.ready.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                frames = sub.drain(broadcaster.seq)
+                if frames:
+                    yield frames
+        finally:
+            broadcaster.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/cars/{id}")
 def get_car(id: str):
+    return _serve(f"car:{id}", lambda: _car_detail(id), apply_live_fields)
+
+
+def _car_detail(id: str) -> dict:
     with DBSession(engine) as s:
         # by numeric id or vin/lot_number
         car = None
@@ -263,11 +640,69 @@ def get_car(id: str):
                 data["dealership"] = {"id": d.id, "name": d.name, "logo_url": getattr(d, "logo_url", None)}
         else:
             data["dealership"] = None
-        imgs = _parse_images(getattr(car, "images_json", None))
+        data.update(car.detail_values())
+        imgs = _parse_images(data.get("images_json"))
+        if data.get("image_url"):
+            imgs = [data["image_url"], *(u for u in imgs if u != data["image_url"])]
         data["images"] = imgs
         if not data.get("image_url") and imgs:
             data["image_url"] = imgs[0]
-        return data
+        return apply_live_fields(data)
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/x-jsonlines"}
+
+@app.post("/cars/bulk")
+async def cars_bulk(request: Request, _=Depends(require_admin)):
+    """Bulk upsert for the importer scripts.
+
+    Accepts a JSON array, or NDJSON when sent as ``application/x-ndjson``.
+    Rows are matched by natural key (VIN, else source + lot number, else
+    URL) and written with ``INSERT ... ON CONFLICT DO UPDATE`` in batches;
+    rows whose content hash did not change are not rewritten.
+
+    Clients may send an ``Idempotency-Key`` header; a batch id that was
+    already applied returns the original counts without touching the table,
+    so a retry after a lost response is not double counted.
+    """
+    batch_id = request.headers.get("idempotency-key")
+    if batch_id:
+        seen = await run_in_threadpool(_recall_batch, batch_id)
+        if seen is not None:
+            return JSONResponse(seen, headers={"Idempotent-Replayed": "true"})
+    ctype = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    parser = NDJSONParser() if ctype in NDJSON_TYPES else JSONArrayParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    importer = CarImport(engine, Car.model_fields.keys())
+    # Batches are written on the threadpool; the loop only parses.
+    try:
+        async for chunk in request.stream():
+            for item in parser.feed(decoder.decode(chunk)):
+                if importer.add(item):
+                    await run_in_threadpool(importer.flush)
+        for item in parser.feed(decoder.decode(b"", final=True)) + parser.close():
+            if importer.add(item):
+                await run_in_threadpool(importer.flush)
+        await run_in_threadpool(importer.flush)
+    except ValueError as e:  # includes JSONDecodeError
+        importer.pending = []
+        return JSONResponse(
+            {"detail": f"Invalid payload: {e}", **importer.counts()}, status_code=400
+        )
+    counts = importer.counts()
+    notify_changes()
+    if batch_id:
+        await run_in_threadpool(_remember_batch, batch_id, counts)
+    return counts
+
+
+def _recall_batch(batch_id: str):
+    with engine.connect() as conn:
+        return recall_batch(conn, batch_id)
+
+
+def _remember_batch(batch_id: str, counts: dict) -> None:
+    with engine.begin() as conn:
+        remember_batch(conn, batch_id, counts)
 
 @app.get("/dealerships")
 def list_dealerships():
@@ -284,6 +719,71 @@ def public_settings():
         rows = s.exec(text("SELECT key,value FROM settings")).mappings().all()
         return {r["key"]: r["value"] for r in rows}
 
+@app.get("/analytics/market")
+def market_analytics(
+    make: str | None = Query(None),
+    model: str | None = Query(None),
+    year_min: int | None = Query(None),
+    year_max: int | None = Query(None),
+    status: str | None = Query(None),
+    posted_after: str | None = Query(None),
+    posted_before: str | None = Query(None),
+    ended_after: str | None = Query(None),
+    ended_before: str | None = Query(None),
+    min_count: int = Query(1),
+    limit: int = Query(200),
+):
+    """Price statistics per make/model/year (see ``analytics.market``).
+
+    ``status`` is a comma-separated list of auction statuses; the date
+    windows take ISO timestamps or epoch seconds like ``/cars``.
+    """
+    clauses, args = [], {}
+    for name, value, sql in (
+        ("make", make, "lower(make) = :make"),
+        ("model", model, "lower(model) = :model"),
+    ):
+        if isinstance(value, str) and value.strip():
+            clauses.append(sql)
+            args[name] = value.strip().lower()
+    for name, value, sql in (("year_min", year_min, "year >= :year_min"), ("year_max", year_max, "year <= :year_max")):
+        if isinstance(value, int):
+            clauses.append(sql)
+            args[name] = value
+    if isinstance(status, str) and status.strip():
+        wanted = [x.strip().upper() for x in status.split(",") if x.strip()]
+        clauses.append("upper(auction_status) IN (" + ", ".join(f":st{i}" for i in range(len(wanted))) + ")")
+        args.update({f"st{i}": v for i, v in enumerate(wanted)})
+    for name, value, sql in (
+        ("posted_after", posted_after, "posted_ts >= :posted_after"),
+        ("posted_before", posted_before, "posted_ts < :posted_before"),
+        ("ended_after", ended_after, "end_ts >= :ended_after"),
+        ("ended_before", ended_before, "end_ts > 0 AND end_ts < :ended_before"),
+    ):
+        if isinstance(value, (str, int, float)) and to_epoch(value):
+            clauses.append(sql)
+            args[name] = to_epoch(value)
+    min_count = max(1, min_count) if isinstance(min_count, int) else 1
+    limit = max(1, min(limit, 2000)) if isinstance(limit, int) else 200
+    return analytics.market(engine, " AND ".join(clauses) or "1 = 1", args, min_count, limit)
+
+@app.get("/stats/summary")
+def stats_summary(days: int = 30):
+    """Catalog KPIs from the ``car_rollups`` totals (see rollups.py)."""
+    days = max(1, min(days, 366)) if isinstance(days, int) else 30
+    with engine.connect() as conn:
+        return rollups.summary(conn, days)
+
+@app.get("/stats/runtime")
+def stats_runtime(_=Depends(require_admin)):
+    """This worker's admission, rate limit, coalescing and payload cache counters."""
+    return {
+        "admission": admission.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "coalescing": flights.stats(),
+        "cache": payload_cache.stats() if payload_cache else None,
+    }
+
 # -------- admin UI ----------
 @app.get("/admin", response_class=HTMLResponse)
 def admin_index(request: Request, _=Depends(admin_session_required)):
@@ -295,7 +795,10 @@ def admin_index(request: Request, _=Depends(admin_session_required)):
     )
 
 def allowed_sorts():
-    return {"posted_at","id","price","year","mileage","make","model"}
+    return {"posted_at","id","price","year","mileage","make","model","seller_rating"}
+
+# Sort keys backed by a typed shadow column (see ingest.TIMESTAMP_COLUMNS).
+SORT_COLUMNS = {"posted_at": "posted_ts", "end_time": "end_ts"}
 
 
 def _maybe_int(val: Optional[str]) -> Optional[int]:
@@ -305,28 +808,7 @@ def _maybe_int(val: Optional[str]) -> Optional[int]:
         return None
 
 
-def _parse_images(value: Optional[str]) -> list[str]:
-    """Return a list of image URLs from various textual inputs.
-
-    Accepts JSON arrays, comma-separated strings, or newline separated
-    lists. Invalid JSON falls back to splitting on commas/newlines.
-    """
-    if not value:
-        return []
-    if isinstance(value, str):
-        value = value.strip()
-    if not value:
-        return []
-    try:
-        parsed = json.loads(value)
-        if isinstance(parsed, list):
-            return [str(x) for x in parsed if x]
-        if isinstance(parsed, str):
-            return [parsed] if parsed else []
-    except Exception:
-        pass
-    parts = [p.strip() for p in str(value).replace(",", "\n").splitlines() if p.strip()]
-    return parts
+DUPLICATE_CAR_MSG = "Another car already has this VIN (or source + lot number / URL)"
 
 
 def _parse_images_form(value: Optional[str]) -> Optional[str]:
@@ -350,6 +832,17 @@ def admin_dealerships(request: Request, _=Depends(admin_session_required)):
         },
     )
 
+def _touch_dealership_cars(s, dealership_id: int) -> None:
+    """Log a change for the dealership's cars: their payloads embed it.
+
+    That moves the catalog version (dropping cached payloads in every
+    worker) and lets mirrors pick up the new name and logo.
+    """
+    s.exec(
+        text("UPDATE cars SET dealership_id = dealership_id WHERE dealership_id = :d").bindparams(d=dealership_id)
+    )
+
+
 @app.post("/admin/dealerships/new")
 def admin_dealership_create(
     request: Request,
@@ -441,6 +934,7 @@ def admin_dealership_update(
                 f.write(data)
             d.logo_url = f"/uploads/{fname}"
         s.add(d)
+        _touch_dealership_cars(s, dealership_id)
         s.commit()
         audit(
             request.session.get("admin_user", "admin"),
@@ -466,6 +960,7 @@ def admin_dealership_delete(request: Request, dealership_id: int, _=Depends(admi
                 except FileNotFoundError:
                     pass
             s.delete(d)
+            _touch_dealership_cars(s, dealership_id)
             s.commit()
             audit(
                 request.session.get("admin_user", "admin"),
@@ -479,6 +974,28 @@ def admin_dealership_delete(request: Request, dealership_id: int, _=Depends(admi
     flash(request, "Dealership deleted", "success")
     return RedirectResponse("/admin/dealerships", status_code=303)
 
+def _admin_car_filters(q, make_id, model_id, category_id, status, year_min, year_max):
+    """WHERE clause and parameters for the /admin/cars filters (live cars only)."""
+    where = ["deleted_ts = 0"]
+    args = {}
+    if q:
+        where.append("(vin LIKE :q OR make LIKE :q OR model LIKE :q OR title LIKE :q)")
+        args["q"] = f"%{q}%"
+    if make_id is not None:
+        where.append("make_id = :make_id"); args["make_id"] = make_id
+    if model_id is not None:
+        where.append("model_id = :model_id"); args["model_id"] = model_id
+    if category_id is not None:
+        where.append("category_id = :category_id"); args["category_id"] = category_id
+    if status:
+        where.append("auction_status = :status"); args["status"] = status
+    if year_min is not None:
+        where.append("year >= :ymin"); args["ymin"] = year_min
+    if year_max is not None:
+        where.append("year <= :ymax"); args["ymax"] = year_max
+    return " AND ".join(where), args
+
+
 @app.get("/admin/cars", response_class=HTMLResponse)
 def admin_cars(
     request: Request,
@@ -504,24 +1021,7 @@ def admin_cars(
     off = (max(1,page)-1)*per
     sort_col = sort if sort in allowed_sorts() else "posted_at"
 
-    where = ["(deleted_at IS NULL OR deleted_at='')"]
-    args = {}
-    if q:
-        where.append("(vin LIKE :q OR make LIKE :q OR model LIKE :q OR title LIKE :q)")
-        args["q"] = f"%{q}%"
-    if make_id is not None:
-        where.append("make_id = :make_id"); args["make_id"] = make_id
-    if model_id is not None:
-        where.append("model_id = :model_id"); args["model_id"] = model_id
-    if category_id is not None:
-        where.append("category_id = :category_id"); args["category_id"] = category_id
-    if status:
-        where.append("auction_status = :status"); args["status"] = status
-    if year_min is not None:
-        where.append("year >= :ymin"); args["ymin"] = year_min
-    if year_max is not None:
-        where.append("year <= :ymax"); args["ymax"] = year_max
-    where_sql = " AND ".join(where)
+    where_sql, args = _admin_car_filters(q, make_id, model_id, category_id, status, year_min, year_max)
 
     with DBSession(engine) as s:
         makes = s.exec(select(Make).order_by(Make.name)).all()
@@ -531,13 +1031,14 @@ def admin_cars(
         total = s.exec(text(f"SELECT COUNT(*) AS c FROM cars WHERE {where_sql}").bindparams(**args)).first()[0]
         rows = s.exec(
             text(
-                f"SELECT cars.*, dealerships.name AS dealership_name FROM cars "
+                f"SELECT {_car_columns()}, dealerships.name AS dealership_name FROM cars "
                 f"LEFT JOIN dealerships ON dealerships.id = cars.dealership_id "
-                f"WHERE {where_sql} ORDER BY {sort_col} DESC LIMIT :per OFFSET :off"
+                f"WHERE {where_sql} ORDER BY {SORT_COLUMNS.get(sort_col, sort_col)} DESC, cars.id DESC "
+                f"LIMIT :per OFFSET :off"
             ).bindparams(**(dict(args, per=per, off=off)))
         ).mappings().all()
     last_page = max(1, (total + per - 1)//per)
-    t = csrf_token(request)
+    csrf_token(request)
     resp = templates.TemplateResponse(
         request,
         "admin_cars.html",
@@ -567,7 +1068,7 @@ def admin_cars(
 
 @app.get("/admin/cars/new", response_class=HTMLResponse)
 def admin_car_new(request: Request, _=Depends(admin_session_required)):
-    t = csrf_token(request)
+    csrf_token(request)
     with DBSession(engine) as s:
         makes = s.exec(select(Make).order_by(Make.name)).all()
         models = s.exec(select(Model).order_by(Model.name)).all()
@@ -605,7 +1106,7 @@ def admin_car_create(
     _=Depends(admin_session_required),
 ):
     require_csrf(request, csrf)
-    allowed = set(Car.model_fields.keys())
+    allowed = set(Car.model_fields.keys()) | set(DETAIL_FIELDS)
     with DBSession(engine) as s:
         make_id_i = _to_int(make_id)
         model_id_i = _to_int(car_model_id)
@@ -621,8 +1122,13 @@ def admin_car_create(
                                        seller_rating=seller_rating, seller_reviews=seller_reviews, posted_at=posted_at, dealership_id=dealership_id_i).items() if k in allowed}
         c = Car(**payload)
         s.add(c)
-        s.flush()
-        after = c.model_dump() if hasattr(c, "model_dump") else payload
+        try:
+            s.flush()
+        except IntegrityError:
+            flash(request, DUPLICATE_CAR_MSG, "error")
+            return RedirectResponse("/admin/cars/new", status_code=303)
+        after = {**c.model_dump(), **c.detail_values()} if hasattr(c, "model_dump") else payload
+        dedup.index_rows(s.connection(), [(c.id, after)])
         audit(
             request.session.get("admin_user", "admin"),
             "create",
@@ -633,37 +1139,47 @@ def admin_car_create(
             get_ip(request),
         )
         s.commit()
+    notify_changes()
     flash(request, "Car created", "success")
     return RedirectResponse("/admin/cars", status_code=303)
 
 # Import/Export
 @app.get("/admin/cars/export")
-def admin_cars_export(fmt: str = "csv", _=Depends(admin_session_required)):
-    with DBSession(engine) as s:
-        rows = s.exec(
-            text(
-                "SELECT * FROM cars WHERE deleted_at IS NULL ORDER BY COALESCE(posted_at,'') DESC, id DESC"
-            )
-        ).mappings().all()
-    if fmt == "json":
-        data = json.dumps([dict(r) for r in rows], ensure_ascii=False).encode("utf-8")
-        return StreamingResponse(
-            io.BytesIO(data),
-            media_type="application/json",
-            headers={"Content-Disposition": "attachment; filename=cars.json"},
-        )
-    # CSV
-    buf = io.StringIO()
-    if rows:
-        fieldnames = list(rows[0].keys())
-        w = csv.DictWriter(buf, fieldnames=fieldnames)
-        w.writeheader()
-        for r in rows:
-            w.writerow(dict(r))
+def admin_cars_export(
+    fmt: str = "csv",
+    columns: Optional[str] = None,
+    gzip: bool = False,
+    q: Optional[str] = None,
+    make_id: Optional[str] = None,
+    car_model_id: Optional[str] = Query(None, alias="model_id"),
+    category_id: Optional[str] = None,
+    status: Optional[str] = None,
+    year_min: Optional[str] = None,
+    year_max: Optional[str] = None,
+    _=Depends(admin_session_required),
+):
+    """Stream the catalog as CSV, NDJSON or a JSON array.
+
+    Takes the same filters as ``/admin/cars``; ``columns`` is a comma
+    separated list (default: everything, details included) and ``gzip=1``
+    compresses on the fly.
+    """
+    fmt = fmt if fmt in exports.FORMATS else "csv"
+    where_sql, args = _admin_car_filters(
+        q, _maybe_int(make_id), _maybe_int(car_model_id), _maybe_int(category_id),
+        status, _maybe_int(year_min), _maybe_int(year_max),
+    )
+    cols = exports.pick_columns(exports.car_columns(engine), columns if isinstance(columns, str) else None)
+    body = exports.encode(exports.iter_rows(engine, cols, where_sql, args), fmt, cols)
+    media_type, ext = exports.FORMATS[fmt]
+    filename = f"cars.{ext}"
+    if gzip is True:
+        body = exports.gzip_stream(body)
+        media_type, filename = "application/gzip", filename + ".gz"
     return StreamingResponse(
-        io.BytesIO(buf.getvalue().encode("utf-8")),
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=cars.csv"},
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
 
 
@@ -680,68 +1196,82 @@ async def admin_cars_import(
     _=Depends(admin_session_required),
 ):
     require_csrf(request, csrf)
-    content = await file.read()
-    try:
-        items = json.loads(content)
-    except Exception:
-        flash(request, "Invalid JSON file", "error")
-        return RedirectResponse("/admin/cars", status_code=303)
-    if not isinstance(items, list):
-        flash(request, "JSON must be an array of objects", "error")
-        return RedirectResponse("/admin/cars", status_code=303)
-
-    cols = set(Car.model_fields.keys())
-    seen_vins = set()
-    inserted = skipped = 0
+    actor = request.session.get("admin_user", "admin")
+    ip = get_ip(request)
     with DBSession(engine) as s:
-        for item in items:
-            if not isinstance(item, dict):
-                skipped += 1
-                continue
-
-            imgs_val = item.get("images")
-            if imgs_val:
-                if isinstance(imgs_val, list):
-                    imgs = [str(x).strip() for x in imgs_val if x]
-                else:
-                    imgs = _parse_images(imgs_val)
-                seen_urls: set[str] = set()
-                unique: list[str] = []
-                for url in imgs:
-                    if url and url not in seen_urls:
-                        unique.append(url)
-                        seen_urls.add(url)
-                if unique:
-                    item["image_url"] = unique[0]
-                    item["images_json"] = (
-                        json.dumps(unique[1:]) if len(unique) > 1 else None
-                    )
-
-            data = {k: item.get(k) for k in cols}
-            vin = (data.get("vin") or "").strip()
-            if not vin or vin in seen_vins:
-                skipped += 1
-                continue
-            seen_vins.add(vin)
-            exists = s.exec(select(Car).where(Car.vin == vin)).first()
-            if exists:
-                skipped += 1
-                continue
-            car = Car(**data)
-            s.add(car)
-            s.flush()
-            audit(
-                request.session.get("admin_user", "admin"),
-                "create",
-                "cars",
-                car.id,
-                None,
-                data,
-                get_ip(request),
-            )
-            inserted += 1
+        job = ImportJob(
+            source=UPLOAD_SOURCE,
+            status="running",
+            created=now_iso(),
+            started_at=now_iso(),
+            heartbeat_at=now_iso(),
+            cancellable=False,
+            log=getattr(file, "filename", None),
+        )
+        s.add(job)
         s.commit()
-    flash(request, f"Import done: {inserted} inserted, {skipped} skipped", "success")
+        job_id = job.id
+
+    importer = CarImport(engine, Car.model_fields.keys())
+
+    def write_batch():
+        created, updated = importer.flush()
+        audit_many(actor, "create", "cars", [(cid, None, row) for cid, row in created], ip)
+        audit_many(actor, "update", "cars", [(cid, None, row) for cid, row in updated], ip)
+        notify_changes()
+        with engine.begin() as conn:
+            update_job(
+                conn,
+                job_id,
+                total_items=importer.processed,
+                created_items=importer.inserted,
+                updated_items=importer.updated,
+                unchanged_items=importer.unchanged,
+                skipped_items=importer.skipped,
+                heartbeat_at=now_iso(),
+            )
+
+    # Decode the spooled upload chunk by chunk instead of reading it whole.
+    parser = JSONArrayParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    error = None
+    try:
+        while True:
+            chunk = await file.read(READ_CHUNK)
+            final = not chunk
+            text_chunk = decoder.decode(chunk or b"", final=final)
+            items = parser.feed(text_chunk) + (parser.close() if final else [])
+            for item in items:
+                if importer.add(item):
+                    await run_in_threadpool(write_batch)
+            if final:
+                break
+        await run_in_threadpool(write_batch)
+    except json.JSONDecodeError:
+        error = "Invalid JSON file"
+    except ValueError as e:
+        error = str(e) or "Invalid JSON file"
+
+    with engine.begin() as conn:
+        update_job(
+            conn,
+            job_id,
+            status="failed" if error else "finished",
+            finished_at=now_iso(),
+            total_items=importer.processed,
+            created_items=importer.inserted,
+            updated_items=importer.updated,
+            unchanged_items=importer.unchanged,
+            skipped_items=importer.skipped,
+            errors=error,
+            log=f"{getattr(file, 'filename', None) or 'upload'}: {importer.summary()}",
+        )
+    if error and not importer.processed:
+        flash(request, error, "error")
+    elif error:
+        flash(request, f"Import stopped: {error} ({importer.summary()} before the error)", "error")
+    else:
+        flash(request, f"Import done: {importer.summary()}", "success")
     return RedirectResponse("/admin/cars", status_code=303)
 
 # Bulk actions
@@ -808,12 +1338,15 @@ def admin_cars_bulk(
                         )
             flash(request, f"Assigned {len(id_list)} car(s)", "success")
         s.commit()
+    notify_changes()
     return RedirectResponse("/admin/cars", status_code=303)
 
 @app.get("/admin/cars/{car_id}", response_class=HTMLResponse)
 def admin_car_edit(request: Request, car_id: int, _=Depends(admin_session_required)):
     with DBSession(engine) as s:
         car = s.get(Car, car_id)
+        if car:
+            car.details  # load the long-form fields before the session closes
         makes = s.exec(select(Make).order_by(Make.name)).all()
         models = s.exec(select(Model).order_by(Model.name)).all()
         categories = s.exec(select(Category).order_by(Category.name)).all()
@@ -824,7 +1357,7 @@ def admin_car_edit(request: Request, car_id: int, _=Depends(admin_session_requir
             images_text = "\n".join(json.loads(car.images_json))
         except Exception:
             images_text = car.images_json
-    t = csrf_token(request)
+    csrf_token(request)
     resp = templates.TemplateResponse(
         request,
         "admin_car_edit.html",
@@ -857,7 +1390,7 @@ def admin_car_update(
     _=Depends(admin_session_required),
 ):
     require_csrf(request, csrf)
-    allowed = set(Car.model_fields.keys())
+    allowed = set(Car.model_fields.keys()) | set(DETAIL_FIELDS)
     with DBSession(engine) as s:
         make_id_i = _to_int(make_id)
         model_id_i = _to_int(car_model_id)
@@ -875,6 +1408,12 @@ def admin_car_update(
         before = car.model_dump() if hasattr(car, "model_dump") else car.__dict__.copy()
         for k, v in payload.items():
             setattr(car, k, v)
+        try:
+            s.flush()
+        except IntegrityError:
+            flash(request, DUPLICATE_CAR_MSG, "error")
+            return RedirectResponse(f"/admin/cars/{car_id}", status_code=303)
+        dedup.index_rows(s.connection(), [(car_id, {**car.model_dump(), **car.detail_values()})])
         audit(
             request.session.get("admin_user", "admin"),
             "update",
@@ -886,6 +1425,7 @@ def admin_car_update(
         )
         s.add(car)
         s.commit()
+    notify_changes()
     flash(request, "Car updated", "success")
     return RedirectResponse("/admin/cars", status_code=303)
 
@@ -908,9 +1448,125 @@ def admin_car_delete(request: Request, car_id: int, _=Depends(admin_session_requ
             )
             s.add(car)
             s.commit()
+    notify_changes()
     flash(request, "Car deleted", "success")
     return RedirectResponse("/admin/cars", status_code=303)
 
+# Duplicates
+DEDUP_FIELDS = ("id", "title", "year", "make", "model", "trim", "mileage", "price", "vin",
+                "source", "url", "image_url", "auction_status")
+
+
+@app.get("/admin/duplicates", response_class=HTMLResponse)
+def admin_duplicates(request: Request, _=Depends(admin_session_required)):
+    with engine.connect() as conn:
+        groups = dedup.clusters(conn)
+        ids = [i for g in groups for i in g]
+        cars = {}
+        for i in range(0, len(ids), dedup.IN_CHUNK):
+            part = ids[i:i + dedup.IN_CHUNK]
+            rows = conn.execute(
+                text(f"SELECT {', '.join(DEDUP_FIELDS)} FROM cars WHERE id IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                ),
+                {"ids": part},
+            ).mappings().all()
+            cars.update({r["id"]: r for r in rows})
+    return templates.TemplateResponse(
+        request,
+        "admin_duplicates.html",
+        {
+            "clusters": [[cars[i] for i in g if i in cars] for g in groups],
+            "title": "Duplicates",
+            "csrf": csrf_token(request),
+            "flash": pop_flash(request),
+        },
+    )
+
+
+def _cluster_ids(ids: str) -> list[int]:
+    return [int(x) for x in ids.split(",") if x.strip().isdigit()]
+
+
+@app.post("/admin/duplicates/merge")
+def admin_duplicates_merge(
+    request: Request,
+    csrf: str = Form(...),
+    ids: str = Form(...),
+    keep: int = Form(...),
+    _=Depends(admin_session_required),
+):
+    """Keep one listing of a cluster and soft-delete the rest.
+
+    Empty fields on the kept car are filled from the duplicates, except the
+    feed identity (VIN, source, lot, URL) which stays with each duplicate so
+    re-imports keep landing on the retired row instead of resurrecting it.
+    """
+    require_csrf(request, csrf)
+    ids = _cluster_ids(ids)
+    if keep not in ids or len(ids) < 2:
+        flash(request, "Pick the listing to keep", "error")
+        return RedirectResponse("/admin/duplicates", status_code=303)
+    actor = request.session.get("admin_user", "admin")
+    ip = get_ip(request)
+    now = datetime.now(timezone.utc).isoformat()
+    with DBSession(engine) as s:
+        kept = s.get(Car, keep)
+        if not kept:
+            raise HTTPException(status_code=404)
+        before = kept.model_dump()
+        filled = {}
+        for other_id in ids:
+            other = s.get(Car, other_id) if other_id != keep else None
+            if not other or other.deleted_at:
+                continue
+            for f in CONTENT_FIELDS:
+                if f in dedup.IDENTITY_FIELDS or f in filled:
+                    continue
+                if getattr(kept, f, None) in (None, "") and getattr(other, f, None) not in (None, ""):
+                    filled[f] = getattr(other, f)
+                    setattr(kept, f, filled[f])
+            audit(actor, "delete", "cars", other_id, other.model_dump(),
+                  {"deleted_at": now, "merged_into": keep}, ip)
+            other.deleted_at = now
+            s.add(other)
+        if filled:
+            audit(actor, "update", "cars", keep, before, filled, ip)
+        s.add(kept)
+        s.flush()
+        dedup.set_status(s.connection(), ids, "merged")
+        s.commit()
+    notify_changes()
+    flash(request, f"Merged {len(ids) - 1} duplicate(s) into car {keep}", "success")
+    return RedirectResponse("/admin/duplicates", status_code=303)
+
+
+@app.post("/admin/duplicates/dismiss")
+def admin_duplicates_dismiss(
+    request: Request,
+    csrf: str = Form(...),
+    ids: str = Form(...),
+    _=Depends(admin_session_required),
+):
+    require_csrf(request, csrf)
+    with engine.begin() as conn:
+        dedup.set_status(conn, _cluster_ids(ids), "dismissed")
+    flash(request, "Marked as not duplicates", "success")
+    return RedirectResponse("/admin/duplicates", status_code=303)
+
+
+@app.post("/admin/duplicates/reindex")
+def admin_duplicates_reindex(
+    request: Request,
+    csrf: str = Form(...),
+    _=Depends(admin_session_required),
+):
+    require_csrf(request, csrf)
+    found = dedup.reindex(engine)
+    flash(request, f"Index rebuilt; {found} candidate pair(s)", "success")
+    return RedirectResponse("/admin/duplicates", status_code=303)
+
+
 # Imports
 @app.get("/admin/imports", response_class=HTMLResponse)
 def admin_imports(request: Request, _=Depends(admin_session_required)):
@@ -923,6 +1579,7 @@ def admin_imports(request: Request, _=Depends(admin_session_required)):
         "admin_imports.html",
         {
             "jobs": jobs,
+            "sources": sorted(IMPORT_HANDLERS),
             "title": "Imports",
             "csrf": csrf_token(request),
             "flash": pop_flash(request),
@@ -935,12 +1592,23 @@ def admin_imports_run(
     request: Request,
     csrf: str = Form(...),
     source: str = Form(...),
+    file: UploadFile | None = File(None),
     _=Depends(admin_session_required),
 ):
     require_csrf(request, csrf)
+    input_path = None
+    if file and getattr(file, "filename", ""):
+        Path(settings.IMPORT_DIR).mkdir(parents=True, exist_ok=True)
+        dest = Path(settings.IMPORT_DIR) / f"{token_urlsafe(16)}_{Path(file.filename).name}"
+        with open(dest, "wb") as f:
+            shutil.copyfileobj(file.file, f, 1 << 20)
+        input_path = str(dest)
     with DBSession(engine) as s:
         job = ImportJob(
-            source=source, status="queued", created=datetime.now(timezone.utc).isoformat()
+            source=source,
+            status="queued",
+            created=datetime.now(timezone.utc).isoformat(),
+            input_path=input_path,
         )
         s.add(job)
         s.flush()
@@ -955,10 +1623,28 @@ def admin_imports_run(
             get_ip(request),
         )
         s.commit()
+    if import_runner:
+        import_runner.wake()
     flash(request, "Import queued", "success")
     return RedirectResponse("/admin/imports", status_code=303)
 
 
+def _import_resumable(job) -> bool:
+    """Failed/cancelled file jobs, or running ones whose worker stopped reporting."""
+    if not job.input_path or not Path(job.input_path).exists():
+        return False
+    if job.status in ("failed", "cancelled"):
+        return True
+    if job.status == "running":
+        beat = job.heartbeat_at or job.started_at
+        try:
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(beat)).total_seconds()
+        except (TypeError, ValueError):
+            return False
+        return age > settings.IMPORT_STALE_SECONDS
+    return False
+
+
 @app.get("/admin/imports/{id}", response_class=HTMLResponse)
 def admin_import_detail(request: Request, id: int, _=Depends(admin_session_required)):
     with DBSession(engine) as s:
@@ -970,6 +1656,7 @@ def admin_import_detail(request: Request, id: int, _=Depends(admin_session_requi
         "admin_import_detail.html",
         {
             "job": job,
+            "resumable": _import_resumable(job),
             "title": f"Import {id}",
             "csrf": csrf_token(request),
             "flash": pop_flash(request),
@@ -1014,13 +1701,57 @@ def admin_import_cancel(
             flash(request, "Job cancelled", "success")
     return RedirectResponse(f"/admin/imports/{id}", status_code=303)
 
+@app.post("/admin/imports/{id}/resume")
+def admin_import_resume(
+    request: Request,
+    id: int,
+    csrf: str = Form(...),
+    _=Depends(admin_session_required),
+):
+    require_csrf(request, csrf)
+    with DBSession(engine) as s:
+        job = s.get(ImportJob, id)
+        if not job:
+            raise HTTPException(status_code=404)
+        if not _import_resumable(job):
+            flash(request, "Job cannot be resumed", "error")
+            return RedirectResponse(f"/admin/imports/{id}", status_code=303)
+        before = job.model_dump() if hasattr(job, "model_dump") else job.__dict__.copy()
+        # The compare-and-set keeps two admins (or a late crash report) from
+        # requeueing the same job twice, and a heartbeat that landed since
+        # the staleness check proves a running job is still alive.
+        requeued = s.exec(
+            text(
+                "UPDATE import_jobs SET status = 'queued', finished_at = NULL, errors = NULL, "
+                "cancellable = :yes WHERE id = :id AND status = :status AND heartbeat_at IS :beat"
+            ).bindparams(id=id, status=job.status, yes=True, beat=job.heartbeat_at)
+        ).rowcount
+        if requeued:
+            audit(
+                request.session.get("admin_user", "admin"),
+                "update",
+                "import_jobs",
+                id,
+                before,
+                {"status": "queued", "checkpoint_offset": job.checkpoint_offset},
+                get_ip(request),
+            )
+        s.commit()
+    if requeued and import_runner:
+        import_runner.wake()
+    if requeued:
+        flash(request, "Import resumed", "success")
+    else:
+        flash(request, "Job cannot be resumed", "error")
+    return RedirectResponse(f"/admin/imports/{id}", status_code=303)
+
 # Settings
 @app.get("/admin/settings", response_class=HTMLResponse)
 def admin_settings(request: Request, _=Depends(admin_session_required)):
     with DBSession(admin_engine) as s:
         rows = s.exec(text("SELECT key,value FROM settings")).mappings().all()
     data = {r["key"]: r["value"] for r in rows}
-    t = csrf_token(request)
+    csrf_token(request)
     resp = templates.TemplateResponse(
         request,
         "admin_settings.html",
@@ -1127,7 +1858,7 @@ def _admin_seed(request: Request, _=Depends(admin_session_required)):
     """Insert a few demo cars if table is empty, then show a tiny report."""
     from starlette.responses import PlainTextResponse
     try:
-        with Session(engine) as s:
+        with DBSession(engine) as s:
             try:
                 has = s.exec(select(func.count()).select_from(Car)).one()
             except Exception:
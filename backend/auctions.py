@@ -0,0 +1,270 @@
+"""Auction lifecycle: end-time parsing, response-time ``time_left`` and the
+scheduler that closes auctions when they end.
+
+``end_time`` arrives as whatever the source scraped (ISO timestamps, epoch
+numbers, "Ends June 25th at 5:47 PM UTC"), and the stored ``time_left`` is
+a snapshot from scrape time.  ``time_left`` is therefore recomputed from
+``end_time`` whenever a car is served.
+
+``AuctionScheduler`` keeps a min-heap of ``(end_ts, car_id)`` for LIVE cars.
+It is filled once at startup and then kept current by the change tailer
+(see ``live.ChangeTailer``), so it never scans ``cars``.  A single thread
+sleeps until the earliest end and flips exactly the due rows to ENDED.
+"""
+import heapq
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Optional
+
+from sqlalchemy import text
+
+log = logging.getLogger("vinfreak.auctions")
+
+_MONTHS = {m: i for i, m in enumerate(
+    ("january", "february", "march", "april", "may", "june", "july",
+     "august", "september", "october", "november", "december"), 1)}
+_HUMAN = re.compile(
+    r"(?:ends?|ended|ending)?\s*(?:on\s+)?([a-z]+)\s+(\d{1,2})(?:st|nd|rd|th)?,?\s*(\d{4})?"
+    r"\s*(?:at\s+)?(\d{1,2}):(\d{2})\s*([ap]m)?",
+    re.I,
+)
+MAX_SLEEP = 60.0  # re-check the clock at least this often
+RETRY_SECONDS = 1.0  # pause after a failed run_due before trying again
+
+
+def parse_end_time(value, now: Optional[float] = None) -> Optional[float]:
+    """Epoch seconds for a scraped ``end_time``, or ``None`` if unreadable.
+
+    Human dates without a year take the year that puts them closest to
+    ``now`` (the closest past one for "Ended ..." texts).
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        ts = float(value)
+        return ts / 1000 if ts > 1e12 else ts
+    s = str(value).strip()
+    try:
+        ts = float(s)
+        return ts / 1000 if ts > 1e12 else ts
+    except ValueError:
+        pass
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.timestamp()
+    except ValueError:
+        pass
+    m = _HUMAN.search(s)
+    if not m or m.group(1).lower() not in _MONTHS:
+        return None
+    month, day = _MONTHS[m.group(1).lower()], int(m.group(2))
+    hour, minute = int(m.group(4)), int(m.group(5))
+    if m.group(6):
+        hour = hour % 12 + (12 if m.group(6).lower() == "pm" else 0)
+    now = time.time() if now is None else now
+
+    def at(year):
+        try:
+            return datetime(year, month, day, hour, minute, tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            return None
+
+    if m.group(3):
+        return at(int(m.group(3)))
+    this_year = datetime.fromtimestamp(now, timezone.utc).year
+    candidates = [t for t in (at(y) for y in (this_year - 1, this_year, this_year + 1)) if t]
+    if s.lower().startswith("ended"):
+        candidates = [t for t in candidates if t <= now] or candidates
+    return min(candidates, key=lambda t: abs(t - now)) if candidates else None
+
+
+def format_time_left(seconds: float) -> str:
+    if seconds <= 0:
+        return "Ended"
+    seconds = int(seconds)
+    days, rem = divmod(seconds, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, secs = divmod(rem, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m {secs}s"
+    return f"{secs}s"
+
+
+def apply_live_fields(car: dict, now: Optional[float] = None) -> dict:
+    """Fill ``time_left`` from ``end_time`` at response time.
+
+    A LIVE car whose end has passed is reported as ENDED even if the
+    scheduler has not written that yet.  Cars with an unreadable
+    ``end_time`` keep their stored values.
+    """
+    now = time.time() if now is None else now
+    end = parse_end_time(car.get("end_time"), now)
+    if end is None:
+        return car
+    car["time_left"] = format_time_left(end - now)
+    if end <= now and (car.get("auction_status") or "").upper() == "LIVE":
+        car["auction_status"] = "ENDED"
+    return car
+
+
+class AuctionScheduler:
+    """Close LIVE auctions at their ``end_time`` with targeted UPDATEs.
+
+    ``on_changes`` is a change-tailer listener (needs the ``end_time`` and
+    ``auction_status`` columns).  Heap entries are invalidated lazily: the
+    authoritative schedule is ``_due``, and popped entries that no longer
+    match it are skipped.
+    """
+
+    def __init__(self, engine, on_end: Optional[Callable[[list], None]] = None):
+        self.engine = engine
+        self.on_end = on_end
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, tuple[float, str]] = {}
+        self._cv = threading.Condition()
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+        self.ended = 0
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def schedule(self, car_id: int, end_time) -> None:
+        ts = parse_end_time(end_time)
+        if ts is None:
+            self.cancel(car_id)
+            return
+        with self._cv:
+            if self._due.get(car_id) == (ts, end_time):
+                return
+            self._due[car_id] = (ts, end_time)
+            heapq.heappush(self._heap, (ts, car_id))
+            if self._heap[0] == (ts, car_id):
+                self._cv.notify()
+
+    def cancel(self, car_id: int) -> None:
+        with self._cv:
+            self._due.pop(car_id, None)
+
+    def load(self) -> int:
+        """Schedule every LIVE car with an end time (once, at startup)."""
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, end_time FROM cars WHERE UPPER(auction_status) = 'LIVE' "
+                    "AND end_time IS NOT NULL AND end_time != '' "
+                    "AND deleted_ts = 0"
+                )
+            ).all()
+        for car_id, end_time in rows:
+            self.schedule(car_id, end_time)
+        return len(self)
+
+    def on_changes(self, rows: dict, deleted: list) -> None:
+        for car_id, row in rows.items():
+            if (row.get("auction_status") or "").upper() == "LIVE":
+                self.schedule(car_id, row.get("end_time"))
+            else:
+                self.cancel(car_id)
+        for car_id in deleted:
+            self.cancel(car_id)
+
+    def next_due(self) -> Optional[float]:
+        with self._cv:
+            self._prune()
+            return self._heap[0][0] if self._heap else None
+
+    def _prune(self) -> None:
+        while self._heap:
+            ts, car_id = self._heap[0]
+            entry = self._due.get(car_id)
+            if entry and entry[0] == ts:
+                return
+            heapq.heappop(self._heap)
+
+    def run_due(self, now: Optional[float] = None) -> list[int]:
+        """End every auction due by ``now``; returns the ids actually flipped."""
+        now = time.time() if now is None else now
+        due = []
+        with self._cv:
+            self._prune()
+            while self._heap and self._heap[0][0] <= now:
+                ts, car_id = heapq.heappop(self._heap)
+                entry = self._due.get(car_id)
+                if entry and entry[0] == ts:
+                    del self._due[car_id]
+                    due.append((car_id, entry[1]))
+                self._prune()
+        if not due:
+            return []
+        ended = []
+        try:
+            with self.engine.begin() as conn:
+                for car_id, end_time in due:
+                    # The end_time guard skips rows extended since they were queued.
+                    # Feeds store their own casing of the status ("Live").
+                    res = conn.execute(
+                        text(
+                            "UPDATE cars SET auction_status = 'ENDED' "
+                            "WHERE id = :id AND UPPER(auction_status) = 'LIVE' AND end_time = :end"
+                        ),
+                        {"id": car_id, "end": end_time},
+                    )
+                    if res.rowcount:
+                        ended.append(car_id)
+        except Exception:
+            # Nothing was committed: put the auctions back unless a change
+            # rescheduled them meanwhile, so a busy database only delays them.
+            with self._cv:
+                for car_id, end_time in due:
+                    if car_id not in self._due:
+                        self._due[car_id] = (parse_end_time(end_time), end_time)
+                        heapq.heappush(self._heap, (self._due[car_id][0], car_id))
+            raise
+        self.ended += len(ended)
+        if ended:
+            log.info("ended %d auction(s): %s", len(ended), ended[:20])
+            if self.on_end:
+                self.on_end(ended)
+        return ended
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="auction-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        with self._cv:
+            self._stop = True
+            self._cv.notify()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cv:
+                if self._stop:
+                    return
+                self._prune()
+                wait = MAX_SLEEP
+                if self._heap:
+                    wait = min(wait, max(0.0, self._heap[0][0] - time.time()))
+                if wait > 0:
+                    self._cv.wait(wait)
+                if self._stop:
+                    return
+            try:
+                self.run_due()
+            except Exception:
+                log.exception("auction scheduler failed")
+                with self._cv:
+                    if not self._stop:
+                        self._cv.wait(RETRY_SECONDS)  # the failed auctions are due at once
@@ -1,5 +1,4 @@
 from pydantic_settings import BaseSettings
-from pydantic import Field
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent
@@ -15,5 +14,65 @@ class Settings(BaseSettings):
     ADMIN_DATABASE_URL: str = f"sqlite:///{BASE_DIR / 'admin.db'}"
     UPLOAD_DIR: str = (BASE_DIR / "uploads").as_posix()
     SECRET_KEY: str = "change-me"
+    # Background import jobs: uploaded files are kept outside UPLOAD_DIR
+    # (which is publicly served) until the runner has processed them.
+    IMPORT_DIR: str = (BASE_DIR / "imports").as_posix()
+    IMPORT_MAX_RUNNING: int = 1  # concurrent jobs across all workers
+    IMPORT_POLL_SECONDS: float = 5.0
+    IMPORT_BATCH_PAUSE: float = 0.0  # seconds to yield between batches
+    # A running job with no progress for this long is treated as crashed and
+    # may be resumed from its checkpoint.
+    IMPORT_STALE_SECONDS: float = 300.0
+    # Live updates (/cars/stream): how often each worker checks the change
+    # log, and how much a slow SSE client may have queued before it is told
+    # to resync.
+    LIVE_POLL_SECONDS: float = 0.5
+    LIVE_BUFFER_BYTES: int = 256 * 1024
+    LIVE_HEARTBEAT_SECONDS: float = 15.0
+    # How often each worker compacts car_changes down to one entry per car.
+    LIVE_COMPACT_SECONDS: float = 600.0
+    # Compression of the long-form car_details text: "off", "zlib" or "dict"
+    # (zlib with per-source preset dictionaries).  Existing rows are only
+    # rewritten by ``python textpack.py repack``.
+    TEXT_COMPRESSION: str = "off"
+    # Answer /cars from an in-memory columnar copy of the live catalog
+    # (catalog.ColumnarCatalog); costs a few hundred bytes per car per worker.
+    COLUMNAR_CATALOG: bool = False
+    # Path of the binary catalog snapshot that warms up new workers (see
+    # snapshot.py); empty to disable.  One worker rewrites it at most every
+    # CATALOG_SNAPSHOT_SECONDS while the catalog changes.
+    CATALOG_SNAPSHOT: str = (BASE_DIR / "catalog.snap").as_posix()
+    CATALOG_SNAPSHOT_SECONDS: float = 5.0
+    # Rendered /cars and /cars/{id} payloads: a per-worker LRU in front of a
+    # SQLite file shared by the host's workers (see cache.py); empty path
+    # keeps only the in-process tier.
+    PAYLOAD_CACHE: str = (BASE_DIR / "cache.db").as_posix()
+    PAYLOAD_CACHE_L1_BYTES: int = 32 * 1024 * 1024
+    PAYLOAD_CACHE_L2_BYTES: int = 256 * 1024 * 1024
+    # Admission control (see admission.py): concurrent requests per route
+    # class, how many more may queue, and for how long, before they are shed
+    # with a 503.  All classes share ADMISSION_TOTAL slots, minus
+    # ADMISSION_ADMIN_RESERVE that only admin requests may use.  Keep the
+    # total below the threadpool size (40).
+    ADMISSION_CONTROL: bool = True
+    ADMISSION_TOTAL: int = 32
+    ADMISSION_ADMIN_RESERVE: int = 4
+    ADMISSION_LIMITS: dict[str, int] = {"list": 24, "detail": 24, "admin": 8, "import": 2}
+    ADMISSION_QUEUES: dict[str, int] = {"list": 64, "detail": 64, "admin": 32, "import": 4}
+    ADMISSION_WAIT_SECONDS: dict[str, float] = {"list": 2.0, "detail": 2.0, "admin": 10.0, "import": 30.0}
+    ADMISSION_RETRY_AFTER: float = 2.0
+    # Per-IP token buckets (see ratelimit.py), shared by the host's workers
+    # through RATE_LIMIT_DB: group -> (tokens per second, burst).  Groups are
+    # the admission classes plus "login" (POST /admin/login).  An empty path
+    # disables limiting.
+    RATE_LIMIT_DB: str = (BASE_DIR / "ratelimit.db").as_posix()
+    RATE_LIMITS: dict[str, tuple[float, float]] = {
+        "list": (5.0, 100), "detail": (10.0, 200), "login": (1 / 60, 10),
+    }
+    # Proxies whose X-Forwarded-For hops are believed (addresses or CIDRs).
+    TRUSTED_PROXIES: list[str] = ["127.0.0.1", "::1"]
+    # Origins allowed to call the API from a browser; empty disables CORS.
+    CORS_ORIGINS: list[str] = ["*"]
+    CORS_ALLOW_CREDENTIALS: bool = True
 
 settings = Settings()
@@ -0,0 +1,152 @@
+"""Two-tier cache of rendered API payloads.
+
+L1 is a per-process LRU bounded in bytes.  L2 is a separate SQLite file
+(``PAYLOAD_CACHE``) shared by every worker on the host, and it survives
+restarts, so a deploy or a new worker starts warm instead of stampeding
+``cars.db``.  Values are stored as zlib-compressed JSON.
+
+Keys include the catalog version (``MAX(car_changes.seq)``), so every
+write invalidates everything at once just by moving the version.  Entries
+for older versions are purged from L2 the first time a newer one is
+written.  The cache is best-effort: an L2 error counts as a miss.
+"""
+import json
+import logging
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Optional
+
+from sqlalchemy import create_engine, event, text
+
+log = logging.getLogger("vinfreak.cache")
+
+PRUNE_EVERY = 200  # puts between L2 size checks
+
+
+class PayloadCache:
+    def __init__(self, path: Optional[str] = None, l1_bytes: int = 32 << 20,
+                 l2_bytes: int = 256 << 20, level: int = 6):
+        self.l1_bytes = l1_bytes
+        self.l2_bytes = l2_bytes
+        self.level = level
+        self._l1: "OrderedDict[str, bytes]" = OrderedDict()
+        self._l1_size = 0
+        self._lock = threading.Lock()
+        self._purged = 0  # newest version whose predecessors are gone from L2
+        self._puts = 0
+        self.hits = {"l1": 0, "l2": 0}
+        self.misses = 0
+        self.l2 = None
+        if path:
+            self.l2 = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+            event.listen(self.l2, "connect", _pragmas)
+            with self.l2.begin() as conn:
+                conn.exec_driver_sql(
+                    "CREATE TABLE IF NOT EXISTS payloads (key TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                    "body BLOB NOT NULL, size INTEGER NOT NULL, stored_at REAL NOT NULL)"
+                )
+                conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS idx_payloads_stored ON payloads(stored_at)")
+
+    def _encode(self, value: Any) -> bytes:
+        raw = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+        return zlib.compress(raw.encode("utf-8"), self.level)
+
+    def _remember(self, full_key: str, body: bytes) -> None:
+        with self._lock:
+            old = self._l1.pop(full_key, None)
+            if old is not None:
+                self._l1_size -= len(old)
+            self._l1[full_key] = body
+            self._l1_size += len(body)
+            while self._l1_size > self.l1_bytes and self._l1:
+                _, evicted = self._l1.popitem(last=False)
+                self._l1_size -= len(evicted)
+
+    def get(self, key: str, version: int) -> Any:
+        """The cached value (a fresh copy), or ``None``."""
+        full_key = f"{version}|{key}"
+        with self._lock:
+            body = self._l1.get(full_key)
+            if body is not None:
+                self._l1.move_to_end(full_key)
+                self.hits["l1"] += 1
+        if body is None and self.l2 is not None:
+            try:
+                with self.l2.connect() as conn:
+                    body = conn.execute(
+                        text("SELECT body FROM payloads WHERE key = :k"), {"k": full_key}
+                    ).scalar()
+            except Exception:
+                log.debug("L2 read failed", exc_info=True)
+            if body is not None:
+                self.hits["l2"] += 1
+                self._remember(full_key, body)
+        if body is None:
+            self.misses += 1
+            return None
+        return json.loads(zlib.decompress(body))
+
+    def put(self, key: str, version: int, value: Any) -> None:
+        full_key = f"{version}|{key}"
+        body = self._encode(value)
+        self._remember(full_key, body)
+        if self.l2 is None:
+            return
+        try:
+            with self.l2.begin() as conn:
+                if version > self._purged:
+                    conn.execute(text("DELETE FROM payloads WHERE version < :v"), {"v": version})
+                    self._purged = version
+                conn.execute(
+                    text(
+                        "INSERT OR REPLACE INTO payloads (key, version, body, size, stored_at) "
+                        "VALUES (:k, :v, :b, :s, :t)"
+                    ),
+                    {"k": full_key, "v": version, "b": body, "s": len(body), "t": time.time()},
+                )
+                self._puts += 1
+                if self._puts % PRUNE_EVERY == 0:
+                    self._shrink(conn)
+        except Exception:
+            log.debug("L2 write failed", exc_info=True)
+
+    def _shrink(self, conn) -> None:
+        total = conn.execute(text("SELECT COALESCE(SUM(size), 0) FROM payloads")).scalar()
+        if total <= self.l2_bytes:
+            return
+        # Drop the oldest entries down to ~90% of the budget.
+        conn.execute(
+            text(
+                "DELETE FROM payloads WHERE key IN (SELECT key FROM ("
+                "SELECT key, SUM(size) OVER (ORDER BY stored_at) AS running FROM payloads"
+                ") WHERE running <= :excess)"
+            ),
+            {"excess": total - self.l2_bytes * 9 // 10},
+        )
+
+    def sync(self, version: int) -> None:
+        """Drop L2 entries that claim to be newer than ``version``.
+
+        Only happens when the database went back in time (a restored
+        backup): otherwise those entries would be served once the change log
+        reaches their version again.
+        """
+        if self.l2 is None:
+            return
+        with self.l2.begin() as conn:
+            conn.execute(text("DELETE FROM payloads WHERE version > :v"), {"v": version})
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"l1_entries": len(self._l1), "l1_bytes": self._l1_size,
+                    "hits": dict(self.hits), "misses": self.misses}
+
+
+def _pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=OFF")  # a lost write is just a miss
+    cur.execute("PRAGMA busy_timeout=200")
+    cur.close()
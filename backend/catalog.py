@@ -0,0 +1,336 @@
+"""Listing queries for ``/cars``: one filter/sort spec, two executors.
+
+``where_sql``/``order_sql`` translate a spec to SQL.  ``ColumnarCatalog``
+answers the same spec from memory: the live catalog is held as NumPy
+columns (numbers, dictionary-coded make/model) plus packed bitsets for the
+low-cardinality fields, so a request is a few vectorized masks and an
+``argpartition``/``lexsort`` over the matches, with no ORM hydration.  It
+is optional (``COLUMNAR_CATALOG``), kept current by the change tailer, and
+returns ``None`` for anything it cannot answer (text search), in which case
+the caller runs the SQL.
+
+A spec is a dict:
+
+* ``dealership_id``: int;
+* ``make``/``model``: case-insensitive equality;
+* ``ranges``: ``[(column, op, value)]`` on ``RANGE_COLUMNS``;
+* ``in``: ``{column: [VALUE, ...]}`` on ``CATEGORY_COLUMNS`` (upper case);
+* ``q``: substring search (SQL only).
+
+Both executors order by the ``SORTS`` column with missing values last,
+then by id descending, so paging is stable and identical either way.
+"""
+import logging
+import operator
+import threading
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+log = logging.getLogger("vinfreak.catalog")
+
+RANGE_COLUMNS = ("year", "price", "mileage", "posted_ts", "end_ts", "seller_rating")
+CODE_COLUMNS = ("make", "model")
+CATEGORY_COLUMNS = ("transmission", "drivetrain", "body_type", "auction_status", "state")
+COLUMNS = ("id", "dealership_id", *RANGE_COLUMNS, *CODE_COLUMNS, *CATEGORY_COLUMNS)
+SORTS = {
+    "newest": ("posted_ts", True),
+    "price_asc": ("price", False),
+    "price_desc": ("price", True),
+    "year_asc": ("year", False),
+    "year_desc": ("year", True),
+    "mileage_asc": ("mileage", False),
+    "mileage_desc": ("mileage", True),
+    "ending_soon": ("end_ts", False),
+}
+_OPS = {">=": operator.ge, ">": operator.gt, "<=": operator.le, "<": operator.lt, "=": operator.eq}
+_ZERO_IS_NULL = ("end_ts",)  # 0 means "no end time"
+
+
+def _norm(value) -> str:
+    return (value or "").strip().upper() if isinstance(value, str) else ""
+
+
+def where_sql(spec: dict) -> tuple[str, dict]:
+    """``(condition, params)`` over ``cars`` for ``spec``; live cars only."""
+    where, args = ["cars.deleted_ts = 0"], {}
+    if spec.get("dealership_id") is not None:
+        where.append("cars.dealership_id = :dealership_id")
+        args["dealership_id"] = spec["dealership_id"]
+    for col in CODE_COLUMNS:
+        if spec.get(col):
+            where.append(f"LOWER(TRIM(cars.{col})) = :{col}")
+            args[col] = spec[col].strip().lower()
+    for i, (col, op, value) in enumerate(spec.get("ranges", ())):
+        where.append(f"cars.{col} {op} :r{i}")
+        args[f"r{i}"] = value
+        if col in _ZERO_IS_NULL:
+            where.append(f"cars.{col} > 0")
+    for col, values in spec.get("in", {}).items():
+        names = [f"{col}_{i}" for i in range(len(values))]
+        where.append(f"UPPER(TRIM(COALESCE(cars.{col}, ''))) IN ({', '.join(':' + n for n in names)})")
+        args.update(zip(names, values))
+    if spec.get("q"):
+        where.append(
+            "(cars.title LIKE :q OR cars.make LIKE :q OR cars.model LIKE :q "
+            "OR cars.vin LIKE :q OR cars.lot_number LIKE :q)"
+        )
+        args["q"] = f"%{spec['q']}%"
+    return " AND ".join(where), args
+
+
+def order_sql(sort: str) -> str:
+    if sort not in SORTS or sort == "newest":
+        return "cars.posted_ts DESC, cars.id DESC"  # walks idx_cars_feed
+    col, desc = SORTS[sort]
+    missing = f"cars.{col} = 0" if col in _ZERO_IS_NULL else f"cars.{col} IS NULL"
+    return f"{missing}, cars.{col} {'DESC' if desc else 'ASC'}, cars.id DESC"
+
+
+def _set_bit(bits: np.ndarray, slot: int, on: bool) -> None:
+    # np.packbits order: bit 7 of byte 0 is slot 0
+    if on:
+        bits[slot >> 3] |= np.uint8(0x80 >> (slot & 7))
+    else:
+        bits[slot >> 3] &= np.uint8(~(0x80 >> (slot & 7)) & 0xFF)
+
+
+class ColumnarCatalog:
+    """The live catalog as NumPy columns, answering ``/cars`` specs.
+
+    Cars occupy slots; deletes leave tombstones (``alive``) that are
+    compacted away once they pile up.  ``on_changes`` is a change-tailer
+    listener (needs ``COLUMNS``).  A lock serializes updates and queries;
+    both are short.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.Lock()
+        self._reset(capacity)
+        self.ready = False
+
+    def _reset(self, capacity: int) -> None:
+        self.n = 0
+        self.dead = 0
+        self._slots: dict[int, int] = {}
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.dealer = np.full(capacity, -1, dtype=np.int64)
+        self.nums = {c: np.full(capacity, np.nan) for c in RANGE_COLUMNS}
+        self.codes = {c: np.full(capacity, -1, dtype=np.int32) for c in (*CODE_COLUMNS, *CATEGORY_COLUMNS)}
+        self.vocab: dict[str, dict[str, int]] = {c: {} for c in self.codes}
+        self.bits: dict[str, dict[int, np.ndarray]] = {c: {} for c in CATEGORY_COLUMNS}
+
+    def __len__(self) -> int:
+        return self.n - self.dead
+
+    # -- loading and maintenance ------------------------------------------
+
+    def load(self, engine) -> int:
+        """Replace the contents with every live car (once, at startup)."""
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(f"SELECT {', '.join(COLUMNS)} FROM cars WHERE deleted_ts = 0 ORDER BY id")
+            ).mappings().all()
+        with self._lock:
+            self._reset(max(1024, len(rows) * 5 // 4))
+            n = len(rows)
+            self.n = n
+            self.ids[:n] = [r["id"] for r in rows]
+            self.alive[:n] = True
+            self.dealer[:n] = [-1 if r["dealership_id"] is None else r["dealership_id"] for r in rows]
+            for c in RANGE_COLUMNS:
+                self.nums[c][:n] = [self._number(c, r[c]) for r in rows]
+            for c in self.codes:
+                self.codes[c][:n] = [self._code(c, r[c]) for r in rows]
+            self._slots = {car_id: slot for slot, car_id in enumerate(self.ids[:n].tolist())}
+            self._rebuild_bits()
+            self.ready = True
+        log.info("columnar catalog loaded %d cars", n)
+        return n
+
+    def _number(self, col: str, value) -> float:
+        if value is None or (col in _ZERO_IS_NULL and not value):
+            return np.nan
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    def _code(self, col: str, value) -> int:
+        key = (value or "").strip().lower() if col in CODE_COLUMNS else _norm(value)
+        if not key:
+            return -1
+        vocab = self.vocab[col]
+        if key not in vocab:
+            vocab[key] = len(vocab)
+        return vocab[key]
+
+    def _rebuild_bits(self) -> None:
+        cap = len(self.ids)
+        for col in CATEGORY_COLUMNS:
+            codes = self.codes[col]
+            self.bits[col] = {
+                code: np.packbits(codes == code, bitorder="big")[: (cap + 7) // 8]
+                for code in self.vocab[col].values()
+            }
+
+    def _grow(self) -> None:
+        cap = max(1024, len(self.ids) * 2)
+        pad = lambda a, fill: np.concatenate([a, np.full(cap - len(a), fill, dtype=a.dtype)])
+        self.ids = pad(self.ids, 0)
+        self.alive = pad(self.alive, False)
+        self.dealer = pad(self.dealer, -1)
+        self.nums = {c: pad(a, np.nan) for c, a in self.nums.items()}
+        self.codes = {c: pad(a, -1) for c, a in self.codes.items()}
+        for col, sets in self.bits.items():
+            for code, bits in sets.items():
+                sets[code] = np.concatenate([bits, np.zeros((cap + 7) // 8 - len(bits), dtype=np.uint8)])
+
+    def _compact(self) -> None:
+        keep = np.flatnonzero(self.alive[: self.n])
+        cap = max(1024, len(keep) * 5 // 4)
+        old = (self.ids, self.dealer, self.nums, self.codes)
+        vocab = self.vocab
+        self._reset(cap)
+        self.vocab = vocab
+        self.n = len(keep)
+        self.ids[: self.n] = old[0][keep]
+        self.alive[: self.n] = True
+        self.dealer[: self.n] = old[1][keep]
+        for c in RANGE_COLUMNS:
+            self.nums[c][: self.n] = old[2][c][keep]
+        for c in self.codes:
+            self.codes[c][: self.n] = old[3][c][keep]
+        self._slots = {car_id: slot for slot, car_id in enumerate(self.ids[: self.n].tolist())}
+        self._rebuild_bits()
+
+    def _write(self, slot: int, row: dict) -> None:
+        self.dealer[slot] = -1 if row.get("dealership_id") is None else row["dealership_id"]
+        for c in RANGE_COLUMNS:
+            self.nums[c][slot] = self._number(c, row.get(c))
+        for c in CODE_COLUMNS:
+            self.codes[c][slot] = self._code(c, row.get(c))
+        for c in CATEGORY_COLUMNS:
+            old, new = self.codes[c][slot], self._code(c, row.get(c))
+            if old == new:
+                continue
+            sets = self.bits[c]
+            if old >= 0:
+                _set_bit(sets[old], slot, False)
+            if new >= 0:
+                if new not in sets:
+                    sets[new] = np.zeros((len(self.ids) + 7) // 8, dtype=np.uint8)
+                _set_bit(sets[new], slot, True)
+            self.codes[c][slot] = new
+
+    def on_changes(self, rows: dict, deleted: list) -> None:
+        with self._lock:
+            if not self.ready:
+                return
+            for car_id in deleted:
+                slot = self._slots.pop(car_id, None)
+                if slot is not None:
+                    self.alive[slot] = False
+                    self.dead += 1
+            for car_id, row in rows.items():
+                slot = self._slots.get(car_id)
+                if slot is None:
+                    if self.n == len(self.ids):
+                        self._grow()
+                    slot = self._slots[car_id] = self.n
+                    self.n += 1
+                    self.ids[slot] = car_id
+                    self.alive[slot] = True
+                    for c in CATEGORY_COLUMNS:
+                        self.codes[c][slot] = -1
+                self._write(slot, row)
+            if self.dead > max(1024, self.n // 4):
+                self._compact()
+
+    def export(self) -> tuple[dict[str, np.ndarray], dict[str, list[str]]]:
+        """Compacted copies of the columns and the vocabularies (for snapshots)."""
+        with self._lock:
+            keep = np.flatnonzero(self.alive[: self.n])
+            arrays = {"id": self.ids[keep], "dealership_id": self.dealer[keep]}
+            arrays.update({c: a[keep] for c, a in self.nums.items()})
+            arrays.update({c: a[keep] for c, a in self.codes.items()})
+            vocab = {c: sorted(v, key=v.get) for c, v in self.vocab.items()}
+        return arrays, vocab
+
+    def restore(self, arrays: dict[str, np.ndarray], vocab: dict[str, list[str]]) -> int:
+        """Adopt ``export``-shaped columns as they are (e.g. views of a mapped file).
+
+        They are used without copying; the first insert beyond their length
+        moves everything to regular memory.
+        """
+        with self._lock:
+            n = len(arrays["id"])
+            self.n, self.dead = n, 0
+            self.ids = arrays["id"]
+            self.alive = np.ones(n, dtype=bool)
+            self.dealer = arrays["dealership_id"]
+            self.nums = {c: arrays[c] for c in RANGE_COLUMNS}
+            self.codes = {c: arrays[c] for c in self.vocab}
+            self.vocab = {c: {v: i for i, v in enumerate(vocab.get(c, []))} for c in self.codes}
+            self._slots = {car_id: slot for slot, car_id in enumerate(self.ids.tolist())}
+            self._rebuild_bits()
+            self.ready = True
+        return n
+
+    # -- queries ----------------------------------------------------------
+
+    def query(self, spec: dict, sort: str = "newest", offset: int = 0,
+              limit: Optional[int] = None) -> Optional[tuple[list[int], int]]:
+        """``(ids of the requested page, total matches)``, or ``None`` to use SQL."""
+        if not self.ready or spec.get("q") or sort not in SORTS:
+            return None
+        with self._lock:
+            n = self.n
+            mask = self.alive[:n].copy()
+            if spec.get("dealership_id") is not None:
+                mask &= self.dealer[:n] == spec["dealership_id"]
+            for col in CODE_COLUMNS:
+                if spec.get(col):
+                    code = self.vocab[col].get(spec[col].strip().lower())
+                    if code is None:
+                        return [], 0
+                    mask &= self.codes[col][:n] == code
+            with np.errstate(invalid="ignore"):
+                for col, op, value in spec.get("ranges", ()):
+                    if col not in self.nums or op not in _OPS:
+                        return None
+                    mask &= _OPS[op](self.nums[col][:n], value)
+            packed = None
+            for col, values in spec.get("in", {}).items():
+                if col not in self.bits:
+                    return None
+                sets = self.bits[col]
+                any_of = np.zeros((len(self.ids) + 7) // 8, dtype=np.uint8)
+                for v in values:
+                    code = self.vocab[col].get(_norm(v))
+                    if code is not None:
+                        any_of |= sets[code]
+                packed = any_of if packed is None else packed & any_of
+            if packed is not None:
+                mask &= np.unpackbits(packed, count=n, bitorder="big").astype(bool)
+            idx = np.flatnonzero(mask)
+            col, desc = SORTS[sort]
+            key = self.nums[col][idx]
+            if desc:
+                key = -key
+            key = np.where(np.isnan(key), np.inf, key)
+            ids = self.ids[idx]
+        total = len(idx)
+        end = total if limit is None else min(total, offset + limit)
+        if offset >= end:
+            return [], total
+        if end < total // 2:
+            # Only the first ``end`` rows matter: keep those at or before the
+            # end-th key (ties included) and sort just them.
+            kth = key[np.argpartition(key, end - 1)[end - 1]]
+            top = key <= kth
+            key, ids = key[top], ids[top]
+        order = np.lexsort((-ids, key))[offset:end]
+        return ids[order].tolist(), total
@@ -1,7 +1,19 @@
-from sqlmodel import create_engine, SQLModel, Session
-from sqlalchemy import text
+import logging
+from datetime import datetime, timezone
+from typing import Optional
+from sqlmodel import create_engine, SQLModel
+from sqlalchemy import event, text
 from backend_settings import settings
-from models import Make, Model, Category, Dealership, Car, ImportJob
+from models import (
+    Make, Model, Category, Dealership, Car, CarDetails, ImportJob, BulkBatch,
+    CarSignature, CarLSHBucket, DuplicatePair, CarChange, CarRollup, TextDictionary, CAR_CHANGE_TRIGGERS,
+)
+import rollups
+import textpack
+from live import compact_changes
+from ingest import CONTENT_FIELDS, DETAIL_FIELDS, NUMERIC_COLUMNS, TIMESTAMP_COLUMNS, canonical_url, coerce_typed, content_hash, natural_key
+
+log = logging.getLogger("vinfreak.db")
 
 
 
@@ -31,25 +43,198 @@ def ensure_columns():
             "time_left": "TEXT",
             "number_of_views": "INTEGER",
             "number_of_bids": "INTEGER",
-            "highlights": "TEXT",
-            "equipment": "TEXT",
-            "modifications": "TEXT",
-            "known_flaws": "TEXT",
-            "service_history": "TEXT",
-            "ownership_history": "TEXT",
-            "seller_notes": "TEXT",
-            "other_items": "TEXT",
             "engine": "TEXT",
-            "images_json": "TEXT",
             "location_address": "TEXT",
             "location_url": "TEXT",
             "seller_url": "TEXT",
+            "content_hash": "TEXT",
+            "natural_key": "TEXT",
+            "posted_ts": "INTEGER NOT NULL DEFAULT 0",
+            "end_ts": "INTEGER NOT NULL DEFAULT 0",
+            "deleted_ts": "INTEGER NOT NULL DEFAULT 0",
         }
         for col, typ in wanted.items():
             if col not in have:
                 s.exec(text(f"ALTER TABLE cars ADD COLUMN {col} {typ}"))
+        info = s.exec(text("PRAGMA table_info(import_jobs);")).all()
+        have = {row[1] for row in info}
+        wanted = {
+            "input_path": "TEXT",
+            "input_digest": "TEXT",
+            "checkpoint_offset": "INTEGER",
+            "heartbeat_at": "TEXT",
+            "unchanged_items": "INTEGER DEFAULT 0",
+            "skipped_items": "INTEGER DEFAULT 0",
+        }
+        for col, typ in wanted.items():
+            if col not in have:
+                s.exec(text(f"ALTER TABLE import_jobs ADD COLUMN {col} {typ}"))
         s.commit()
 
+def _qualified(field: str) -> str:
+    return f"car_details.{field}" if field in DETAIL_FIELDS else f"cars.{field}"
+
+
+def _legacy_detail_columns(conn) -> list[str]:
+    have = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(cars)")}
+    return [f for f in DETAIL_FIELDS if f in have]
+
+
+def split_car_details():
+    """Copy the long-form text of a legacy ``cars`` table into ``car_details``.
+
+    Safe to run on every start: only cars without a ``car_details`` row are
+    copied, and the old columns are left in place.  Nothing reads them (raw
+    queries list ``Car``'s columns instead of ``cars.*``), but they go stale,
+    so each start logs a warning until they are dropped.
+    Dropping them is a separate, explicit step: ``drop_legacy_detail_columns``.
+    """
+    with engine.begin() as conn:
+        legacy = _legacy_detail_columns(conn)
+        if not legacy:
+            return
+        cols = ", ".join(legacy)
+        if "images_json" in legacy:
+            # Listings keep only the hero image, so make sure there is one.
+            conn.exec_driver_sql(
+                "UPDATE cars SET image_url = json_extract(images_json, '$[0]') "
+                "WHERE COALESCE(image_url, '') = '' AND json_valid(images_json) "
+                "AND json_type(images_json) = 'array' "
+                "AND id NOT IN (SELECT car_id FROM car_details)"
+            )
+        conn.exec_driver_sql(
+            f"INSERT INTO car_details (car_id, {cols}) SELECT id, {cols} FROM cars "
+            f"WHERE ({' OR '.join(f'{c} IS NOT NULL' for c in legacy)}) "
+            "AND id NOT IN (SELECT car_id FROM car_details)"
+        )
+
+
+def drop_legacy_detail_columns(backup: Optional[str] = None) -> list[str]:
+    """Drop the legacy text columns from ``cars`` after backing the DB up.
+
+    Irreversible, and a build older than the ``car_details`` split cannot
+    read the result, so this only runs from ``python db.py
+    drop-legacy-columns``.  Needs SQLite 3.35+ for ``DROP COLUMN``.  Writes
+    ``backup`` (default: next to the database, timestamped) with ``VACUUM
+    INTO`` first.  Run ``VACUUM`` afterwards to return the freed pages.
+    """
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("Only SQLite databases are supported")
+    split_car_details()  # nothing may be lost with the columns
+    with engine.connect() as conn:
+        version = conn.exec_driver_sql("SELECT sqlite_version()").scalar()
+        legacy = _legacy_detail_columns(conn)
+    if not legacy:
+        return []
+    if tuple(int(x) for x in version.split(".")[:2]) < (3, 35):
+        raise RuntimeError(f"SQLite {version} cannot DROP COLUMN; 3.35 or newer is required")
+    if backup is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        backup = f"{engine.url.database}.before-drop-{stamp}"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM INTO ?", (backup,))
+    with engine.begin() as conn:
+        for c in legacy:
+            conn.exec_driver_sql(f"ALTER TABLE cars DROP COLUMN {c}")
+    return legacy
+
+
+def backfill_natural_keys():
+    """Derive ``natural_key``/``content_hash`` for rows written before they existed.
+
+    When several legacy rows map to the same key only the oldest keeps it;
+    the others stay NULL so the unique index can be built (ORM edits leave
+    them NULL too, see ``models._derive_car_keys``).  URL keys from before
+    ``canonical_url`` kept query strings are re-derived.
+    """
+    with engine.begin() as conn:
+        rekey = [
+            {"id": car_id, "k": "url:" + canonical_url(url)}
+            for car_id, key, url in conn.execute(
+                text("SELECT id, natural_key, url FROM cars WHERE natural_key LIKE 'url:%'")
+            )
+            if url and key != "url:" + canonical_url(url)
+        ]
+        if rekey:
+            # Each new key refines a distinct old one, so they stay unique.
+            conn.execute(text("UPDATE cars SET natural_key = :k WHERE id = :id"), rekey)
+        rows = conn.execute(
+            text(
+                f"SELECT cars.id, {', '.join(_qualified(f) for f in CONTENT_FIELDS)} FROM cars "
+                "LEFT JOIN car_details ON car_details.car_id = cars.id "
+                "WHERE cars.natural_key IS NULL ORDER BY cars.id"
+            )
+        ).mappings().all()
+        if not rows:
+            return
+        taken = {r[0] for r in conn.execute(text("SELECT natural_key FROM cars WHERE natural_key IS NOT NULL"))}
+        updates = []
+        rows = [textpack.unpack_row(r, DETAIL_FIELDS) for r in rows]
+        for r in rows:
+            key = natural_key(r)
+            if key in taken:
+                key = None
+            elif key:
+                taken.add(key)
+            updates.append({"id": r["id"], "k": key, "h": content_hash(r)})
+        conn.execute(text("UPDATE cars SET natural_key = :k, content_hash = :h WHERE id = :id"), updates)
+
+
+def backfill_typed_columns(batch_size: int = 1000):
+    """Fill the epoch shadows and retype seller fields for rows that need it.
+
+    Candidates are rows with a TEXT timestamp but no epoch yet, or seller
+    numbers stored as text.  Timestamps that cannot be parsed stay 0.
+    """
+    stale = " OR ".join(
+        [f"({col} = 0 AND COALESCE({src}, '') != '')" for col, src in TIMESTAMP_COLUMNS.items()]
+        + [f"typeof({col}) = 'text'" for col in NUMERIC_COLUMNS]
+    )
+    cols = ", ".join([*TIMESTAMP_COLUMNS.values(), *TIMESTAMP_COLUMNS, *NUMERIC_COLUMNS])
+    sets = ", ".join(f"{c} = :{c}" for c in (*TIMESTAMP_COLUMNS, *NUMERIC_COLUMNS))
+    last = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, {cols} FROM cars WHERE id > :last AND ({stale}) ORDER BY id LIMIT :n"),
+                {"last": last, "n": batch_size},
+            ).mappings().all()
+            if not rows:
+                return
+            updates = [dict(coerce_typed(dict(r)), id=r["id"]) for r in rows]
+            conn.execute(text(f"UPDATE cars SET {sets} WHERE id = :id"), updates)
+            last = rows[-1]["id"]
+
+
+def ensure_change_log():
+    """Install the change-log triggers, log cars that predate them and compact.
+
+    Compaction keeps only each car's latest entry; running processes repeat
+    it from their change tailer (``LIVE_COMPACT_SECONDS``).
+    """
+    with engine.begin() as conn:
+        for sql in CAR_CHANGE_TRIGGERS:
+            conn.exec_driver_sql(sql)
+        conn.execute(
+            text(
+                "INSERT INTO car_changes (car_id, op, changed_at) "
+                "SELECT id, CASE WHEN deleted_at IS NULL OR deleted_at = '' THEN 'upsert' ELSE 'delete' END, "
+                ":now FROM cars WHERE id NOT IN (SELECT car_id FROM car_changes) ORDER BY id"
+            ),
+            {"now": datetime.now(timezone.utc).isoformat()},
+        )
+        compact_changes(conn)
+
+
+def ensure_rollups():
+    """Install the rollup triggers; fill ``car_rollups`` the first time."""
+    with engine.begin() as conn:
+        for sql in rollups.CAR_ROLLUP_TRIGGERS:
+            conn.exec_driver_sql(sql)
+        if conn.execute(text("SELECT COUNT(*) FROM car_rollups")).scalar() == 0:
+            rollups.rebuild(conn)
+
+
 engine = create_engine(
 
 
@@ -58,6 +243,17 @@ engine = create_engine(
     connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
 )
 
+if settings.DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        # WAL lets readers keep going while bulk imports write; NORMAL sync is
+        # durable across app crashes and much cheaper per commit than FULL.
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
 def init_db():
     """Initialize application database."""
     # Create tables if they do not already exist.  Previously the ``cars``
@@ -76,10 +272,27 @@ def init_db():
             Category.__table__,
             Dealership.__table__,
             Car.__table__,
+            CarDetails.__table__,
             ImportJob.__table__,
+            BulkBatch.__table__,
+            CarSignature.__table__,
+            CarLSHBucket.__table__,
+            DuplicatePair.__table__,
+            CarChange.__table__,
+            CarRollup.__table__,
+            TextDictionary.__table__,
         ],
     )
     ensure_columns()
+    split_car_details()
+    with engine.connect() as conn:
+        legacy = _legacy_detail_columns(conn)
+    if legacy:
+        # Writes only go to car_details, so these copies are already stale.
+        log.warning(
+            "cars still has the legacy detail columns %s; nothing reads them, run "
+            "`python db.py drop-legacy-columns` to remove them", ", ".join(legacy),
+        )
     # --- ensure cars.lot_number exists for legacy DBs ---
     try:
         from sqlmodel import Session
@@ -111,4 +324,29 @@ def init_db():
         s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_model ON cars(model)"))
         s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_posted_at ON cars(posted_at)"))
         s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_status ON cars(auction_status)"))
+        # Listing order (live cars, newest first) and time/rating range scans.
+        s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_feed ON cars(deleted_ts, posted_ts DESC, id DESC)"))
+        s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_ending ON cars(auction_status, end_ts)"))
+        s.exec(text("CREATE INDEX IF NOT EXISTS idx_cars_rating ON cars(deleted_ts, seller_rating)"))
+        s.commit()
+    backfill_typed_columns()
+    backfill_natural_keys()
+    with Session(engine) as s:
+        s.exec(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_cars_natural_key ON cars(natural_key)"))
         s.commit()
+    ensure_change_log()
+    ensure_rollups()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(prog="python db.py", description="database migrations")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    dp = sub.add_parser("drop-legacy-columns", help="drop the long-form text columns left in cars")
+    dp.add_argument("--backup", help="where to write the backup (default: next to the database)")
+    args = p.parse_args()
+    if args.cmd == "drop-legacy-columns":
+        init_db()
+        dropped = drop_legacy_detail_columns(args.backup)
+        print(f"dropped: {', '.join(dropped)}" if dropped else "nothing to drop")
@@ -0,0 +1,259 @@
+"""Near-duplicate listing detection with MinHash + LSH.
+
+The same car shows up from several feeds (and from admins typing it in),
+often without a VIN, so natural keys cannot catch it.  Each listing is
+reduced to a set of shingles: word 3-grams of its normalized title and
+description, plus coarse year/mileage tokens.  A MinHash signature of
+``NUM_PERM`` values estimates Jaccard similarity between two such sets.
+
+The signature is split into ``BANDS`` bands of ``ROWS`` values and each band
+is hashed into ``car_lsh``.  Listings that share any bucket are candidates,
+so indexing a new listing costs one indexed lookup per band instead of a scan
+of the catalog.  Candidates whose estimated similarity reaches ``THRESHOLD``
+are recorded in ``car_duplicates`` for an admin to merge or dismiss.
+
+``index_rows`` runs on the caller's connection, so a listing is indexed in
+the same transaction that writes it.
+"""
+import hashlib
+import re
+from array import array
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, text
+
+import textpack
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4  # P(candidate) ~ 1 - (1 - s^4)^16: ~50% at s=0.5, ~98% at s=0.75
+THRESHOLD = 0.6
+MIN_SHINGLES = 4  # too little text to say anything useful
+IN_CHUNK = 500
+
+_PRIME = (1 << 31) - 1  # a * h stays below 2**63 for 32-bit shingle hashes
+# Fixed, reproducible permutations: signatures are stored, so they must not
+# change between processes.
+_A, _B = (
+    np.array(
+        [
+            int.from_bytes(hashlib.blake2b(b"%s%d" % (tag, i), digest_size=8).digest(), "big")
+            % (_PRIME - 1) + 1
+            for i in range(NUM_PERM)
+        ],
+        dtype=np.uint64,
+    ).reshape(-1, 1)
+    for tag in (b"a", b"b")
+)
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Fields that identify a listing in its feed.  A merge never copies these onto
+# the kept row; they stay with the duplicate so re-imports keep matching it.
+IDENTITY_FIELDS = {"vin", "source", "lot_number", "url"}
+
+
+def shingles(row: dict) -> set[str]:
+    words = _WORD.findall(f"{row.get('title') or ''} {row.get('description') or ''}".lower())
+    out = {" ".join(words[i:i + 3]) for i in range(max(0, len(words) - 2))}
+    if len(words) < 3:
+        out.update(words)
+    if row.get("year"):
+        out.add(f"year:{row['year']}")
+    try:
+        out.add(f"mileage:{round(float(row['mileage']) / 5000)}")
+    except (KeyError, TypeError, ValueError):
+        pass
+    return out
+
+
+def signature(tokens: Iterable[str]) -> Optional[list[int]]:
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(t.encode("utf-8"), digest_size=4).digest(), "big") for t in tokens),
+        dtype=np.uint64,
+    )
+    if len(hashes) < MIN_SHINGLES:
+        return None
+    # All permutations at once: (NUM_PERM, 1) x (n,) -> (NUM_PERM, n).
+    return ((_A * hashes + _B) % _PRIME).min(axis=1).tolist()
+
+
+def similarity(sig_a: list[int], sig_b: list[int]) -> float:
+    return sum(x == y for x, y in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def band_hashes(sig: list[int]) -> list[tuple[int, int]]:
+    out = []
+    for band in range(BANDS):
+        chunk = array("I", sig[band * ROWS:(band + 1) * ROWS]).tobytes()
+        h = int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "big", signed=True)
+        out.append((band, h))
+    return out
+
+
+def _pack(sig: list[int]) -> bytes:
+    return array("I", sig).tobytes()
+
+
+def _unpack(raw: bytes) -> list[int]:
+    a = array("I")
+    a.frombytes(raw)
+    return a.tolist()
+
+
+def _chunks(seq: list, n: int = IN_CHUNK):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
+def index_rows(conn, rows: Iterable[tuple[int, dict]]) -> int:
+    """(Re)index ``(car_id, row)`` pairs and record new candidate pairs.
+
+    Returns the number of duplicate pairs found or refreshed.
+    """
+    sigs = {car_id: signature(shingles(row)) for car_id, row in rows}
+    if not sigs:
+        return 0
+    ids = list(sigs)
+    for part in _chunks(ids):
+        params = {"ids": part}
+        conn.execute(
+            text("DELETE FROM car_lsh WHERE car_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            params,
+        )
+        conn.execute(
+            text("DELETE FROM car_minhash WHERE car_id IN :ids").bindparams(bindparam("ids", expanding=True)),
+            params,
+        )
+    indexed = {cid: sig for cid, sig in sigs.items() if sig}
+    if not indexed:
+        return 0
+    conn.execute(
+        text("INSERT INTO car_minhash (car_id, signature) VALUES (:c, :s)"),
+        [{"c": cid, "s": _pack(sig)} for cid, sig in indexed.items()],
+    )
+    buckets = {cid: band_hashes(sig) for cid, sig in indexed.items()}
+    conn.execute(
+        text("INSERT INTO car_lsh (band, bucket, car_id) VALUES (:b, :h, :c)"),
+        [{"b": b, "h": h, "c": cid} for cid, bands in buckets.items() for b, h in bands],
+    )
+
+    # Candidate lookup: one indexed IN query per band.
+    by_bucket: dict[tuple[int, int], set[int]] = {}
+    for band in range(BANDS):
+        wanted = list({bands[band][1] for bands in buckets.values()})
+        for part in _chunks(wanted):
+            found = conn.execute(
+                text(
+                    "SELECT car_lsh.bucket, car_lsh.car_id FROM car_lsh "
+                    "JOIN cars ON cars.id = car_lsh.car_id "
+                    "WHERE car_lsh.band = :band AND car_lsh.bucket IN :buckets "
+                    "AND cars.deleted_ts = 0"
+                ).bindparams(bindparam("buckets", expanding=True)),
+                {"band": band, "buckets": part},
+            )
+            for bucket, cid in found:
+                by_bucket.setdefault((band, bucket), set()).add(cid)
+    pairs = set()
+    for cid, bands in buckets.items():
+        for key in bands:
+            for other in by_bucket.get(key, ()):
+                if other != cid:
+                    pairs.add((min(cid, other), max(cid, other)))
+    if not pairs:
+        return 0
+
+    known = dict(indexed)
+    vins = {}
+    for part in _chunks(list({c for p in pairs for c in p})):
+        for cid, raw, vin in conn.execute(
+            text(
+                "SELECT car_minhash.car_id, car_minhash.signature, cars.vin FROM car_minhash "
+                "JOIN cars ON cars.id = car_minhash.car_id WHERE car_minhash.car_id IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": part},
+        ):
+            vins[cid] = (vin or "").strip().upper() or None
+            if cid not in known:
+                known[cid] = _unpack(raw)
+    now = datetime.now(timezone.utc).isoformat()
+    found = []
+    for a, b in pairs:
+        if a not in known or b not in known:
+            continue
+        if vins.get(a) and vins.get(b) and vins[a] != vins[b]:
+            continue  # two different VINs are two different cars
+        score = similarity(known[a], known[b])
+        if score >= THRESHOLD:
+            found.append({"a": a, "b": b, "s": score, "now": now})
+    if found:
+        # A dismissed or merged pair stays decided; only its score is refreshed.
+        conn.execute(
+            text(
+                "INSERT INTO car_duplicates (car_id, other_id, score, status, found_at) "
+                "VALUES (:a, :b, :s, 'open', :now) "
+                "ON CONFLICT (car_id, other_id) DO UPDATE SET score = excluded.score"
+            ),
+            found,
+        )
+    return len(found)
+
+
+def reindex(engine, batch_size: int = 1000) -> int:
+    """Rebuild the index for every live car (for catalogs that predate it)."""
+    total, last = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT cars.id, cars.title, car_details.description, cars.year, cars.mileage "
+                    "FROM cars LEFT JOIN car_details ON car_details.car_id = cars.id "
+                    "WHERE cars.id > :last AND cars.deleted_ts = 0 "
+                    "ORDER BY cars.id LIMIT :n"
+                ),
+                {"last": last, "n": batch_size},
+            ).mappings().all()
+            if not rows:
+                return total
+            total += index_rows(conn, [(r["id"], textpack.unpack_row(r, ("description",))) for r in rows])
+            last = rows[-1]["id"]
+
+
+def clusters(conn, limit: int = 100) -> list[list[int]]:
+    """Open candidate pairs grouped into connected components (union-find)."""
+    parent: dict[int, int] = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    rows = conn.execute(
+        text(
+            "SELECT d.car_id, d.other_id FROM car_duplicates d "
+            "JOIN cars a ON a.id = d.car_id JOIN cars b ON b.id = d.other_id "
+            "WHERE d.status = 'open' "
+            "AND a.deleted_ts = 0 AND b.deleted_ts = 0"
+        )
+    )
+    for a, b in rows:
+        parent[find(a)] = find(b)
+    groups: dict[int, list[int]] = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    out = sorted((sorted(g) for g in groups.values()), key=lambda g: (-len(g), g[0]))
+    return out[:limit]
+
+
+def set_status(conn, ids: Iterable[int], status: str) -> None:
+    """Close every open pair among ``ids``."""
+    ids = list(ids)
+    conn.execute(
+        text(
+            "UPDATE car_duplicates SET status = :status WHERE status = 'open' "
+            "AND car_id IN :ids AND other_id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"status": status, "ids": ids},
+    )
@@ -0,0 +1,10 @@
+"""Scrape importers: source adapters, shared normalization and sinks.
+
+Run ``python -m importers --help`` from ``backend/`` for the CLI.
+"""
+from .core import normalize
+from .sources import SOURCES, get_source, register
+from .sinks import DbSink, HttpSink
+from .pipeline import StageStats, run
+
+__all__ = ["SOURCES", "register", "get_source", "normalize", "run", "StageStats", "HttpSink", "DbSink"]
@@ -0,0 +1,66 @@
+"""``python -m importers <source> <file.json> [--db | --api URL]``
+
+Streams the dump (JSON array, or NDJSON for ``.ndjson``/``.jsonl``), runs
+each item through the source adapter and writes the rows to the running API
+(default) or, with ``--db``, straight into ``DATABASE_URL``.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+
+from ingest import iter_json_array
+
+from . import SOURCES, DbSink, HttpSink, StageStats, run
+
+
+def iter_ndjson(fp):
+    for line in fp:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m importers", description=__doc__.splitlines()[0])
+    p.add_argument("source", choices=sorted(SOURCES))
+    p.add_argument("path", help="JSON array or NDJSON dump")
+    where = p.add_mutually_exclusive_group()
+    where.add_argument("--api", default=os.getenv("VINFREAK_API", "http://127.0.0.1:8000"),
+                       help="POST to this app's /cars/bulk (default: %(default)s)")
+    where.add_argument("--db", action="store_true",
+                       help="write directly into DATABASE_URL instead of going through the API")
+    p.add_argument("--batch-size", type=int, default=None)
+    p.add_argument("--concurrency", type=int, default=4,
+                   help="batches in flight against the API (default: %(default)s)")
+    p.add_argument("--workers", type=int, default=0,
+                   help="normalize on this many processes (0 = inline, -1 = one per core)")
+    args = p.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    sized = {"batch_size": args.batch_size} if args.batch_size else {}
+    if args.db:
+        import textpack
+        from backend_settings import settings
+        from db import engine, init_db
+        init_db()
+        textpack.configure(settings.TEXT_COMPRESSION, engine=engine)
+        sink = DbSink(engine, **sized)
+    else:
+        auth = (os.getenv("ADMIN_USER", "admin"), os.getenv("ADMIN_PASS", "admin"))
+        sink = HttpSink(args.api, auth, concurrency=args.concurrency, **sized)
+
+    workers = (os.cpu_count() or 1) if args.workers < 0 else args.workers
+    stats = StageStats(workers)
+    ndjson = args.path.endswith((".ndjson", ".jsonl"))
+    with open(args.path, "rb") as fp:
+        items = iter_ndjson(fp) if ndjson else iter_json_array(fp)
+        counts = run(args.source, items, sink, workers=workers, stats=stats)
+    print("Done. " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
+    print(f"{stats.items} items; throughput per stage: {stats.report()}")
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
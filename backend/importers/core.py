@@ -0,0 +1,171 @@
+"""Normalization shared by every scrape source.
+
+The Cars & Bids and Porsche dumps use the same scraper schema (camelCase keys,
+``offer.price``, ``location.address``, ``*List`` text blocks).  ``normalize``
+maps one scraped item onto ``cars`` columns; adapters only pick the source
+label and how the make is determined.
+"""
+import re
+from datetime import datetime
+from typing import Optional
+
+_US_STATE = re.compile(r"\b([A-Z]{2})\b")
+_LOT_FROM_URL = re.compile(r"/auctions/([^/]+)/")
+
+
+def parse_year(title: Optional[str], fallback=None):
+    m = re.match(r"^\s*(\d{4})\b", title or "")
+    return int(m.group(1)) if m else fallback
+
+
+def parse_state(status: Optional[str], address: Optional[str]) -> Optional[str]:
+    if status:
+        m = re.search(r"\(([A-Z]{2})\)", status)
+        if m:
+            return m.group(1)
+    if address:
+        m = _US_STATE.search(address)
+        if m:
+            return m.group(1)
+    return None
+
+
+def parse_city(address: Optional[str]) -> Optional[str]:
+    if not address:
+        return None
+    return address.split(",")[0].strip() or None
+
+
+def map_drivetrain(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return None
+    s = s.lower()
+    if "rear" in s:
+        return "RWD"
+    if "front" in s:
+        return "FWD"
+    if "all" in s:
+        return "AWD"
+    if "4-wheel" in s or "4wd" in s or "four" in s:
+        return "4WD"
+    return None
+
+
+def map_transmission(s: Optional[str]) -> Optional[str]:
+    if not s:
+        return None
+    s = s.lower()
+    if "manual" in s:
+        return "manual"
+    if "auto" in s:
+        return "automatic"
+    return s
+
+
+def num_clean(x, float_ok: bool = False):
+    """``"12,345"`` -> 12345; blanks and garbage -> None."""
+    if x is None or isinstance(x, bool):
+        return None
+    s = str(x).replace(",", "").strip()
+    if not s:
+        return None
+    try:
+        return float(s) if float_ok else int(float(s))
+    except ValueError:
+        return None
+
+
+def join_list(lst) -> Optional[str]:
+    if isinstance(lst, list):
+        return " • ".join(str(x).strip() for x in lst if str(x).strip()) or None
+    return None
+
+
+def guess_trim(title: Optional[str], make: Optional[str], model: Optional[str],
+               max_len: int = 60) -> Optional[str]:
+    """Whatever is left of the title after year, make and model."""
+    if not (title and make and model):
+        return None
+    t = re.sub(r"^\s*\d{4}\s+", "", title)
+    t = re.sub(rf"^{re.escape(make)}\s+", "", t, flags=re.I)
+    t = re.sub(rf"^{re.escape(model)}\s*", "", t, flags=re.I).strip(" -–:|")
+    return t if t and len(t) <= max_len else None
+
+
+def lot_from_url(url: Optional[str]) -> Optional[str]:
+    m = _LOT_FROM_URL.search(url or "")
+    return m.group(1) if m else None
+
+
+def normalize(item: dict, source: str, make: Optional[str] = None) -> Optional[dict]:
+    """Map one scraped listing onto ``cars`` columns.
+
+    ``make`` overrides whatever the item says (single-make feeds).  Returns
+    None when make, model, year or price is missing, which the API cannot
+    list anyway.
+    """
+    if not isinstance(item, dict):
+        return None
+    title = item.get("title") or None
+    make = make or item.get("carMark") or item.get("make")
+    model = item.get("model")
+    year = num_clean(item.get("year")) or parse_year(title)
+    offer = item.get("offer") or {}
+    price = num_clean(offer.get("price", item.get("price")), float_ok=True)
+    if not (make and model and year and price is not None):
+        return None
+
+    loc = item.get("location") or {}
+    address = loc.get("address")
+    seller = item.get("seller") or {}
+    url = item.get("url")
+    body_type = item.get("bodyStyle") or item.get("bodyStayle")
+    images = item.get("images") or []
+
+    return {
+        "vin": item.get("vin"),
+        "make": make,
+        "model": model,
+        "trim": guess_trim(title, make, model),
+        "title": title,
+        "year": int(year),
+        "mileage": num_clean(item.get("mileage")),
+        "price": price,
+        "currency": offer.get("currency"),
+        "city": parse_city(address),
+        "state": parse_state(item.get("status"), address),
+        "location_address": address,
+        "location_url": loc.get("url"),
+        "seller_type": item.get("sellerType"),
+        "seller_name": seller.get("name"),
+        "seller_url": seller.get("url"),
+        "seller_rating": num_clean(seller.get("rating"), float_ok=True),
+        "seller_reviews": num_clean(seller.get("reviews")),
+        "exterior_color": item.get("exteriorColor"),
+        "interior_color": item.get("interiorColor"),
+        "transmission": map_transmission(item.get("transmission")),
+        "drivetrain": map_drivetrain(item.get("drivetrain")),
+        "fuel_type": None,
+        "body_type": body_type.lower() if isinstance(body_type, str) else None,
+        "auction_status": item.get("auctionStatus") or item.get("status"),
+        "lot_number": item.get("lotNumber") or item.get("lot_number") or lot_from_url(url),
+        "end_time": item.get("endTime"),
+        "time_left": item.get("timeLeft"),
+        "number_of_views": num_clean(item.get("numberOfViews")),
+        "number_of_bids": num_clean(item.get("numberOfBids")),
+        "description": item.get("description"),
+        "highlights": item.get("highlights") or join_list(item.get("highlightsList")),
+        "equipment": item.get("equipment") or join_list(item.get("equipmentList")),
+        "modifications": join_list(item.get("modificationsList")),
+        "known_flaws": join_list(item.get("knownFlowsList") or item.get("knownFlawsList")),
+        "service_history": join_list(item.get("serviceHistoryList")),
+        "ownership_history": item.get("ownershipHistory"),
+        "seller_notes": item.get("sellerNotes"),
+        "other_items": item.get("otherItems"),
+        "engine": item.get("engine"),
+        # Hero + gallery split happens in ingest.prepare_item.
+        "images": images if isinstance(images, list) else None,
+        "posted_at": datetime.utcnow().isoformat(),
+        "source": source,
+        "url": url,
+    }
@@ -0,0 +1,143 @@
+"""Where normalized rows go.
+
+``HttpSink`` posts batches to a running app's ``/cars/bulk``; ``DbSink``
+writes straight into a database with the same upsert the endpoint uses, for
+local imports that do not need the HTTP round trip.  Both expose ``add(row)``
+and ``close() -> counts``.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import inspect
+
+from ingest import BATCH_SIZE, CarImport
+
+log = logging.getLogger("vinfreak.importers")
+
+COUNT_KEYS = ("inserted", "updated", "unchanged", "skipped")
+
+
+class HttpSink:
+    """Post batches to ``/cars/bulk`` over a pooled session.
+
+    Up to ``concurrency`` batches are in flight at once.  Each batch carries
+    an ``Idempotency-Key``, so retrying 5xx responses, timeouts and dropped
+    connections (with exponential backoff) cannot double count a batch the
+    server already applied.  The batch size adapts to observed latency:
+    it grows while round trips stay well under ``target_latency`` and halves
+    when they exceed it or fail.
+    """
+
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, api: str, auth: Optional[tuple[str, str]] = None,
+                 batch_size: int = 200, concurrency: int = 4, timeout: float = 60,
+                 retries: int = 5, backoff: float = 0.5, target_latency: float = 2.0,
+                 min_batch: int = 50, max_batch: int = 5000):
+        self.url = api.rstrip("/") + "/cars/bulk"
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.target_latency = target_latency
+        self.min_batch, self.max_batch = min_batch, max_batch
+        self.session = requests.Session()
+        self.session.auth = auth
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.pool = ThreadPoolExecutor(self.concurrency, thread_name_prefix="bulk-post")
+        self.inflight: deque = deque()
+        self.pending: list[dict] = []
+        self.lock = threading.Lock()
+        self.counts = dict.fromkeys(COUNT_KEYS, 0)
+        self.counts["failed"] = self.counts["retries"] = 0
+
+    def add(self, row: dict) -> None:
+        self.pending.append(row)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        while len(self.inflight) >= self.concurrency:
+            self.inflight.popleft().result()
+        self.inflight.append(self.pool.submit(self._send, uuid.uuid4().hex, batch))
+
+    def close(self) -> dict:
+        self.flush()
+        while self.inflight:
+            self.inflight.popleft().result()
+        self.pool.shutdown()
+        self.session.close()
+        return self.counts
+
+    def _send(self, batch_id: str, batch: list[dict]) -> None:
+        body = json.dumps(batch, ensure_ascii=False, default=str).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Idempotency-Key": batch_id}
+        for attempt in range(self.retries + 1):
+            started = time.monotonic()
+            retry_after = None
+            try:
+                r = self.session.post(self.url, data=body, headers=headers, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                error = repr(e)
+            else:
+                if r.ok:
+                    self._record(len(batch), time.monotonic() - started, r.json())
+                    return
+                error = f"{r.status_code} {r.text[:400]}"
+                if r.status_code not in self.RETRY_STATUS:
+                    break
+                retry_after = r.headers.get("Retry-After")
+            self._shrink()
+            if attempt < self.retries:
+                with self.lock:
+                    self.counts["retries"] += 1
+                delay = self.backoff * 2 ** attempt
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+                time.sleep(delay * random.uniform(0.8, 1.2))
+        log.error("batch %s (%d rows) failed: %s", batch_id, len(batch), error)
+        with self.lock:
+            self.counts["failed"] += len(batch)
+
+    def _record(self, n: int, latency: float, res: dict) -> None:
+        with self.lock:
+            for k in COUNT_KEYS:
+                self.counts[k] += res.get(k, 0)
+            if latency < self.target_latency / 2 and n >= self.batch_size:
+                self.batch_size = min(self.max_batch, int(self.batch_size * 1.5))
+            elif latency > self.target_latency:
+                self.batch_size = max(self.min_batch, self.batch_size // 2)
+        log.info("batch ok in %.2fs (%d rows, next %d): %s", latency, n, self.batch_size, res)
+
+    def _shrink(self) -> None:
+        with self.lock:
+            self.batch_size = max(self.min_batch, self.batch_size // 2)
+
+
+class DbSink:
+    def __init__(self, engine, batch_size: int = BATCH_SIZE):
+        columns = [c["name"] for c in inspect(engine).get_columns("cars")]
+        self.importer = CarImport(engine, columns, batch_size)
+
+    def add(self, row: dict) -> None:
+        if self.importer.add(row):
+            self.importer.flush()
+
+    def close(self) -> dict:
+        self.importer.flush()
+        return self.importer.counts()
@@ -0,0 +1,53 @@
+"""Source adapters: raw scraped item -> ``cars`` row (or None to skip).
+
+Register new feeds with ``@register("name")``; the CLI, and the admin import
+jobs, pick them up by name.
+"""
+from typing import Callable, Optional
+
+from .core import normalize
+
+Adapter = Callable[[dict], Optional[dict]]
+
+SOURCES: dict[str, Adapter] = {}
+
+
+def register(name: str):
+    def deco(fn: Adapter) -> Adapter:
+        SOURCES[name] = fn
+        return fn
+    return deco
+
+
+def get_source(name: str) -> Adapter:
+    try:
+        return SOURCES[name.strip().lower()]
+    except KeyError:
+        raise ValueError(
+            f"Unknown import source: {name!r} (known: {', '.join(sorted(SOURCES))})"
+        ) from None
+
+
+@register("carsandbids")
+def carsandbids(item: dict) -> Optional[dict]:
+    return normalize(item, source="carsandbids")
+
+
+@register("porsche")
+def porsche(item: dict) -> Optional[dict]:
+    # Porsche-only scrape: the make field is missing or unreliable.
+    return normalize(item, source="porsche_json", make="Porsche")
+
+
+_SCRAPE_KEYS = ("offer", "carMark", "location")
+
+
+@register("json")
+def generic_json(item: dict) -> Optional[dict]:
+    """Rows already shaped like ``cars`` pass through untouched; anything that
+    looks like a scraper dump is normalized like the other feeds."""
+    if not isinstance(item, dict):
+        return None
+    if any(k in item for k in _SCRAPE_KEYS):
+        return normalize(item, source=item.get("source") or "json_import")
+    return item
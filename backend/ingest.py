@@ -0,0 +1,588 @@
+"""Streaming, batched car imports.
+
+The admin JSON upload used to ``json.loads`` the whole file and then run a
+SELECT, a validated ``Car(**data)`` and a flush per row.  The helpers here
+decode the upload incrementally, look up existing VINs with chunked ``IN``
+queries and write rows with ``executemany`` in batches, so memory stays flat
+and a large scrape file costs a handful of round trips per thousand rows.
+
+Each row carries a ``content_hash`` over its feed fields so daily re-imports
+only rewrite listings whose price, bids, status etc. actually changed, and a
+unique ``natural_key`` (VIN, else source + lot number, else URL) that serves
+as the upsert conflict target.
+
+Everything works on plain SQLAlchemy connections; callers own the engine.
+"""
+import codecs
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from json.decoder import WHITESPACE
+from typing import Iterable, Iterator, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import bindparam, text
+
+import dedup
+import textpack
+from auctions import parse_end_time
+
+BATCH_SIZE = 1000
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+IN_CHUNK = 500
+READ_CHUNK = 1 << 16
+# Refuse to buffer more than this while waiting for a single item to finish.
+MAX_ITEM_CHARS = 64 << 20
+
+# Listing content that comes from a feed.  Admin-owned columns (catalog ids,
+# dealership, posted_at, deleted_at) are neither hashed nor overwritten by
+# re-imports.
+CONTENT_FIELDS = (
+    "vin", "make", "model", "trim", "year", "mileage", "price", "currency",
+    "city", "state", "seller_type", "exterior_color", "interior_color",
+    "transmission", "drivetrain", "fuel_type", "body_type", "auction_status",
+    "lot_number", "end_time", "time_left", "number_of_views", "number_of_bids",
+    "source", "url", "title", "description", "highlights", "equipment",
+    "modifications", "known_flaws", "service_history", "ownership_history",
+    "seller_notes", "other_items", "engine", "image_url", "images_json",
+    "location_address", "location_url", "seller_name", "seller_url",
+    "seller_rating", "seller_reviews",
+)
+# Long-form listing text, stored 1:1 in ``car_details`` so the filterable
+# ``cars`` rows stay small.  Only detail views read it.
+DETAIL_FIELDS = (
+    "description", "highlights", "equipment", "modifications", "known_flaws",
+    "service_history", "ownership_history", "seller_notes", "other_items", "images_json",
+)
+# Integer shadows of the TEXT timestamps (epoch seconds, 0 when unset).
+# Queries filter and sort on these; the TEXT columns are kept for display.
+TIMESTAMP_COLUMNS = {"posted_ts": "posted_at", "end_ts": "end_time", "deleted_ts": "deleted_at"}
+NUMERIC_COLUMNS = {"seller_rating": float, "seller_reviews": int}
+
+
+class JSONArrayParser:
+    """Incrementally decode a top-level JSON array.
+
+    Feed text chunks as they arrive; each call returns the array elements that
+    were completed by that chunk.  Only the unparsed tail is kept in memory.
+
+    The parser also tracks the UTF-8 byte offset just past each element, so a
+    later run can ``seek`` there and continue with ``resume=True`` (which
+    starts as if an element had just been read).
+    """
+
+    def __init__(self, resume: bool = False, offset: int = 0):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._state = "sep" if resume else "start"  # start -> first -> sep/value -> done
+        self._offset = offset  # bytes consumed before _buf[0]
+
+    def feed(self, chunk: str) -> list:
+        return [v for v, _ in self.feed_offsets(chunk)]
+
+    def close(self) -> list:
+        return [v for v, _ in self.close_offsets()]
+
+    def feed_offsets(self, chunk: str) -> list[tuple]:
+        """Like ``feed`` but returns ``(element, byte_offset_after_it)`` pairs."""
+        self._buf += chunk
+        return self._drain(final=False)
+
+    def close_offsets(self) -> list[tuple]:
+        items = self._drain(final=True)
+        if self._state != "done":
+            raise json.JSONDecodeError("Unterminated JSON array", self._buf, len(self._buf))
+        return items
+
+    def _drain(self, final: bool) -> list[tuple]:
+        buf, pos, items = self._buf, 0, []
+        counted = 0  # buf[:counted] is already included in self._offset
+        while True:
+            pos = WHITESPACE.match(buf, pos).end()
+            if pos >= len(buf):
+                break
+            ch = buf[pos]
+            if self._state == "start":
+                if ch != "[":
+                    raise ValueError("JSON must be an array of objects")
+                self._state, pos = "first", pos + 1
+            elif self._state == "sep":
+                if ch == ",":
+                    self._state, pos = "value", pos + 1
+                elif ch == "]":
+                    self._state, pos = "done", pos + 1
+                else:
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+            elif self._state == "first" and ch == "]":
+                self._state, pos = "done", pos + 1
+            elif self._state in ("first", "value"):
+                try:
+                    value, end = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if final or len(buf) - pos > MAX_ITEM_CHARS:
+                        raise
+                    break  # item continues in the next chunk
+                # A bare number at the end of the buffer may still be growing.
+                if end == len(buf) and not final and not isinstance(value, (dict, list, str)):
+                    break
+                self._offset += len(buf[counted:end].encode("utf-8"))
+                counted = end
+                items.append((value, self._offset))
+                self._state, pos = "sep", end
+            else:  # done: only trailing whitespace is allowed
+                raise json.JSONDecodeError("Extra data", buf, pos)
+        self._offset += len(buf[counted:pos].encode("utf-8"))
+        self._buf = buf[pos:]
+        return items
+
+
+def iter_json_array_offsets(fp, chunk_size: int = READ_CHUNK, offset: int = 0) -> Iterator[tuple]:
+    """Yield ``(element, byte_offset_after_it)`` from a binary JSON array file.
+
+    With ``offset`` (a value previously yielded) reading starts there, i.e.
+    with the element following the one that offset was reported for.
+    """
+    resume = offset > 0
+    if resume:
+        fp.seek(offset)
+    elif fp.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8:
+        offset = len(codecs.BOM_UTF8)
+    else:
+        fp.seek(0)
+    parser = JSONArrayParser(resume=resume, offset=offset)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        yield from parser.feed_offsets(decoder.decode(chunk))
+    yield from parser.feed_offsets(decoder.decode(b"", final=True))
+    yield from parser.close_offsets()
+
+
+def iter_json_array(fp, chunk_size: int = READ_CHUNK) -> Iterator:
+    """Yield the elements of a JSON array read from a text or binary file."""
+    parser = JSONArrayParser()
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        yield from parser.feed(chunk)
+    yield from parser.feed(decoder.decode(b"", final=True))
+    yield from parser.close()
+
+
+def chunked(seq: Iterable, n: int) -> Iterator[list]:
+    buf = []
+    for x in seq:
+        buf.append(x)
+        if len(buf) >= n:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+def parse_images(value: Optional[str]) -> list[str]:
+    """Return a list of image URLs from various textual inputs.
+
+    Accepts JSON arrays, comma-separated strings, or newline separated
+    lists. Invalid JSON falls back to splitting on commas/newlines.
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+    if not value:
+        return []
+    try:
+        parsed = json.loads(value)
+        if isinstance(parsed, list):
+            return [str(x) for x in parsed if x]
+        if isinstance(parsed, str):
+            return [parsed] if parsed else []
+    except Exception:
+        pass
+    parts = [p.strip() for p in str(value).replace(",", "\n").splitlines() if p.strip()]
+    return parts
+
+
+def prepare_item(item: dict, columns: Iterable[str]) -> dict:
+    """Map a scraped/exported item onto ``cars`` columns.
+
+    An ``images`` list becomes ``image_url`` (hero) plus ``images_json``
+    (remaining gallery, de-duplicated).  Nested values are stored as JSON
+    text so a single odd row cannot fail a whole batch.
+    """
+    imgs_val = item.get("images")
+    if imgs_val:
+        if isinstance(imgs_val, list):
+            imgs = [str(x).strip() for x in imgs_val if x]
+        else:
+            imgs = parse_images(imgs_val)
+        unique = list(dict.fromkeys(u for u in imgs if u))
+        if unique:
+            item = dict(item)
+            item["image_url"] = unique[0]
+            item["images_json"] = json.dumps(unique[1:]) if len(unique) > 1 else None
+    row = dict.fromkeys(columns)
+    for k in row.keys() & item.keys():
+        v = item[k]
+        if isinstance(v, (dict, list)):
+            v = json.dumps(v, ensure_ascii=False)
+        row[k] = v
+    return row
+
+
+def to_epoch(value) -> int:
+    ts = parse_end_time(value)
+    return int(ts) if ts and ts > 0 else 0
+
+
+def _to_number(value, kind):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return kind(float(str(value).replace(",", "").strip()))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def coerce_typed(row: dict) -> dict:
+    """Derive the epoch columns and coerce numeric seller fields, in place.
+
+    Only keys already present in ``row`` are touched, so this works for both
+    full import rows and partial admin edits.  An unreadable ``deleted_at``
+    still marks the row deleted.
+    """
+    for col, src in TIMESTAMP_COLUMNS.items():
+        if col in row or src in row:
+            value = row.get(src)
+            ts = to_epoch(value)
+            if not ts and col == "deleted_ts" and value not in (None, ""):
+                ts = 1
+            row[col] = ts
+    for col, kind in NUMERIC_COLUMNS.items():
+        if col in row:
+            row[col] = _to_number(row[col], kind)
+    return row
+
+
+def _norm(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def content_hash(row: dict) -> str:
+    """Fingerprint the feed-owned fields of a car row.
+
+    Values are normalized first (whitespace trimmed, empty strings as NULL,
+    integral floats as ints) so cosmetic differences between scrapes do not
+    register as changes.
+    """
+    payload = json.dumps(
+        [_norm(row.get(f)) for f in CONTENT_FIELDS],
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+# Query parameters that only track where a visitor came from.  Anything
+# else in a listing URL may be its identity (``?id=123``).
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "_ga", "_gl",
+}
+
+
+def canonical_url(url: str) -> str:
+    """``url`` without fragment, tracking parameters or a trailing slash."""
+    parts = urlsplit(url.strip())
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm") and k.lower() not in TRACKING_PARAMS
+    ]
+    return urlunsplit(parts._replace(path=parts.path.rstrip("/"), query=urlencode(query), fragment=""))
+
+
+def natural_key(row: dict) -> Optional[str]:
+    """Stable identity of a listing across sources and re-scrapes.
+
+    VIN when present, else source + lot number, else the listing URL with
+    tracking parameters removed (``canonical_url``).
+    """
+    vin = row.get("vin")
+    if isinstance(vin, str) and vin.strip():
+        return "vin:" + vin.strip().upper()
+    lot = row.get("lot_number")
+    if lot not in (None, ""):
+        return f"lot:{(row.get('source') or '').strip().lower()}:{str(lot).strip()}"
+    url = row.get("url")
+    if isinstance(url, str) and url.strip():
+        return "url:" + canonical_url(url)
+    return None
+
+
+def existing_by_key(conn, keys: Iterable[str]) -> dict[str, tuple[int, Optional[str]]]:
+    """Map natural keys already in ``cars`` to their ``(id, content_hash)``."""
+    stmt = text(
+        "SELECT natural_key, id, content_hash FROM cars WHERE natural_key IN :keys"
+    ).bindparams(bindparam("keys", expanding=True))
+    found = {}
+    for part in chunked(keys, IN_CHUNK):
+        found.update((r[0], (r[1], r[2])) for r in conn.execute(stmt, {"keys": part}))
+    return found
+
+
+def _placeholders(conn, n: int) -> str:
+    style = conn.dialect.paramstyle
+    if style == "qmark":
+        return ", ".join("?" * n)
+    if style == "numeric":
+        return ", ".join(f":{i}" for i in range(1, n + 1))
+    return ", ".join(["%s"] * n)
+
+
+def upsert_rows(conn, rows: list[dict], columns: list[str], update_columns: list[str]) -> None:
+    """Insert-or-update ``rows`` by ``natural_key`` with one DB-API ``executemany``.
+
+    Goes straight to the driver: SQLAlchemy's per-row parameter processing
+    costs more than SQLite's own insert at these batch sizes.  The UPDATE arm
+    is guarded by the content hash so a concurrent writer that already stored
+    the same content does not cause a redundant rewrite.
+    """
+    if not rows:
+        return
+    distinct = "IS DISTINCT FROM" if conn.dialect.name == "postgresql" else "IS NOT"
+    sets = ", ".join(f"{c} = excluded.{c}" for c in update_columns)
+    sql = (
+        f"INSERT INTO cars ({', '.join(columns)}) VALUES ({_placeholders(conn, len(columns))}) "
+        f"ON CONFLICT (natural_key) DO UPDATE SET {sets} "
+        f"WHERE cars.content_hash {distinct} excluded.content_hash"
+    )
+    conn.exec_driver_sql(sql, [tuple(r[c] for c in columns) for r in rows])
+
+
+def write_details(conn, rows: Iterable[tuple[int, dict]]) -> None:
+    """Upsert the ``DETAIL_FIELDS`` of ``(car_id, row)`` pairs into ``car_details``."""
+    params = [
+        (car_id, *(textpack.pack(row.get(f), row.get("source")) for f in DETAIL_FIELDS))
+        for car_id, row in rows
+    ]
+    if not params:
+        return
+    sets = ", ".join(f"{f} = excluded.{f}" for f in DETAIL_FIELDS)
+    conn.exec_driver_sql(
+        f"INSERT INTO car_details (car_id, {', '.join(DETAIL_FIELDS)}) "
+        f"VALUES ({_placeholders(conn, len(DETAIL_FIELDS) + 1)}) "
+        f"ON CONFLICT (car_id) DO UPDATE SET {sets}",
+        params,
+    )
+
+
+def read_details(conn, ids: Iterable[int], fields: Iterable[str] = DETAIL_FIELDS) -> dict[int, dict]:
+    """``{car_id: {field: value}}`` for the cars in ``ids`` that have details."""
+    fields = [f for f in fields if f in DETAIL_FIELDS]
+    stmt = text(
+        f"SELECT car_id, {', '.join(fields)} FROM car_details WHERE car_id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True))
+    found = {}
+    for part in chunked(list(ids), IN_CHUNK):
+        found.update(
+            (r["car_id"], textpack.unpack_row({f: r[f] for f in fields}, fields))
+            for r in conn.execute(stmt, {"ids": part}).mappings()
+        )
+    return found
+
+
+class CarImport:
+    """Accumulate items and upsert them into ``cars`` in batches.
+
+    Items are matched to existing cars by ``natural_key`` and compared by
+    ``content_hash``: unknown keys are inserted, changed rows get their feed
+    fields rewritten and identical rows are left alone.  Fields an item
+    leaves out keep their stored values.  Items with no usable
+    key, and keys repeated within the same input, are skipped.  Rows are
+    plain dicts throughout; no model objects are built.  New and changed rows
+    are indexed for near-duplicate detection in the same transaction.
+    """
+
+    def __init__(self, engine, columns: Iterable[str], batch_size: int = BATCH_SIZE,
+                 index_duplicates: bool = True):
+        self.engine = engine
+        self.index_duplicates = index_duplicates  # feed new/changed rows to dedup
+        self.columns = [c for c in columns if c != "id" and c not in DETAIL_FIELDS]
+        for c in ("content_hash", "natural_key"):
+            if c not in self.columns:
+                self.columns.append(c)
+        self.update_columns = [c for c in CONTENT_FIELDS if c in self.columns] + ["content_hash"]
+        if "end_ts" in self.columns:
+            self.update_columns.append("end_ts")
+        self.batch_size = batch_size
+        self.pending: list[dict] = []
+        self.seen_keys: set[str] = set()
+        self.given: dict[str, set[str]] = {}  # natural key -> columns the item supplied
+        self.processed = self.inserted = self.updated = self.unchanged = self.skipped = 0
+
+    def add(self, item) -> bool:
+        """Queue ``item``; returns True once a batch is ready to flush."""
+        self.processed += 1
+        if not isinstance(item, dict):
+            self.skipped += 1
+            return False
+        row = prepare_item(item, [*self.columns, *DETAIL_FIELDS])
+        given = row.keys() & item.keys()
+        if item.get("images") and row.get("image_url") is not None:
+            given |= {"image_url", "images_json"}
+        vin = row.get("vin")
+        row["vin"] = (vin.strip() or None) if isinstance(vin, str) else None
+        coerce_typed(row)
+        key = natural_key(row)
+        if not key or key in self.seen_keys:
+            self.skipped += 1
+            return False
+        self.seen_keys.add(key)
+        row["natural_key"] = key
+        row["content_hash"] = content_hash(row)
+        self.given[key] = given
+        self.pending.append(row)
+        return len(self.pending) >= self.batch_size
+
+    def flush(self) -> tuple[list[tuple[int, dict]], list[tuple[int, dict]]]:
+        """Write pending rows; returns ``(created, updated)`` as ``(id, row)`` pairs."""
+        rows, self.pending = self.pending, []
+        given = {r["natural_key"]: self.given.pop(r["natural_key"], None) for r in rows}
+        if not rows:
+            return [], []
+        with self.engine.begin() as conn:
+            existing = existing_by_key(conn, [r["natural_key"] for r in rows])
+            self._merge_stored(conn, [
+                (existing[r["natural_key"]][0], r, given[r["natural_key"]])
+                for r in rows if r["natural_key"] in existing
+            ])
+            new = [r for r in rows if r["natural_key"] not in existing]
+            changed = [
+                (existing[r["natural_key"]][0], r)
+                for r in rows
+                if r["natural_key"] in existing
+                and existing[r["natural_key"]][1] != r["content_hash"]
+            ]
+            upsert_rows(conn, new + [r for _, r in changed], self.columns, self.update_columns)
+            ids = existing_by_key(conn, [r["natural_key"] for r in new]) if new else {}
+            created = [(ids[r["natural_key"]][0], r) for r in new if r["natural_key"] in ids]
+            write_details(conn, created + changed)
+            if self.index_duplicates:
+                dedup.index_rows(conn, created + changed)
+        self.inserted += len(new)
+        self.updated += len(changed)
+        self.unchanged += len(rows) - len(new) - len(changed)
+        return created, changed
+
+    def _merge_stored(self, conn, matches: list[tuple[int, dict, Optional[set]]]) -> None:
+        """Fill the feed fields an item left out from the stored car, in place.
+
+        A partial item (say just a VIN and a new price) updates what it has
+        and keeps the rest; the content hash is recomputed over the merged
+        row, so it matches what a full re-import of the same data would give.
+        """
+        partial = {
+            car_id: (row, [f for f in CONTENT_FIELDS if f not in given])
+            for car_id, row, given in matches
+            if given is not None and any(f not in given for f in CONTENT_FIELDS)
+        }
+        if not partial:
+            return
+        car_fields = [f for f in CONTENT_FIELDS if f in self.columns]
+        stmt = text(
+            f"SELECT id, {', '.join(car_fields)} FROM cars WHERE id IN :ids"
+        ).bindparams(bindparam("ids", expanding=True))
+        stored = {}
+        for part in chunked(list(partial), IN_CHUNK):
+            stored.update((r["id"], dict(r)) for r in conn.execute(stmt, {"ids": part}).mappings())
+        need_details = [i for i, (_, missing) in partial.items() if any(f in DETAIL_FIELDS for f in missing)]
+        details = read_details(conn, need_details) if need_details else {}
+        for car_id, (row, missing) in partial.items():
+            old = {**stored.get(car_id, {}), **details.get(car_id, {})}
+            for f in missing:
+                row[f] = old.get(f)
+            if "end_time" in missing and "end_ts" in row:
+                row["end_ts"] = to_epoch(row["end_time"])
+            row["content_hash"] = content_hash(row)
+
+    def summary(self) -> str:
+        return (
+            f"{self.inserted} created, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.skipped} skipped"
+        )
+
+    def counts(self) -> dict:
+        return {
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "skipped": self.skipped,
+        }
+
+
+class NDJSONParser:
+    """Incrementally decode newline-delimited JSON; blank lines are ignored."""
+
+    def __init__(self):
+        self._buf = ""
+
+    def feed(self, chunk: str) -> list:
+        self._buf += chunk
+        *lines, self._buf = self._buf.split("\n")
+        return [json.loads(line) for line in lines if line.strip()]
+
+    def close(self) -> list:
+        tail, self._buf = self._buf, ""
+        return [json.loads(tail)] if tail.strip() else []
+
+
+def update_job(conn, job_id: int, **fields) -> None:
+    """Persist progress counters/status on an ``import_jobs`` row."""
+    if not fields:
+        return
+    sets = ", ".join(f"{k} = :{k}" for k in fields)
+    conn.execute(text(f"UPDATE import_jobs SET {sets} WHERE id = :_id"), dict(fields, _id=job_id))
+
+
+BATCH_ID_TTL = timedelta(days=1)
+
+
+def recall_batch(conn, batch_id: str) -> Optional[dict]:
+    """Response recorded for an already-applied ``/cars/bulk`` batch, if any."""
+    raw = conn.execute(
+        text("SELECT response FROM bulk_batches WHERE batch_id = :b"), {"b": batch_id}
+    ).scalar()
+    return json.loads(raw) if raw else None
+
+
+def remember_batch(conn, batch_id: str, response: dict) -> None:
+    """Record a finished batch; the first writer wins if a retry raced it."""
+    now = datetime.now(timezone.utc)
+    conn.execute(
+        text("DELETE FROM bulk_batches WHERE created < :cutoff"),
+        {"cutoff": (now - BATCH_ID_TTL).isoformat()},
+    )
+    conn.execute(
+        text(
+            "INSERT INTO bulk_batches (batch_id, response, created) VALUES (:b, :r, :c) "
+            "ON CONFLICT (batch_id) DO NOTHING"
+        ),
+        {"b": batch_id, "r": json.dumps(response), "c": now.isoformat()},
+    )
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
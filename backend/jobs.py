@@ -0,0 +1,351 @@
+"""In-process executor for queued ``ImportJob`` rows.
+
+``admin_imports_run`` only inserts a ``queued`` row.  ``ImportRunner`` owns a
+small thread pool that claims queued jobs with a compare-and-set UPDATE (safe
+with several uvicorn workers sharing one database), runs the handler
+registered for the job's ``source`` and streams progress counters back onto
+the row.  Handlers call ``JobContext.progress`` between batches, which is also
+where a cancel from ``/admin/imports/{id}/cancel`` is noticed.
+
+File imports checkpoint the input byte offset with every committed batch.
+A resumed job (``/admin/imports/{id}/resume``) verifies the file digest and
+seeks straight past the rows already written.
+"""
+import hashlib
+import logging
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from sqlalchemy import inspect, text
+
+from importers import SOURCES, get_source
+from ingest import CarImport, iter_json_array_offsets, now_iso, update_job
+
+log = logging.getLogger("vinfreak.jobs")
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler once its job has been cancelled."""
+
+
+class JobContext:
+    """What a handler gets to see of the job it is running."""
+
+    def __init__(self, engine, job_id: int, source: str, input_path: Optional[str],
+                 on_batch: Optional[Callable] = None, pause: float = 0.0,
+                 checkpoint: Optional[dict] = None):
+        self.engine = engine
+        self.job_id = job_id
+        self.source = source
+        self.input_path = input_path
+        self.on_batch = on_batch
+        self.pause = pause
+        # Row state left by an earlier run: input_digest, checkpoint_offset
+        # and the counters reached at that offset.
+        self.checkpoint = checkpoint or {}
+        self.log_lines: list[str] = []
+
+    def progress(self, **counters) -> None:
+        """Persist counters and raise ``JobCancelled`` if the job was cancelled."""
+        with self.engine.begin() as conn:
+            update_job(conn, self.job_id, heartbeat_at=now_iso(), **counters)
+            status = conn.execute(
+                text("SELECT status FROM import_jobs WHERE id = :id"), {"id": self.job_id}
+            ).scalar()
+        if status != "running":
+            # Cancelled, or requeued by an admin who took this runner for dead.
+            raise JobCancelled()
+        if self.pause:
+            # Hand the GIL back to request threads between batches.
+            time.sleep(self.pause)
+
+    def log(self, line: str) -> None:
+        self.log_lines.append(line)
+
+
+class Heartbeat:
+    """Touch ``heartbeat_at`` every ``interval`` seconds while a job runs.
+
+    ``progress`` only writes once per committed batch; a slow batch or the
+    digest pass over a large file must not make a live job look crashed.
+    """
+
+    def __init__(self, engine, job_id: int, interval: float):
+        self.engine = engine
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"import-heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        text("UPDATE import_jobs SET heartbeat_at = :now WHERE id = :id AND status = 'running'"),
+                        {"now": now_iso(), "id": self.job_id},
+                    )
+            except Exception:
+                log.warning("import job %s heartbeat failed", self.job_id, exc_info=True)
+
+
+def car_columns(engine) -> list[str]:
+    return [c["name"] for c in inspect(engine).get_columns("cars")]
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+
+def run_car_import(ctx: JobContext, entries) -> None:
+    """Feed ``(item, offset)`` pairs through ``CarImport`` in batches.
+
+    After each committed batch the counters and the offset of the last item
+    in it are saved together, so they always describe the same point.
+    """
+    importer = CarImport(ctx.engine, car_columns(ctx.engine))
+    importer.processed = ctx.checkpoint.get("total_items") or 0
+    importer.inserted = ctx.checkpoint.get("created_items") or 0
+    importer.updated = ctx.checkpoint.get("updated_items") or 0
+    importer.unchanged = ctx.checkpoint.get("unchanged_items") or 0
+    importer.skipped = ctx.checkpoint.get("skipped_items") or 0
+    offset = ctx.checkpoint.get("checkpoint_offset")
+
+    def flush():
+        created, updated = importer.flush()
+        if ctx.on_batch:
+            ctx.on_batch(ctx, created, updated)
+        ctx.progress(
+            total_items=importer.processed,
+            created_items=importer.inserted,
+            updated_items=importer.updated,
+            unchanged_items=importer.unchanged,
+            skipped_items=importer.skipped,
+            checkpoint_offset=offset,
+        )
+
+    try:
+        for item, offset in entries:
+            if importer.add(item):
+                flush()
+        flush()
+    finally:
+        ctx.log(importer.summary())
+
+
+def run_source_job(ctx: JobContext) -> None:
+    """Import the attached dump through the adapter registered for ``ctx.source``."""
+    if not ctx.input_path:
+        raise ValueError("No input file attached to this job")
+    adapter = get_source(ctx.source)
+    digest = file_digest(ctx.input_path)
+    offset = ctx.checkpoint.get("checkpoint_offset") or 0
+    if offset:
+        if digest != ctx.checkpoint.get("input_digest"):
+            raise ValueError("Input file changed since the checkpoint; cannot resume")
+        ctx.log(f"Resumed after item {ctx.checkpoint.get('total_items') or 0} (byte {offset})")
+    else:
+        ctx.progress(input_digest=digest)
+    with open(ctx.input_path, "rb") as fp:
+        # Items the adapter rejects arrive as None and are counted as skipped.
+        run_car_import(
+            ctx, ((adapter(item), end) for item, end in iter_json_array_offsets(fp, offset=offset))
+        )
+
+
+# source name -> handler(ctx); every importer adapter is runnable as a job.
+HANDLERS: dict[str, Callable[[JobContext], None]] = {
+    name: run_source_job for name in SOURCES
+}
+
+
+# ``import_jobs.source`` of the synchronous admin upload.  Those rows only
+# record the request's progress; the runner neither counts nor runs them.
+UPLOAD_SOURCE = "admin_upload"
+
+
+def _cutoff(stale_seconds: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)).isoformat()
+
+
+def claim_next(engine, max_running: int, stale_seconds: float = 300.0) -> Optional[dict]:
+    """Atomically move the oldest queued job to ``running``.
+
+    The UPDATE only succeeds while the row is still queued and fewer than
+    ``max_running`` jobs are running anywhere, so concurrent workers (threads
+    or processes) never pick up the same job or exceed the limit.  Only
+    runner jobs with a heartbeat from the last ``stale_seconds`` count:
+    admin uploads and jobs whose worker died do not hold a slot.
+    """
+    with engine.begin() as conn:
+        row = conn.execute(
+            text(
+                "SELECT id, source, input_path, input_digest, checkpoint_offset, "
+                "total_items, created_items, updated_items, unchanged_items, skipped_items "
+                "FROM import_jobs "
+                "WHERE status = 'queued' ORDER BY id LIMIT 1"
+            )
+        ).mappings().first()
+        if not row:
+            return None
+        claimed = conn.execute(
+            text(
+                "UPDATE import_jobs SET status = 'running', started_at = :now, heartbeat_at = :now "
+                "WHERE id = :id AND status = 'queued' "
+                "AND (SELECT COUNT(*) FROM import_jobs WHERE status = 'running' "
+                "AND source IS NOT :upload AND heartbeat_at >= :cutoff) < :limit"
+            ),
+            {"id": row["id"], "now": now_iso(), "limit": max_running,
+             "upload": UPLOAD_SOURCE, "cutoff": _cutoff(stale_seconds)},
+        ).rowcount
+    return dict(row) if claimed == 1 else None
+
+
+def reap_stale(engine, stale_seconds: float) -> tuple[int, int]:
+    """Settle ``running`` rows nobody has reported on for ``stale_seconds``.
+
+    Their process died.  Runner jobs with an input file go back to the queue
+    and resume from their checkpoint; anything else (admin uploads) is marked
+    failed.  Returns ``(requeued, failed)``.
+    """
+    stale = (
+        "status = 'running' AND COALESCE(heartbeat_at, started_at, created, '') < :cutoff"
+    )
+    args = {"cutoff": _cutoff(stale_seconds), "upload": UPLOAD_SOURCE, "now": now_iso()}
+    with engine.begin() as conn:
+        requeued = conn.execute(
+            text(
+                f"UPDATE import_jobs SET status = 'queued', heartbeat_at = NULL WHERE {stale} "
+                "AND source IS NOT :upload AND input_path IS NOT NULL"
+            ),
+            args,
+        ).rowcount
+        failed = conn.execute(
+            text(
+                "UPDATE import_jobs SET status = 'failed', finished_at = :now, cancellable = 0, "
+                f"errors = 'The worker running this import stopped responding' WHERE {stale}"
+            ),
+            args,
+        ).rowcount
+    if requeued or failed:
+        log.warning("stale import jobs: %d requeued, %d failed", requeued, failed)
+    return requeued, failed
+
+
+def execute(engine, job: dict, handlers=None, on_batch=None, pause: float = 0.0,
+            stale_seconds: float = 300.0) -> str:
+    """Run a claimed job to completion and record its final status."""
+    handlers = HANDLERS if handlers is None else handlers
+    ctx = JobContext(engine, job["id"], job["source"], job.get("input_path"), on_batch, pause,
+                     checkpoint=job)
+    handler = handlers.get((job["source"] or "").strip().lower())
+    status, errors = "finished", None
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown import source: {job['source']!r}")
+        with Heartbeat(engine, job["id"], stale_seconds / 3):
+            handler(ctx)
+    except JobCancelled:
+        status = "cancelled"
+    except Exception as e:
+        log.exception("import job %s failed", job["id"])
+        status, errors = "failed", f"{e}\n{traceback.format_exc(limit=5)}"
+    with engine.begin() as conn:
+        # Never overwrite a cancel that landed after the last progress check.
+        conn.execute(
+            text(
+                "UPDATE import_jobs SET status = :status, finished_at = :now, "
+                "errors = :errors, log = :log, cancellable = :cancellable "
+                "WHERE id = :id AND status = 'running'"
+            ),
+            {
+                "id": job["id"],
+                "status": status,
+                "now": now_iso(),
+                "errors": errors,
+                "log": "\n".join(ctx.log_lines) or None,
+                "cancellable": False,
+            },
+        )
+    return status
+
+
+class ImportRunner:
+    """Background dispatcher: claim queued jobs and run them on a bounded pool."""
+
+    def __init__(self, engine, max_workers: int = 1, poll_seconds: float = 5.0,
+                 handlers=None, on_batch=None, pause: float = 0.0, stale_seconds: float = 300.0):
+        self.engine = engine
+        self.stale_seconds = stale_seconds
+        self.max_workers = max(1, max_workers)
+        self.poll_seconds = poll_seconds
+        self.handlers = HANDLERS if handlers is None else handlers
+        self.on_batch = on_batch
+        self.pause = pause
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(self.max_workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        reap_stale(self.engine, self.stale_seconds)
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="import-job")
+        self._thread = threading.Thread(target=self._loop, name="import-dispatcher", daemon=True)
+        self._thread.start()
+        self._wake.set()
+
+    def stop(self, wait: bool = False) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._pool:
+            self._pool.shutdown(wait=wait)
+
+    def wake(self) -> None:
+        """Look for queued work now instead of at the next poll."""
+        self._wake.set()
+
+    def run_pending(self) -> int:
+        """Claim and run queued jobs in the calling thread; returns how many ran."""
+        ran = 0
+        while (job := claim_next(self.engine, self.max_workers, self.stale_seconds)) is not None:
+            execute(self.engine, job, self.handlers, self.on_batch, self.pause, self.stale_seconds)
+            ran += 1
+        return ran
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+            while not self._stop.is_set() and self._slots.acquire(blocking=False):
+                try:
+                    job = claim_next(self.engine, self.max_workers, self.stale_seconds)
+                except Exception:
+                    log.exception("claiming import job failed")
+                    job = None
+                if job is None:
+                    self._slots.release()
+                    break
+                self._pool.submit(self._run, job)
+
+    def _run(self, job: dict) -> None:
+        try:
+            execute(self.engine, job, self.handlers, self.on_batch, self.pause, self.stale_seconds)
+        finally:
+            self._slots.release()
+            self._wake.set()
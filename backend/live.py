@@ -0,0 +1,270 @@
+"""Live catalog updates: a change-log tailer and an SSE broadcaster.
+
+``ChangeTailer`` follows ``car_changes`` (filled by triggers on every write
+path, in every worker process) with an indexed ``seq > :last`` query and
+hands the current state of the touched cars to its listeners.  One daemon
+thread per process does this; write endpoints call ``poke()`` so their own
+changes go out without waiting for the next poll.
+
+``Broadcaster`` is one of those listeners.  It diffs the hot auction fields
+against what it last saw and fans compact deltas out to ``Subscriber``s on
+the event loop, so an idle SSE connection costs one small object and no
+thread.  Each subscriber has a byte budget: pending deltas for the same car
+are merged, and a subscriber that still falls too far behind is told to
+``reset`` (refetch via ``/cars/changes``) instead of buffering without bound.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import bindparam, text
+
+log = logging.getLogger("vinfreak.live")
+
+# Fields pushed to subscribers; everything else is fetched on demand.
+LIVE_FIELDS = (
+    "auction_status", "price", "currency", "number_of_bids", "number_of_views",
+    "end_time", "time_left",
+)
+IN_CHUNK = 500
+
+
+def compact_changes(conn) -> int:
+    """Keep only each car's latest ``car_changes`` entry; returns rows removed.
+
+    A client syncing from any ``since`` still ends up with every car's
+    current state, and ``MAX(seq)`` (the catalog version) is kept.
+    """
+    return conn.execute(
+        text("DELETE FROM car_changes WHERE seq NOT IN (SELECT MAX(seq) FROM car_changes GROUP BY car_id)")
+    ).rowcount
+
+
+class ChangeTailer:
+    """Poll ``car_changes`` past the last seen ``seq`` and notify listeners.
+
+    Listeners get ``(rows, deleted_ids)`` where ``rows`` maps car id to a dict
+    of ``columns`` for live cars.  They run on the tailer thread and must be
+    quick.  Every ``compact_interval`` seconds the thread also compacts the
+    log, which otherwise grows with every auction update until a restart.
+    """
+
+    def __init__(self, engine, interval: float = 0.5,
+                 columns: Iterable[str] = ("id",) + LIVE_FIELDS, batch: int = 1000,
+                 compact_interval: float = 600.0):
+        self.engine = engine
+        self.interval = interval
+        self.compact_interval = compact_interval
+        self._compact_at = time.monotonic() + compact_interval
+        self.columns = list(dict.fromkeys(["id", *columns]))
+        self.batch = batch
+        self.seq = 0
+        self.listeners: list[Callable[[dict, list], None]] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, fn: Callable[[dict, list], None], columns: Iterable[str] = ()) -> None:
+        self.listeners.append(fn)
+        self.columns = list(dict.fromkeys([*self.columns, *columns]))
+
+    def start(self, since: Optional[int] = None) -> None:
+        """Follow changes after ``since`` (default: from now on)."""
+        if self._thread:
+            return
+        if since is None:
+            with self.engine.connect() as conn:
+                since = conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM car_changes")).scalar()
+        self.seq = since
+        self._thread = threading.Thread(target=self._loop, name="change-tailer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def poke(self) -> None:
+        """Look for new changes now (called after local writes)."""
+        self._wake.set()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                while self.poll() >= self.batch:
+                    pass
+                if self.compact_interval and time.monotonic() >= self._compact_at:
+                    self.compact()
+            except Exception:
+                log.exception("change tailer poll failed")
+
+    def compact(self) -> int:
+        self._compact_at = time.monotonic() + self.compact_interval
+        with self.engine.begin() as conn:
+            removed = compact_changes(conn)
+        if removed:
+            log.info("compacted %d car_changes entries", removed)
+        return removed
+
+    def poll(self) -> int:
+        """Process one batch of new log entries; returns how many were read."""
+        with self.engine.connect() as conn:
+            entries = conn.execute(
+                text("SELECT seq, car_id FROM car_changes WHERE seq > :last ORDER BY seq LIMIT :n"),
+                {"last": self.seq, "n": self.batch},
+            ).all()
+            if not entries:
+                return 0
+            ids = list(dict.fromkeys(car_id for _, car_id in entries))
+            rows = {}
+            for i in range(0, len(ids), IN_CHUNK):
+                found = conn.execute(
+                    text(
+                        f"SELECT {', '.join(self.columns)} FROM cars WHERE id IN :ids "
+                        "AND deleted_ts = 0"
+                    ).bindparams(bindparam("ids", expanding=True)),
+                    {"ids": ids[i:i + IN_CHUNK]},
+                ).mappings()
+                rows.update({r["id"]: dict(r) for r in found})
+        self.seq = entries[-1][0]
+        deleted = [i for i in ids if i not in rows]
+        for fn in self.listeners:
+            try:
+                fn(rows, deleted)
+            except Exception:
+                log.exception("change listener %r failed", fn)
+        return len(entries)
+
+
+class Subscriber:
+    """One SSE connection's filter and bounded outbox."""
+
+    def __init__(self, ids: Optional[set[int]] = None, status: Optional[str] = None,
+                 budget: int = 256 << 10):
+        self.ids = ids
+        self.status = status
+        self.budget = budget
+        self.pending: dict[int, tuple[dict, str]] = {}
+        self.size = 0
+        self.overflowed = False
+        self.dropped = 0
+        self.ready = asyncio.Event()
+
+    def wants(self, car_id: int, status: Optional[str], previous: Optional[str]) -> bool:
+        if self.ids is not None and car_id not in self.ids:
+            return False
+        # Also deliver the change that moves a car out of the watched status.
+        return self.status is None or self.status in (status, previous)
+
+    def push(self, car_id: int, delta: dict, encoded: str) -> None:
+        if self.overflowed:
+            return
+        if car_id in self.pending:
+            # Coalesce: a slow reader only needs the latest value per field.
+            merged, old = self.pending[car_id]
+            merged = {**merged, **delta}
+            self.size -= len(old)
+            encoded = json.dumps(merged, separators=(",", ":"), default=str)
+            delta = merged
+        self.pending[car_id] = (delta, encoded)
+        self.size += len(encoded)
+        if self.size > self.budget:
+            self.dropped += len(self.pending)
+            self.pending.clear()
+            self.size = 0
+            self.overflowed = True
+        self.ready.set()
+
+    def drain(self, seq: int) -> str:
+        """SSE frames for everything pending, then an empty outbox."""
+        self.ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            return f"event: reset\ndata: {json.dumps({'seq': seq})}\n\n"
+        frames = "".join(f"event: car\ndata: {enc}\n\n" for _, enc in self.pending.values())
+        self.pending.clear()
+        self.size = 0
+        return frames
+
+
+def _status(value) -> Optional[str]:
+    # Feeds disagree on casing ("Live", "LIVE"); ``?status=`` is uppercased.
+    return str(value).upper() if value else None
+
+
+class Broadcaster:
+    """Diff live fields per car and fan deltas out to subscribers."""
+
+    def __init__(self):
+        self._last: dict[int, tuple] = {}
+        self._subs: set[Subscriber] = set()
+        self._by_id: dict[int, set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.seq = 0
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self, ids: Optional[Iterable[int]] = None, status: Optional[str] = None,
+                  budget: int = 256 << 10) -> Subscriber:
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(set(ids) if ids is not None else None, status, budget)
+        self._subs.add(sub)
+        for i in sub.ids or ():
+            self._by_id.setdefault(i, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber) -> None:
+        self._subs.discard(sub)
+        for i in sub.ids or ():
+            subs = self._by_id.get(i)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_id[i]
+
+    def on_changes(self, rows: dict, deleted: list, seq: int = 0) -> None:
+        """Tailer listener: compute deltas here, deliver on the event loop."""
+        events = []
+        for car_id, row in rows.items():
+            state = tuple(row.get(f) for f in LIVE_FIELDS)
+            prev = self._last.get(car_id)
+            if prev == state:
+                continue
+            status = _status(state[0])
+            if status == "LIVE":
+                self._last[car_id] = state
+            else:
+                # Ended and sold cars rarely change again; don't keep them.
+                self._last.pop(car_id, None)
+            delta = {"id": car_id}
+            for f, new, old in zip(LIVE_FIELDS, state, prev or (None,) * len(LIVE_FIELDS)):
+                if prev is None or new != old:
+                    delta[f] = new
+            events.append((car_id, delta, status, _status(prev[0]) if prev else None))
+        for car_id in deleted:
+            prev = self._last.pop(car_id, None)
+            events.append((car_id, {"id": car_id, "deleted": True}, None, _status(prev[0]) if prev else None))
+        if events and self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fanout, events, seq)
+
+    def _fanout(self, events: list, seq: int) -> None:
+        self.seq = max(self.seq, seq)
+        if not self._subs:
+            return
+        unfiltered = [s for s in self._subs if s.ids is None]
+        for car_id, delta, status, previous in events:
+            encoded = None
+            for sub in (*unfiltered, *self._by_id.get(car_id, ())):
+                if sub.wants(car_id, status, previous):
+                    if encoded is None:
+                        encoded = json.dumps(delta, separators=(",", ":"), default=str)
+                    sub.push(car_id, delta, encoded)
+
+
+def attach(tailer: ChangeTailer, broadcaster: Broadcaster) -> None:
+    tailer.add_listener(lambda rows, deleted: broadcaster.on_changes(rows, deleted, tailer.seq))
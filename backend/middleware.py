@@ -0,0 +1,114 @@
+"""Small pure-ASGI helpers for the middleware stack.
+
+``python middleware.py bench`` measures what a public request pays for the
+stack, before and after sessions were scoped to the admin UI.
+"""
+from typing import Iterable
+
+
+class PathScoped:
+    """Run ``middleware`` only for requests under one of ``prefixes``.
+
+    Everything else goes straight to ``app``.  This is how the session
+    middleware is limited to the admin UI: public JSON and static files
+    skip the cookie signing and decoding entirely.
+    """
+
+    def __init__(self, app, middleware, prefixes: Iterable[str], **options):
+        self.app = app
+        self.wrapped = middleware(app, **options)
+        self.prefixes = tuple(prefixes)
+
+    def _applies(self, path: str) -> bool:
+        return any(path == p or path.startswith(p.rstrip("/") + "/") for p in self.prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket") and self._applies(scope["path"]):
+            return await self.wrapped(scope, receive, send)
+        await self.app(scope, receive, send)
+
+
+def _bench(n: int = 20000) -> None:
+    """Per-request cost of the old and the current stack on a public route."""
+    import asyncio
+    import time
+
+    from starlette.applications import Starlette
+    from starlette.middleware import Middleware
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.middleware.cors import CORSMiddleware
+    from starlette.middleware.sessions import SessionMiddleware
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+
+    async def cars(request):
+        return JSONResponse([{"id": 1, "make": "Porsche"}])
+
+    async def passthrough(request, call_next):
+        return await call_next(request)
+
+    cors = Middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                      allow_methods=["*"], allow_headers=["*"])
+    stacks = {
+        "before": Starlette(routes=[Route("/cars", cars)], middleware=[
+            cors,
+            Middleware(BaseHTTPMiddleware, dispatch=passthrough),
+            Middleware(SessionMiddleware, secret_key="bench"),
+        ]),
+        "after": Starlette(routes=[Route("/cars", cars)], middleware=[
+            cors,
+            Middleware(PathScoped, middleware=SessionMiddleware, prefixes=("/admin",), secret_key="bench"),
+        ]),
+    }
+
+    # A cookie like the one an admin's browser sends on every request.
+    signed = []
+
+    async def grab(message):
+        if message["type"] == "http.response.start":
+            signed.extend(v for k, v in message["headers"] if k == b"set-cookie")
+
+    async def login(scope, receive, send):
+        scope["session"]["admin_user"] = "admin"
+        await JSONResponse({})(scope, receive, send)
+
+    async def run(app, headers) -> float:
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            pass
+
+        scope = {"type": "http", "http_version": "1.1", "method": "GET", "path": "/cars",
+                 "raw_path": b"/cars", "query_string": b"", "root_path": "", "scheme": "http",
+                 "server": ("bench", 80), "client": ("127.0.0.1", 1), "headers": headers}
+        for _ in range(500):  # warm up
+            await app(dict(scope), receive, send)
+        started = time.perf_counter()
+        for _ in range(n):
+            await app(dict(scope), receive, send)
+        return (time.perf_counter() - started) / n * 1e6
+
+    async def main():
+        await SessionMiddleware(login, secret_key="bench")(
+            {"type": "http", "path": "/admin", "headers": []}, None, grab)
+        cookie = signed[0].split(b";")[0]
+        for label, headers in (("anonymous", []), ("with session cookie", [(b"cookie", cookie)])):
+            before = await run(stacks["before"], headers)
+            after = await run(stacks["after"], headers)
+            print(f"GET /cars {label:20} before {before:6.1f} us  after {after:6.1f} us  "
+                  f"saved {before - after:5.1f} us ({(before - after) / before:.0%})")
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    p = argparse.ArgumentParser(prog="python middleware.py", description="middleware stack tools")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    bp = sub.add_parser("bench", help="per-request overhead of the old vs current stack on a public route")
+    bp.add_argument("-n", type=int, default=20000, help="requests per measurement")
+    args = p.parse_args()
+    if args.cmd == "bench":
+        _bench(args.n)
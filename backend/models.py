@@ -1,7 +1,15 @@
-from typing import ClassVar
+from typing import ClassVar, Optional
 from sqlmodel import SQLModel, Field, Relationship
+from sqlalchemy import DDL, event, text
+from sqlalchemy.orm.attributes import flag_modified, get_history, set_committed_value
 from pydantic import ConfigDict, BaseModel
 
+from textpack import PackedText, pack, unpack, wants_source
+from rollups import CAR_ROLLUP_TRIGGERS
+from ingest import (
+    CONTENT_FIELDS, DETAIL_FIELDS, NUMERIC_COLUMNS, TIMESTAMP_COLUMNS, coerce_typed, content_hash, natural_key, parse_images,
+)
+
 # Allow "model_*" field names globally
 BaseModel.model_config["protected_namespaces"] = ()
 
@@ -70,28 +78,131 @@ class Car(SQLModel, table=True):
     source: str | None = None
     url: str | None = None
     title: str | None = None
-    description: str | None = None
-    highlights: str | None = None
-    equipment: str | None = None
-    modifications: str | None = None
-    known_flaws: str | None = None
-    service_history: str | None = None
-    ownership_history: str | None = None
-    seller_notes: str | None = None
-    other_items: str | None = None
     engine: str | None = None
     image_url: str | None = None
-    images_json: str | None = None
     location_address: str | None = None
     location_url: str | None = None
     seller_name: str | None = None
     seller_url: str | None = None
-    seller_rating: str | None = None
-    seller_reviews: str | None = None
+    seller_rating: float | None = None
+    seller_reviews: int | None = None
     posted_at: str | None = None
     deleted_at: str | None = None  # soft delete (TEXT ISO8601)
+    # Epoch-second shadows of the TEXT timestamps, 0 when unset; see ingest.coerce_typed.
+    posted_ts: int = Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    end_ts: int = Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    deleted_ts: int = Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    content_hash: str | None = None  # fingerprint of feed fields, see ingest.content_hash
+    natural_key: str | None = Field(default=None, unique=True)  # upsert target, see ingest.natural_key
 
     dealership: Dealership | None = Relationship(back_populates="cars")
+    # Long-form text lives in car_details; Car exposes it as plain attributes
+    # (see _detail_property) that load it only when touched.
+    details: Optional["CarDetails"] = Relationship(
+        sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan", "lazy": "select"}
+    )
+
+    def __init__(self, **data):
+        cold = {k: data.pop(k) for k in DETAIL_FIELDS if k in data}
+        super().__init__(**data)
+        for k, v in cold.items():
+            setattr(self, k, v)
+
+    def detail_values(self) -> dict:
+        return {f: getattr(self, f) for f in DETAIL_FIELDS}
+
+
+class CarDetails(SQLModel, table=True):
+    """Cold half of a listing: the multi-KB text fields, 1:1 with ``cars``.
+
+    Values may be stored compressed, see textpack.py.
+    """
+    __tablename__ = "car_details"
+    car_id: int | None = Field(default=None, primary_key=True, foreign_key="cars.id")
+    description: str | None = Field(default=None, sa_type=PackedText)
+    highlights: str | None = Field(default=None, sa_type=PackedText)
+    equipment: str | None = Field(default=None, sa_type=PackedText)
+    modifications: str | None = Field(default=None, sa_type=PackedText)
+    known_flaws: str | None = Field(default=None, sa_type=PackedText)
+    service_history: str | None = Field(default=None, sa_type=PackedText)
+    ownership_history: str | None = Field(default=None, sa_type=PackedText)
+    seller_notes: str | None = Field(default=None, sa_type=PackedText)
+    other_items: str | None = Field(default=None, sa_type=PackedText)
+    images_json: str | None = Field(default=None, sa_type=PackedText)
+
+
+def _detail_property(name):
+    def get(self):
+        return getattr(self.details, name) if self.details is not None else None
+
+    def set_(self, value):
+        if self.details is None:
+            if value is None:
+                return
+            self.details = CarDetails()
+        if getattr(self.details, name) != value:
+            setattr(self.details, name, value)
+            # Only cars carries the content hash and the change-log trigger.
+            flag_modified(self, "content_hash")
+
+    return property(get, set_)
+
+
+for _name in DETAIL_FIELDS:
+    setattr(Car, _name, _detail_property(_name))
+
+
+@event.listens_for(Car, "before_insert")
+@event.listens_for(Car, "before_update")
+def _derive_car_keys(mapper, connection, target):
+    """Keep derived columns in step with ORM writes (admin forms, seeds)."""
+    typed = coerce_typed({
+        c: getattr(target, c, None)
+        for c in (*TIMESTAMP_COLUMNS.values(), *NUMERIC_COLUMNS)
+    })
+    for k, v in typed.items():
+        setattr(target, k, v)
+    if not target.image_url and target.images_json:
+        # Listings only carry the hero image; take it from the gallery.
+        gallery = parse_images(target.images_json)
+        target.image_url = gallery[0] if gallery else None
+    row = {f: getattr(target, f, None) for f in CONTENT_FIELDS}
+    target.content_hash = content_hash(row)
+    key = natural_key(row)
+    if target.id is not None and target.natural_key is None and key is not None and connection.execute(
+        text("SELECT 1 FROM cars WHERE natural_key = :k AND id != :id"), {"k": key, "id": target.id}
+    ).first():
+        # A legacy duplicate that backfill left without a key: editing it must
+        # not collide with the car that owns the key.  (Edits of keyed cars
+        # to a taken VIN still fail, and the admin forms report that.)
+        return
+    target.natural_key = key
+
+
+@event.listens_for(CarDetails, "before_insert")
+@event.listens_for(CarDetails, "before_update")
+def _pack_details(mapper, connection, target):
+    """Pack admin-written text with the listing's per-source dictionary."""
+    if not wants_source():
+        return
+    fields = [f for f in DETAIL_FIELDS if isinstance(getattr(target, f), str) and get_history(target, f).added]
+    if not fields:
+        return
+    source = connection.execute(
+        text("SELECT source FROM cars WHERE id = :id"), {"id": target.car_id}
+    ).scalar()
+    for f in fields:
+        setattr(target, f, pack(getattr(target, f), source))
+
+
+@event.listens_for(CarDetails, "after_insert")
+@event.listens_for(CarDetails, "after_update")
+def _unpack_details(mapper, connection, target):
+    # The row holds the packed bytes; the object goes back to plain text.
+    for f in DETAIL_FIELDS:
+        value = getattr(target, f)
+        if isinstance(value, bytes):
+            set_committed_value(target, f, unpack(value))
 
 class Media(SQLModel, table=True):
     __tablename__ = "media"
@@ -111,9 +222,103 @@ class ImportJob(SQLModel, table=True):
     total_items: int | None = 0
     created_items: int | None = 0
     updated_items: int | None = 0
+    unchanged_items: int | None = 0
+    skipped_items: int | None = 0
     errors: str | None = None
     cancellable: bool | None = True
     log: str | None = None
+    input_path: str | None = None  # uploaded file the runner imports from
+    input_digest: str | None = None  # sha256 of input_path, checked before resuming
+    checkpoint_offset: int | None = None  # input byte offset after the last committed batch
+    heartbeat_at: str | None = None  # last progress write; stale + running = crashed
+
+class BulkBatch(SQLModel, table=True):
+    """``/cars/bulk`` responses by client batch id, so retried batches replay."""
+    __tablename__ = "bulk_batches"
+    batch_id: str | None = Field(default=None, primary_key=True)
+    response: str | None = None  # JSON counts returned the first time
+    created: str | None = None
+
+class CarSignature(SQLModel, table=True):
+    """MinHash signature of a listing's text, see dedup.py."""
+    __tablename__ = "car_minhash"
+    car_id: int | None = Field(default=None, primary_key=True, foreign_key="cars.id")
+    signature: bytes | None = None
+
+class CarLSHBucket(SQLModel, table=True):
+    """One LSH band hash per row; listings sharing any bucket are candidates."""
+    __tablename__ = "car_lsh"
+    band: int = Field(primary_key=True)
+    bucket: int = Field(primary_key=True)
+    car_id: int = Field(primary_key=True, foreign_key="cars.id", index=True)
+
+class DuplicatePair(SQLModel, table=True):
+    """Candidate duplicate listings (car_id < other_id) awaiting review."""
+    __tablename__ = "car_duplicates"
+    car_id: int = Field(primary_key=True, foreign_key="cars.id")
+    other_id: int = Field(primary_key=True, foreign_key="cars.id")
+    score: float | None = None  # estimated Jaccard similarity
+    status: str | None = Field(default="open", index=True)  # open/merged/dismissed
+    found_at: str | None = None
+
+class CarChange(SQLModel, table=True):
+    """Append-only change log of ``cars`` served by ``/cars/changes``.
+
+    Rows are written by the triggers below, so every write path (ORM, raw
+    SQL, bulk upserts, sqladmin) is captured.  AUTOINCREMENT keeps ``seq``
+    strictly increasing even after compaction deletes the newest rows.
+    """
+    __tablename__ = "car_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq: int | None = Field(default=None, primary_key=True)
+    car_id: int = Field(index=True)
+    op: str  # upsert/delete
+    changed_at: str | None = None
+
+
+_CHANGE_OP = "CASE WHEN NEW.deleted_at IS NULL OR NEW.deleted_at = '' THEN 'upsert' ELSE 'delete' END"
+_NOW = "strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+CAR_CHANGE_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_change_insert AFTER INSERT ON cars BEGIN
+        INSERT INTO car_changes (car_id, op, changed_at) VALUES (NEW.id, {_CHANGE_OP}, {_NOW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_change_update AFTER UPDATE ON cars BEGIN
+        INSERT INTO car_changes (car_id, op, changed_at) VALUES (NEW.id, {_CHANGE_OP}, {_NOW});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_change_delete AFTER DELETE ON cars BEGIN
+        INSERT INTO car_changes (car_id, op, changed_at) VALUES (OLD.id, 'delete', {_NOW});
+    END""",
+]
+for _sql in CAR_CHANGE_TRIGGERS:
+    # DDL %-formats its text; the triggers' strftime patterns need escaping.
+    event.listen(
+        Car.__table__, "after_create",
+        DDL(_sql.replace("%", "%%")).execute_if(dialect="sqlite"),
+    )
+
+class CarRollup(SQLModel, table=True):
+    """Live-car totals per dimension, maintained by triggers (see rollups.py)."""
+    __tablename__ = "car_rollups"
+    dim: str = Field(primary_key=True)  # all/source/dealership/status/day
+    key: str = Field(primary_key=True)
+    cars: int = 0
+    priced: int = 0
+    price_sum: float = 0.0
+
+
+for _sql in CAR_ROLLUP_TRIGGERS:
+    event.listen(
+        Car.__table__, "after_create",
+        DDL(_sql.replace("%", "%%")).execute_if(dialect="sqlite"),
+    )
+
+class TextDictionary(SQLModel, table=True):
+    """Per-source preset dictionary for compressing car_details, see textpack.py."""
+    __tablename__ = "text_dictionaries"
+    id: int | None = Field(default=None, primary_key=True)
+    source: str | None = Field(default=None, index=True)
+    data: bytes | None = None
+    created_at: str | None = None
 
 class Setting(SQLModel, table=True):
     __tablename__ = "settings"
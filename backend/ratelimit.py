@@ -0,0 +1,191 @@
+"""Per-IP token buckets shared by every worker on the host.
+
+Each ``(group, ip)`` pair has a bucket of up to ``burst`` tokens, refilled
+at ``rate`` tokens per second.  A request takes one token, or is refused
+with a 429 and a ``Retry-After`` of when the next token will be there.
+Route groups are the admission classes (``admission.classify``) plus
+``login`` for ``POST /admin/login``.  Groups without a configured limit are
+not counted.
+
+Buckets live in a small SQLite file (``RATE_LIMIT_DB``).  Each check is a
+single ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING`` that refills,
+spends and answers in one atomic statement, so the limits hold across
+worker processes.  The limiter fails open: if the store is busy or broken,
+requests go through.
+
+``client_ip`` resolves the address the limits (and audit rows) are keyed
+by.  ``X-Forwarded-For`` is only believed as far as the hops that come from
+``TRUSTED_PROXIES``.  The middleware runs checks on a few dedicated
+threads, never on the event loop.
+"""
+import ipaddress
+import json
+import logging
+import math
+import time
+from typing import Callable, Iterable, Optional
+
+import anyio
+import anyio.to_thread
+from sqlalchemy import create_engine, event, text
+
+from admission import classify as admission_classify
+
+log = logging.getLogger("vinfreak.ratelimit")
+
+SWEEP_EVERY = 1000  # checks between deletions of idle, full buckets
+
+
+def networks(specs: Iterable[str]) -> tuple:
+    return tuple(ipaddress.ip_network(s.strip(), strict=False) for s in specs if s.strip())
+
+
+def _trusted(addr: str, trusted: tuple) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr.strip())
+    except ValueError:
+        return False
+    return any(ip in net for net in trusted)
+
+
+def client_ip(peer: str, forwarded_for: Optional[str], trusted: tuple) -> str:
+    """The client address, following ``X-Forwarded-For`` through trusted proxies.
+
+    Proxies append the address they got the request from, so the header is
+    read right to left.  Each hop is believed only while the hop after it
+    (the connecting peer, at first) is a trusted proxy.  The first hop that
+    is not a trusted proxy is the client.
+    """
+    if not forwarded_for or not _trusted(peer, trusted):
+        return peer
+    hops = [h.strip() for h in forwarded_for.split(",") if h.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, trusted):
+            return hop
+    return hops[0] if hops else peer
+
+
+def group(method: str, path: str) -> Optional[str]:
+    if method == "POST" and path == "/admin/login":
+        return "login"
+    return admission_classify(method, path)
+
+
+class RateLimiter:
+    """Token buckets in the SQLite file at ``path``.
+
+    ``limits`` maps a group to ``(rate, burst)``.  Without a path (or
+    limits) every request is allowed.
+    """
+
+    def __init__(self, path: Optional[str] = None, limits: Optional[dict] = None, trusted: tuple = ()):
+        self.configure(path, limits, trusted)
+
+    def configure(self, path: Optional[str], limits: Optional[dict], trusted: tuple = ()) -> None:
+        self.limits = {g: (float(r), float(b)) for g, (r, b) in (limits or {}).items()}
+        self.trusted = trusted
+        self.limited = dict.fromkeys(self.limits, 0)
+        self._checks = 0
+        self.store = None
+        if path and self.limits:
+            self.store = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+            event.listen(self.store, "connect", _pragmas)
+            with self.store.begin() as conn:
+                conn.exec_driver_sql(
+                    "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                    "updated REAL NOT NULL, granted INTEGER NOT NULL)"
+                )
+
+    def hit(self, group: str, ip: str, now: Optional[float] = None) -> float:
+        """Spend a token; returns 0 if allowed, else seconds until one is due."""
+        if self.store is None or group not in self.limits:
+            return 0.0
+        rate, burst = self.limits[group]
+        now = time.time() if now is None else now
+        args = {"k": f"{group}|{ip}", "now": now, "rate": rate, "burst": burst}
+        try:
+            with self.store.begin() as conn:
+                tokens, granted = conn.execute(_SPEND, args).one()
+                self._checks += 1
+                if self._checks % SWEEP_EVERY == 0:
+                    self._sweep(conn, now)
+        except Exception:
+            log.debug("rate limit store unavailable", exc_info=True)
+            return 0.0
+        if granted:
+            return 0.0
+        self.limited[group] += 1
+        return (1 - tokens) / rate if rate > 0 else float("inf")
+
+    def _sweep(self, conn, now: float) -> None:
+        # A bucket untouched for a day is full again (for any sane rate) and
+        # is indistinguishable from a missing one.
+        conn.execute(text("DELETE FROM buckets WHERE updated < :t"), {"t": now - 86400})
+
+    def stats(self) -> dict:
+        return {"limited": dict(self.limited)}
+
+
+_REFILL = "MIN(:burst, buckets.tokens + MAX(0, :now - buckets.updated) * :rate)"
+_SPEND = text(
+    "INSERT INTO buckets (key, tokens, updated, granted) VALUES (:k, :burst - 1, :now, :burst >= 1) "
+    "ON CONFLICT(key) DO UPDATE SET "
+    f"tokens = CASE WHEN {_REFILL} >= 1 THEN {_REFILL} - 1 ELSE {_REFILL} END, "
+    f"granted = {_REFILL} >= 1, "
+    "updated = :now "
+    "RETURNING tokens, granted"
+)
+
+
+class RateLimit:
+    """ASGI middleware answering over-limit requests with 429."""
+
+    def __init__(self, app, limiter: RateLimiter, group: Callable[[str, str], Optional[str]] = group,
+                 threads: int = 4):
+        self.app = app
+        self.limiter = limiter
+        self.group = group
+        self.threads = threads
+        self._threads: Optional[anyio.CapacityLimiter] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.limiter.store is not None:
+            name = self.group(scope["method"], scope["path"])
+            if name in self.limiter.limits:
+                headers = dict(scope.get("headers") or ())
+                forwarded = headers.get(b"x-forwarded-for", b"").decode("latin-1")
+                peer = scope["client"][0] if scope.get("client") else ""
+                if self._threads is None:  # needs the running loop
+                    self._threads = anyio.CapacityLimiter(self.threads)
+                # The check is a SQLite write that may wait on other workers'
+                # locks; keep it off the event loop, and off the request
+                # threadpool so a flood of checks cannot starve endpoints.
+                wait = await anyio.to_thread.run_sync(
+                    self.limiter.hit, name, client_ip(peer, forwarded, self.limiter.trusted),
+                    limiter=self._threads,
+                )
+                if wait:
+                    return await _too_many(send, wait)
+        await self.app(scope, receive, send)
+
+
+async def _too_many(send, wait: float) -> None:
+    body = json.dumps({"detail": "Too many requests"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(min(wait, 86400)))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=OFF")  # losing a refill on a crash is harmless
+    cur.execute("PRAGMA busy_timeout=50")
+    cur.close()
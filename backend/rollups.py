@@ -0,0 +1,112 @@
+"""Running totals of live cars for dashboards and KPIs.
+
+``car_rollups`` holds one row per ``(dim, key)``: the number of live cars,
+how many of them have a price, and the sum of those prices, for the whole
+catalog (``all``) and per source, dealership, auction status and posting
+day.  SQLite triggers on ``cars`` move a car's contribution between rows as
+it is inserted, changed or deleted, so every write path (ORM, raw SQL, bulk
+imports, the auction scheduler) keeps them current and readers never scan
+``cars``.  ``rebuild`` recomputes everything from scratch.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+
+# dimension -> key expression over a cars row aliased ``{r}``
+DIMENSIONS = {
+    "all": "''",
+    "source": "COALESCE({r}.source, '')",
+    "dealership": "COALESCE(CAST({r}.dealership_id AS TEXT), '')",
+    "status": "UPPER(COALESCE({r}.auction_status, ''))",
+    "day": "CASE WHEN {r}.posted_ts > 0 THEN date({r}.posted_ts, 'unixepoch') ELSE '' END",
+}
+_TRACKED = ("source", "dealership_id", "auction_status", "posted_ts", "price", "deleted_ts")
+
+
+def _apply(r: str, sign: str) -> str:
+    """Add (``+``) or remove (``-``) row ``r``'s contribution to every dimension."""
+    keys = " UNION ALL ".join(
+        f"SELECT '{dim}' AS dim, {expr.format(r=r)} AS key" for dim, expr in DIMENSIONS.items()
+    )
+    return (
+        "INSERT INTO car_rollups (dim, key, cars, priced, price_sum) "
+        f"SELECT dim, key, {sign}1, {sign}({r}.price IS NOT NULL), {sign}COALESCE({r}.price, 0) "
+        f"FROM ({keys}) WHERE {r}.deleted_ts = 0 "
+        "ON CONFLICT (dim, key) DO UPDATE SET cars = cars + excluded.cars, "
+        "priced = priced + excluded.priced, price_sum = price_sum + excluded.price_sum;"
+    )
+
+
+_CHANGED = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in _TRACKED)
+CAR_ROLLUP_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_rollup_insert AFTER INSERT ON cars BEGIN
+        {_apply("NEW", "+")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_rollup_update AFTER UPDATE OF {", ".join(_TRACKED)} ON cars
+    WHEN {_CHANGED} BEGIN
+        {_apply("OLD", "-")}
+        {_apply("NEW", "+")}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_cars_rollup_delete AFTER DELETE ON cars BEGIN
+        {_apply("OLD", "-")}
+    END""",
+]
+
+
+def rebuild(conn) -> None:
+    """Recompute every rollup row from ``cars`` (one pass per dimension)."""
+    conn.execute(text("DELETE FROM car_rollups"))
+    for dim, expr in DIMENSIONS.items():
+        conn.execute(
+            text(
+                "INSERT INTO car_rollups (dim, key, cars, priced, price_sum) "
+                f"SELECT '{dim}', {expr.format(r='cars')}, COUNT(*), COUNT(price), COALESCE(SUM(price), 0) "
+                f"FROM cars WHERE deleted_ts = 0 GROUP BY 2"
+            )
+        )
+
+
+def _row(r) -> dict:
+    return {
+        "key": r["key"] or None,
+        "cars": r["cars"],
+        "avg_price": round(r["price_sum"] / r["priced"], 2) if r["priced"] else None,
+    }
+
+
+def summary(conn, days: int = 30, now: Optional[datetime] = None) -> dict:
+    """Totals, per-dimension breakdowns and the last ``days`` posting days."""
+    now = now or datetime.now(timezone.utc)
+    since = (now - timedelta(days=days - 1)).date().isoformat()
+    week = (now - timedelta(days=6)).date().isoformat()
+    rows = conn.execute(
+        text(
+            "SELECT dim, key, cars, priced, price_sum FROM car_rollups "
+            "WHERE cars > 0 AND (dim != 'day' OR key >= :since) ORDER BY dim, key"
+        ),
+        {"since": since},
+    ).mappings().all()
+    latest = conn.execute(
+        text("SELECT posted_at FROM cars WHERE deleted_ts = 0 ORDER BY posted_ts DESC, id DESC LIMIT 1")
+    ).scalar()
+    out = {"total": 0, "avg_price": None, "latest": latest, "new_7d": 0,
+           "by_source": [], "by_dealership": [], "by_status": [], "by_day": []}
+    for r in rows:
+        if r["dim"] == "all":
+            total = _row(r)
+            out["total"], out["avg_price"] = total["cars"], total["avg_price"]
+        elif r["dim"] == "day":
+            if r["key"]:
+                out["by_day"].append(_row(r))
+                if r["key"] >= week:
+                    out["new_7d"] += r["cars"]
+        else:
+            out[f"by_{r['dim']}"].append(_row(r))
+    for dim in ("by_source", "by_dealership", "by_status"):
+        out[dim].sort(key=lambda x: -x["cars"])
+    if out["by_dealership"]:
+        names = dict(conn.execute(text("SELECT CAST(id AS TEXT), name FROM dealerships")).all())
+        for d in out["by_dealership"]:
+            d["name"] = names.get(d["key"])
+    return out
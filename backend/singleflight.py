@@ -0,0 +1,58 @@
+"""Request coalescing: concurrent identical calls share one execution.
+
+A burst of identical requests (a listing shared on social media) otherwise
+runs the same queries and serialization once per request.  With
+``SingleFlight.do(key, fn)`` the first caller runs ``fn`` and the rest
+block until it finishes and get the same result (or exception).  Nothing is
+kept afterwards; caching is the payload cache's job.
+
+Results are shared, not copied: callers must not mutate them.
+"""
+import threading
+from typing import Any, Callable, Optional
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
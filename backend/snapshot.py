@@ -0,0 +1,192 @@
+"""Binary snapshots of the columnar catalog, shared by every worker.
+
+Layout::
+
+    b"VFSNAP01"   magic and format version
+    u32 (LE)      length of the JSON directory
+    JSON          {"seq", "n", "source", "columns": {name: [dtype, offset]},
+                   "strings": {name: [offsets_at, count, heap_at, heap_len]}}
+    ...           8-byte aligned data
+
+Numeric columns are fixed width, ``n`` entries each.  A vocabulary is a
+``count + 1`` uint32 offsets array into a UTF-8 heap.  ``seq`` is the
+``car_changes`` position the data reflects: a worker restores the columns
+and replays the change log from there.
+
+Files are written under a temporary name and renamed into place, so a
+reader sees the old or the new snapshot, never a torn one.  Readers map
+the file copy-on-write, and the columns are used in place.  Pages a worker
+never writes stay shared with every other worker through the page cache.
+Applying a change copies only the page it touches.  One worker per host
+(whoever holds the ``.lock`` file) rewrites the snapshot after changes.
+"""
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import text
+
+log = logging.getLogger("vinfreak.snapshot")
+
+MAGIC = b"VFSNAP01"
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+
+def _align(pos: int) -> int:
+    return (pos + 7) & ~7
+
+
+def write(path: str, arrays: dict, vocab: dict, seq: int, source: str = "") -> int:
+    """Atomically write a snapshot; returns its size in bytes."""
+    blobs, pos = [], 0
+    directory = {"seq": seq, "n": len(arrays["id"]), "source": source, "columns": {}, "strings": {}}
+
+    def add(data: bytes) -> int:
+        nonlocal pos
+        pos = _align(pos)
+        blobs.append((pos, data))
+        pos += len(data)
+        return blobs[-1][0]
+
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a, dtype=a.dtype.newbyteorder("<"))
+        directory["columns"][name] = [a.dtype.str, add(a.tobytes())]
+    for name, words in vocab.items():
+        encoded = [w.encode("utf-8") for w in words]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        heap = b"".join(encoded)
+        directory["strings"][name] = [add(offsets.tobytes()), len(encoded), add(heap), len(heap)]
+
+    header = json.dumps(directory).encode("utf-8")
+    base = _align(len(MAGIC) + 4 + len(header))
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".snapshot-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC + len(header).to_bytes(4, "little") + header)
+            for at, data in blobs:
+                f.seek(base + at)
+                f.write(data)
+            f.truncate(base + pos)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return base + pos
+
+
+def read(path: str, columns=()) -> Optional[tuple[dict, dict, dict]]:
+    """``(arrays, vocab, directory)`` mapped from ``path``, or ``None``.
+
+    ``None`` also covers files of another format version or without all of
+    ``columns``.
+    """
+    try:
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    except (OSError, ValueError):
+        return None
+    if mm[: len(MAGIC)] != MAGIC:
+        return None
+    size = int.from_bytes(mm[len(MAGIC):len(MAGIC) + 4], "little")
+    start = len(MAGIC) + 4
+    directory = json.loads(mm[start:start + size])
+    if not set(columns) <= set(directory["columns"]):
+        return None
+    base, n = _align(start + size), directory["n"]
+    arrays = {
+        name: np.frombuffer(mm, dtype=np.dtype(dt), count=n, offset=base + at)
+        for name, (dt, at) in directory["columns"].items()
+    }
+    vocab = {}
+    for name, (offsets_at, count, heap_at, heap_len) in directory["strings"].items():
+        offsets = np.frombuffer(mm, dtype="<u4", count=count + 1, offset=base + offsets_at).tolist()
+        heap = mm[base + heap_at:base + heap_at + heap_len]
+        vocab[name] = [heap[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(count)]
+    return arrays, vocab, directory
+
+
+def restore(catalog, path: str, engine) -> Optional[int]:
+    """Fill ``catalog`` from the snapshot at ``path``; returns its ``seq``.
+
+    Snapshots of another database, or from ahead of its change log (a
+    restored backup), are ignored.
+    """
+    from catalog import COLUMNS
+
+    snap = read(path, COLUMNS)
+    if snap is None:
+        return None
+    arrays, vocab, directory = snap
+    with engine.connect() as conn:
+        latest = conn.execute(text("SELECT COALESCE(MAX(seq), 0) FROM car_changes")).scalar()
+    if directory["source"] != str(engine.url) or directory["seq"] > latest:
+        return None
+    catalog.restore({c: arrays[c] for c in COLUMNS}, vocab)
+    return directory["seq"]
+
+
+class SnapshotWriter:
+    """Rewrite the snapshot at most every ``interval`` seconds after changes.
+
+    ``on_changes`` is a change-tailer listener registered after the
+    catalog's own.  It runs on the tailer thread, so the exported columns
+    match ``tailer.seq``.  Only the worker holding the lock file writes.
+    """
+
+    def __init__(self, catalog, tailer, path: str, source: str = "", interval: float = 5.0):
+        self.catalog = catalog
+        self.tailer = tailer
+        self.path = path
+        self.source = source
+        self.interval = interval
+        self.last = 0.0
+        self.dirty = False
+        self.leader = False
+        self._lock_file = None
+
+    def acquire(self) -> bool:
+        """Become this host's writer if nobody else is."""
+        if fcntl is None:
+            self.leader = True
+            return True
+        f = open(self.path + ".lock", "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock_file = f  # held (and the lock with it) for the process lifetime
+        self.leader = True
+        return True
+
+    def write(self) -> None:
+        seq = self.tailer.seq  # read first: the exported state is at least this new
+        arrays, vocab = self.catalog.export()
+        started = time.perf_counter()
+        size = write(self.path, arrays, vocab, seq, self.source)
+        self.last, self.dirty = time.monotonic(), False
+        log.info("catalog snapshot: %d cars, %d bytes at seq %d in %.1f ms",
+                 len(arrays["id"]), size, seq, (time.perf_counter() - started) * 1000)
+
+    def on_changes(self, rows: dict, deleted: list) -> None:
+        if not self.leader:
+            return
+        self.dirty = True
+        if time.monotonic() - self.last >= self.interval:
+            self.write()
+
+    def flush(self) -> None:
+        if self.leader and self.dirty:
+            self.write()
@@ -0,0 +1,334 @@
+"""Transparent compression of the long-form ``car_details`` text.
+
+Descriptions and equipment lists repeat a lot, both within one listing and
+across listings from the same source.  With ``TEXT_COMPRESSION`` enabled,
+values are stored as small BLOBs:
+
+* ``zlib``: ``b"\\x01"`` + raw deflate stream;
+* ``dict``: ``b"\\x02"`` + 4-byte dictionary id + deflate stream primed with
+  a per-source preset dictionary (``train``), which is what makes short,
+  boilerplate-heavy fields compress at all.  Sources without a dictionary
+  fall back to plain zlib.
+
+Plain ``str`` values are always read back unchanged, so compression can be
+switched on or off at any time; ``repack`` rewrites existing rows.  Values
+are only decoded when a ``CarDetails`` row (or ``read_details``) is loaded,
+i.e. when a response actually includes them.
+
+``python textpack.py report`` prints size and latency numbers for the
+current database; see the README.
+"""
+import collections
+import logging
+import re
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+from sqlalchemy import text
+from sqlalchemy.types import Text, TypeDecorator
+
+log = logging.getLogger("vinfreak.textpack")
+
+MODES = ("off", "zlib", "dict")
+MIN_SIZE = 64  # shorter values are stored as-is
+DICT_SIZE = 32 << 10  # zlib uses at most a 32 KiB window
+_ZLIB, _DICT = b"\x01", b"\x02"
+
+_mode = "off"
+_level = 6
+_engine = None
+_dicts: dict[int, bytes] = {}  # id -> preset dictionary
+_by_source: dict[str, int] = {}  # source -> newest dictionary id
+
+
+def configure(mode: str = "off", level: int = 6, engine=None) -> None:
+    """Set the write mode; reads handle every format regardless."""
+    global _mode, _level, _engine
+    if mode not in MODES:
+        raise ValueError(f"TEXT_COMPRESSION must be one of {MODES}, not {mode!r}")
+    _mode, _level, _engine = mode, level, engine
+    if engine is not None and mode == "dict":
+        load_dictionaries(engine)
+
+
+def load_dictionaries(engine) -> None:
+    with engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, source, data FROM text_dictionaries ORDER BY id")).all()
+    for dict_id, source, data in rows:
+        _dicts[dict_id] = data
+        _by_source[source] = dict_id
+
+
+def wants_source() -> bool:
+    """Whether ``pack`` output depends on the source, i.e. a dictionary is loaded."""
+    return _mode == "dict" and bool(_by_source)
+
+
+def _dictionary(dict_id: int) -> bytes:
+    if dict_id not in _dicts:
+        if _engine is None:
+            raise LookupError(f"text dictionary {dict_id} is not loaded")
+        with _engine.connect() as conn:
+            data = conn.execute(
+                text("SELECT data FROM text_dictionaries WHERE id = :id"), {"id": dict_id}
+            ).scalar()
+        if data is None:
+            raise LookupError(f"text dictionary {dict_id} does not exist")
+        _dicts[dict_id] = data
+    return _dicts[dict_id]
+
+
+def _deflate(raw: bytes, zdict: Optional[bytes] = None) -> bytes:
+    c = zlib.compressobj(_level, zlib.DEFLATED, -15, zdict=zdict) if zdict else \
+        zlib.compressobj(_level, zlib.DEFLATED, -15)
+    return c.compress(raw) + c.flush()
+
+
+def pack(value: Optional[str], source: Optional[str] = None, mode: Optional[str] = None) -> Union[str, bytes, None]:
+    """Encode ``value`` for storage under ``mode`` (default: the configured one)."""
+    mode = mode or _mode
+    if mode == "off" or not isinstance(value, str) or len(value) < MIN_SIZE:
+        return value
+    raw = value.encode("utf-8")
+    dict_id = _by_source.get(source) if mode == "dict" and source else None
+    if dict_id is not None:
+        out = _DICT + dict_id.to_bytes(4, "big") + _deflate(raw, _dicts[dict_id])
+    else:
+        out = _ZLIB + _deflate(raw)
+    return out if len(out) < len(raw) else value
+
+
+def unpack(value) -> Optional[str]:
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        return value
+    value = bytes(value)
+    if value[:1] == _ZLIB:
+        return zlib.decompress(value[1:], -15).decode("utf-8")
+    if value[:1] == _DICT:
+        d = zlib.decompressobj(-15, zdict=_dictionary(int.from_bytes(value[1:5], "big")))
+        return (d.decompress(value[5:]) + d.flush()).decode("utf-8")
+    return value.decode("utf-8")
+
+
+def unpack_row(row, fields) -> dict:
+    row = dict(row)
+    for f in fields:
+        if f in row:
+            row[f] = unpack(row[f])
+    return row
+
+
+class PackedText(TypeDecorator):
+    """``TEXT`` column that transparently stores ``pack``-ed values.
+
+    A bind parameter does not know its row, so values packed here never use
+    a dictionary; ``models`` packs ``CarDetails`` writes with the listing's
+    source before they get this far, and already-packed bytes pass through.
+    """
+
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return pack(value)
+
+    def process_result_value(self, value, dialect):
+        return unpack(value)
+
+
+_SPLIT = re.compile(r"(?:\n|•|(?<=[.!?])\s+)")
+
+
+def train(engine, source: str, fields, sample: int = 2000, size: int = DICT_SIZE) -> Optional[int]:
+    """Build and store a preset dictionary from ``source``'s recent listings.
+
+    The dictionary is the phrases (lines, list items, sentences) that recur
+    across listings, most valuable last since deflate prefers near matches.
+    Returns the new dictionary id, or ``None`` if nothing recurs.
+    """
+    cols = ", ".join(f"d.{f}" for f in fields)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text(
+                f"SELECT {cols} FROM car_details d JOIN cars ON cars.id = d.car_id "
+                "WHERE cars.source = :source ORDER BY cars.id DESC LIMIT :n"
+            ),
+            {"source": source, "n": sample},
+        ).all()
+    counts = collections.Counter()
+    for row in rows:
+        seen = set()
+        for value in row:
+            for phrase in _SPLIT.split(unpack(value) or ""):
+                phrase = phrase.strip()
+                if len(phrase) >= 8 and phrase not in seen:
+                    seen.add(phrase)
+                    counts[phrase] += 1
+    ranked = sorted(
+        ((n * len(p), p) for p, n in counts.items() if n > 1), reverse=True
+    )
+    chosen, total = [], 0
+    for _, phrase in ranked:
+        b = phrase.encode("utf-8") + b"\n"
+        if total + len(b) > size:
+            continue
+        chosen.append(b)
+        total += len(b)
+    if not chosen:
+        return None
+    data = b"".join(reversed(chosen))
+    with engine.begin() as conn:
+        dict_id = conn.execute(
+            text(
+                "INSERT INTO text_dictionaries (source, data, created_at) VALUES (:s, :d, :c) RETURNING id"
+            ),
+            {"s": source, "d": data, "c": datetime.now(timezone.utc).isoformat()},
+        ).scalar()
+    _dicts[dict_id] = data
+    _by_source[source] = dict_id
+    return dict_id
+
+
+def repack(engine, fields, batch_size: int = 500) -> tuple[int, int, int]:
+    """Rewrite every ``car_details`` row under the configured mode.
+
+    Returns ``(rows, bytes_before, bytes_after)`` of the text fields.
+    """
+    cols = ", ".join(f"d.{f}" for f in fields)
+    sets = ", ".join(f"{f} = :{f}" for f in fields)
+    done = before = after = 0
+    last = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT d.car_id, cars.source, {cols} FROM car_details d "
+                    "LEFT JOIN cars ON cars.id = d.car_id "
+                    "WHERE d.car_id > :last ORDER BY d.car_id LIMIT :n"
+                ),
+                {"last": last, "n": batch_size},
+            ).mappings().all()
+            if not rows:
+                return done, before, after
+            updates = []
+            for r in rows:
+                new = {"car_id": r["car_id"]}
+                for f in fields:
+                    before += _stored_size(r[f])
+                    new[f] = pack(unpack(r[f]), r["source"])
+                    after += _stored_size(new[f])
+                updates.append(new)
+            conn.execute(text(f"UPDATE car_details SET {sets} WHERE car_id = :car_id"), updates)
+            done += len(rows)
+            last = rows[-1]["car_id"]
+
+
+def _stored_size(value) -> int:
+    if value is None:
+        return 0
+    return len(value) if isinstance(value, (bytes, bytearray, memoryview)) else len(value.encode("utf-8"))
+
+
+def report(url: str, fields, reads: int = 200) -> list[dict]:
+    """Compare plain TEXT, zlib and per-source dictionaries on a copy of ``url``.
+
+    For each mode the copy is repacked and vacuumed, then measured for file
+    size, the CPU time of the repack, and the time of ``reads`` cold
+    detail lookups (fresh connection, minimal page cache) including decoding.
+    """
+    import os
+    import sqlite3
+    import tempfile
+
+    from sqlalchemy import create_engine
+
+    src = url.split("sqlite:///", 1)[1]
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in MODES:
+            path = os.path.join(tmp, f"{mode}.db")
+            with sqlite3.connect(src) as a, sqlite3.connect(path) as b:
+                a.backup(b)
+            eng = create_engine(f"sqlite:///{path}")
+            _dicts.clear()
+            _by_source.clear()
+            configure(mode, engine=eng)
+            cpu = time.process_time()
+            if mode == "dict":
+                with eng.connect() as conn:
+                    sources = [s for (s,) in conn.execute(text("SELECT DISTINCT source FROM cars WHERE source IS NOT NULL"))]
+                for s in sources:
+                    train(eng, s, fields)
+            # Repack from plain text so every mode starts from the same data.
+            configure("off", engine=eng)
+            repack(eng, fields)
+            configure(mode, engine=eng)
+            _, plain_bytes, packed_bytes = repack(eng, fields)
+            pack_cpu = time.process_time() - cpu
+            eng.dispose()
+            with sqlite3.connect(path) as conn:
+                conn.execute("VACUUM")
+            size = os.path.getsize(path)
+
+            eng = create_engine(f"sqlite:///{path}")
+            with eng.connect() as conn:
+                ids = [i for (i,) in conn.execute(text("SELECT car_id FROM car_details ORDER BY car_id"))]
+            step = max(1, len(ids) // reads) if ids else 1
+            sample = ids[::step][:reads]
+            wall, cpu = time.perf_counter(), time.process_time()
+            for car_id in sample:
+                with eng.connect() as conn:
+                    conn.exec_driver_sql("PRAGMA cache_size = 0")
+                    row = conn.execute(
+                        text(f"SELECT {', '.join(fields)} FROM car_details WHERE car_id = :id"), {"id": car_id}
+                    ).mappings().one()
+                    unpack_row(row, fields)
+            n = max(1, len(sample))
+            out.append({
+                "mode": mode,
+                "db_bytes": size,
+                "text_bytes": packed_bytes,
+                "ratio": round(plain_bytes / packed_bytes, 2) if packed_bytes else None,
+                "pack_cpu_s": round(pack_cpu, 3),
+                "cold_read_ms": round((time.perf_counter() - wall) * 1000 / n, 3),
+                "read_cpu_ms": round((time.process_time() - cpu) * 1000 / n, 3),
+            })
+            eng.dispose()
+    configure("off")
+    return out
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from ingest import DETAIL_FIELDS
+
+    p = argparse.ArgumentParser(prog="python textpack.py", description="car_details compression tools")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("report", help="compare storage and read cost of each mode on a copy of the DB")
+    rp = sub.add_parser("repack", help="rewrite car_details under TEXT_COMPRESSION")
+    rp.add_argument("--train", action="store_true", help="(re)train per-source dictionaries first")
+    args = p.parse_args()
+
+    from backend_settings import settings
+
+    if args.cmd == "report":
+        rows = report(settings.DATABASE_URL, DETAIL_FIELDS)
+        cols = list(rows[0])
+        print(" | ".join(cols))
+        for r in rows:
+            print(" | ".join(str(r[c]) for c in cols))
+    else:
+        from db import engine, init_db
+
+        init_db()
+        configure(settings.TEXT_COMPRESSION, engine=engine)
+        if args.train and settings.TEXT_COMPRESSION == "dict":
+            with engine.connect() as conn:
+                sources = [s for (s,) in conn.execute(text("SELECT DISTINCT source FROM cars WHERE source IS NOT NULL"))]
+            for s in sources:
+                print(s, "->", train(engine, s, DETAIL_FIELDS))
+        n, before, after = repack(engine, DETAIL_FIELDS)
+        print(f"{n} rows: {before} -> {after} bytes of text")
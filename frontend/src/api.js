@@ -62,6 +62,11 @@ export function getDealerships() {
   return getJSON("/dealerships");
 }
 
+// Fetch catalog KPIs (totals, averages, per-source/day breakdowns)
+export function getStats() {
+  return getJSON("/stats/summary");
+}
+
 // Map filters -> URLSearchParams
 function toParams(filters = {}, paging = {}) {
   const p = new URLSearchParams();
@@ -1,5 +1,5 @@
 import { useContext, useEffect, useMemo, useState } from "react";
-import { getJSON, getDealerships } from "../api";
+import { getJSON, getDealerships, getStats } from "../api";
 import { normalizeCar } from "../utils/normalizeCar";
 import { fmtNum, fmtMoney, fmtDate } from "../utils/text";
 import SearchBar from "../components/SearchBar";
@@ -13,6 +13,7 @@ import { useToast } from "../ToastContext";
 
 export default function Home() {
   const [raw, setRaw] = useState([]);
+  const [stats, setStats] = useState(null);
   const [loading, setLoading] = useState(true);
   const [hasError, setHasError] = useState(false);
   const { addToast } = useToast();
@@ -53,13 +54,12 @@ export default function Home() {
     })();
   }, []);
 
-  const kpis = useMemo(() => {
-    if (!raw.length) return null;
-    const prices = raw.map(c => c.__price).filter(x => x!=null && !isNaN(Number(x)));
-    const avg = prices.length ? (prices.reduce((a,b)=>a+Number(b),0)/prices.length) : null;
-    const latest = raw.reduce((acc, c) => acc || c.posted_at, null);
-    return { total: raw.length, avgPrice: avg, latest: latest };
-  }, [raw]);
+  // KPIs come precomputed from the server's rollups, not from the catalog.
+  useEffect(() => {
+    getStats().then(setStats).catch(() => setStats(null));
+  }, []);
+
+  const kpis = stats && { total: stats.total, avgPrice: stats.avg_price, latest: stats.latest };
 
   const filtered = useMemo(() => {
     const text = q.trim().toLowerCase();
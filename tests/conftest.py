@@ -0,0 +1,19 @@
+import pathlib, sys
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+# app.py imports its sibling modules flat (``from ingest import ...``) because
+# uvicorn runs it from inside ``backend/``; mirror that here.
+BACKEND = pathlib.Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND) not in sys.path:
+    sys.path.append(str(BACKEND))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A file-backed SQLite database with every table created and nothing in it."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
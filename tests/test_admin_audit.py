@@ -10,6 +10,8 @@ settings = types.SimpleNamespace(
     ADMIN_DATABASE_URL="sqlite://",
     UPLOAD_DIR="uploads",
     SECRET_KEY="test",
+    CORS_ORIGINS=["*"],
+    CORS_ALLOW_CREDENTIALS=True,
 )
 sys.modules['backend_settings'] = types.SimpleNamespace(settings=settings)
 sys.path.append(str(ROOT))
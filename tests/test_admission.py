@@ -0,0 +1,93 @@
+import asyncio, json, pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from admission import AdmissionControl, Limiter, RouteClass, classify
+
+
+def test_classify_routes():
+    assert classify("GET", "/cars") == "list"
+    assert classify("GET", "/cars/changes") == "list"
+    assert classify("GET", "/cars/12") == "detail"
+    assert classify("GET", "/admin/cars") == "admin"
+    assert classify("POST", "/admin/cars/import") == "import"
+    assert classify("POST", "/admin/imports/3/resume") == "import"
+    assert classify("POST", "/cars/bulk") == "import"
+    assert classify("GET", "/cars/stream") is None
+    assert classify("GET", "/static/app.css") is None
+
+
+def _limiter():
+    return Limiter(
+        [
+            RouteClass("list", limit=2, queue=1, wait=0.2),
+            RouteClass("admin", limit=2, queue=2, wait=1.0, priority=0),
+        ],
+        total=3, reserve=1, retry_after=1.5,
+    )
+
+
+def test_budgets_queue_deadline_and_admin_priority():
+    async def scenario():
+        lim = _limiter()
+        assert await lim.acquire("list") and await lim.acquire("list")
+        # The class is at its limit: one may queue, the next is shed at once.
+        waiter = asyncio.create_task(lim.acquire("list"))
+        await asyncio.sleep(0)
+        assert not await lim.acquire("list")
+        # Admin gets the reserved slot, and then queues.
+        assert await lim.acquire("admin")
+        queued_admin = asyncio.create_task(lim.acquire("admin"))
+        await asyncio.sleep(0)
+        assert lim.stats()["list"] == {"active": 2, "queued": 1, "shed": 1}
+        # The first freed slot goes to the admin waiter, ahead of the older list waiter.
+        lim.release("list")
+        assert await queued_admin and not waiter.done()
+        # Nothing else frees up in time: the list waiter is shed at its deadline.
+        assert not await waiter
+        assert lim.stats()["list"] == {"active": 1, "queued": 0, "shed": 2}
+        lim.release("admin")
+        lim.release("admin")
+        lim.release("list")
+        assert lim.in_use == 0
+
+    asyncio.run(scenario())
+
+
+def test_middleware_sheds_with_503_and_retry_after():
+    lim = _limiter()
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        mw = AdmissionControl(app, lim)
+
+        async def call(path):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            await mw({"type": "http", "method": "GET", "path": path}, None, send)
+            return sent
+
+        running = [asyncio.create_task(call("/cars")) for _ in range(3)]
+        await asyncio.sleep(0)
+        shed = await call("/cars")
+        assert shed[0]["status"] == 503
+        assert dict(shed[0]["headers"])[b"retry-after"] == b"2"
+        assert json.loads(shed[1]["body"])["detail"]
+        # Ungated routes are not counted.
+        release.set()
+        assert (await call("/static/x.css"))[0]["status"] == 200
+        done = await asyncio.gather(*running)
+        assert [d[0]["status"] for d in done] == [200, 200, 200]
+        assert lim.in_use == 0
+
+    asyncio.run(scenario())
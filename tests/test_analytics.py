@@ -0,0 +1,50 @@
+import pathlib, sys
+
+from sqlmodel import Session
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car
+
+import analytics
+
+
+def _seed(engine):
+    with Session(engine) as s:
+        # 997 Carreras: price falls 10k per 10k miles
+        for i, status in enumerate(["SOLD", "SOLD", "RESERVE_NOT_MET", "LIVE", "SOLD"]):
+            s.add(Car(vin=f"P{i}", make="Porsche", model="911", year=2006, auction_status=status,
+                      price=100_000 - 10_000 * i, mileage=10_000 * i,
+                      posted_at=f"2024-0{i + 1}-01T00:00:00"))
+        s.add(Car(vin="B0", make="BMW", model="M3", year=2003, auction_status="LIVE", price=None))
+        s.add(Car(vin="X", make="Porsche", model="911", year=2006, price=1, deleted_at="2024-01-01"))
+        s.commit()
+
+
+def test_market_groups_percentiles_curve_and_sell_through(engine):
+    _seed(engine)
+    result = analytics.market(engine)
+    porsche, bmw = result["groups"]
+    assert (porsche["make"], porsche["model"], porsche["year"], porsche["count"]) == ("Porsche", "911", 2006, 5)
+    assert porsche["price_median"] == 80_000
+    assert porsche["price_p10"] == 64_000 and porsche["price_p90"] == 96_000
+    assert porsche["price_per_10k_miles"] == -10_000
+    assert porsche["price_curve"][0] == {"mileage": 0, "price": 100_000}
+    assert porsche["price_curve"][-1] == {"mileage": 25_000, "price": 75_000}
+    assert porsche["sold_through"] == 0.75 and porsche["live"] == 1
+    assert bmw["price_median"] is None and bmw["price_curve"] == [] and bmw["sold_through"] is None
+
+    window = analytics.market(engine, "posted_ts >= :a", {"a": 1709251200})  # 2024-03-01
+    assert window["groups"][0]["count"] == 3
+
+
+def test_results_are_cached_per_catalog_version(engine):
+    _seed(engine)
+    first = analytics.market(engine, "make = :m", {"m": "BMW"})
+    assert analytics.market(engine, "make = :m", {"m": "BMW"}) is first
+    with Session(engine) as s:
+        s.add(Car(vin="B1", make="BMW", model="M3", year=2003, price=40_000))
+        s.commit()
+    second = analytics.market(engine, "make = :m", {"m": "BMW"})
+    assert second["version"] > first["version"] and second["groups"][0]["count"] == 2
@@ -0,0 +1,111 @@
+import pathlib, sys, time
+from datetime import datetime, timezone
+
+import pytest
+from sqlmodel import Session
+from sqlalchemy import text
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car
+
+import auctions
+
+NOW = datetime(2025, 6, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+
+def test_parse_end_time_formats():
+    iso = auctions.parse_end_time("2025-06-02T12:00:00Z")
+    assert iso == NOW + 86400
+    assert auctions.parse_end_time("2025-06-02T12:00:00") == iso
+    assert auctions.parse_end_time(str(int(iso * 1000))) == iso
+    assert auctions.parse_end_time("Ended November 5th, 2024 at 7:42 PM UTC") == datetime(
+        2024, 11, 5, 19, 42, tzinfo=timezone.utc).timestamp()
+    # no year: the occurrence closest to now
+    assert auctions.parse_end_time("Ends June 3rd at 5:47 PM UTC", NOW) == datetime(
+        2025, 6, 3, 17, 47, tzinfo=timezone.utc).timestamp()
+    assert auctions.parse_end_time("Ended December 30th at 1:00 AM", NOW) == datetime(
+        2024, 12, 30, 1, 0, tzinfo=timezone.utc).timestamp()
+    assert auctions.parse_end_time("Ended August 7th at 7:14 PM UTC", NOW) == datetime(
+        2024, 8, 7, 19, 14, tzinfo=timezone.utc).timestamp()
+    assert auctions.parse_end_time("soon") is None
+    assert auctions.parse_end_time("") is None
+
+
+def test_time_left_is_computed_at_response_time():
+    car = {"end_time": "2025-06-02T15:30:00Z", "time_left": "9 days", "auction_status": "LIVE"}
+    assert auctions.apply_live_fields(dict(car), NOW)["time_left"] == "1d 3h"
+    late = auctions.apply_live_fields(dict(car), NOW + 3 * 86400)
+    assert late["time_left"] == "Ended" and late["auction_status"] == "ENDED"
+    assert auctions.apply_live_fields({"end_time": None, "time_left": "x"}, NOW)["time_left"] == "x"
+    assert auctions.format_time_left(125) == "2m 5s"
+
+
+def _status(engine):
+    with engine.connect() as conn:
+        return dict(conn.execute(text("SELECT vin, auction_status FROM cars")).all())
+
+
+def test_scheduler_ends_only_due_auctions(engine):
+    iso = lambda ts: datetime.fromtimestamp(ts, timezone.utc).isoformat()
+    with Session(engine) as s:
+        s.add(Car(vin="DUE", auction_status="LIVE", end_time=iso(NOW - 60)))
+        s.add(Car(vin="LATER", auction_status="LIVE", end_time=iso(NOW + 3600)))
+        s.add(Car(vin="EXTENDED", auction_status="LIVE", end_time=iso(NOW - 30)))
+        s.add(Car(vin="SOLD", auction_status="SOLD", end_time=iso(NOW - 60)))
+        s.commit()
+    ended = []
+    sched = auctions.AuctionScheduler(engine, on_end=ended.extend)
+    assert sched.load() == 3
+    assert sched.next_due() == NOW - 60
+
+    # anti-sniping extension arrives through the change tailer
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE cars SET end_time = :e WHERE vin = 'EXTENDED'"), {"e": iso(NOW + 120)})
+    sched.on_changes({3: {"id": 3, "auction_status": "LIVE", "end_time": iso(NOW + 120)}}, [])
+
+    assert sched.run_due(NOW) == [1] and ended == [1]
+    assert _status(engine) == {"DUE": "ENDED", "LATER": "LIVE", "EXTENDED": "LIVE", "SOLD": "SOLD"}
+    assert sched.next_due() == NOW + 120 and len(sched) == 2
+
+    sched.on_changes({}, [2])
+    assert sched.run_due(NOW + 7200) == [3]
+    assert _status(engine)["LATER"] == "LIVE" and len(sched) == 0
+
+
+def test_scheduler_thread_wakes_for_new_deadline(engine):
+    end = datetime.fromtimestamp(time.time() + 0.2, timezone.utc).isoformat()
+    with Session(engine) as s:
+        s.add(Car(vin="SOON", auction_status="LIVE", end_time=end))
+        s.commit()
+    sched = auctions.AuctionScheduler(engine)
+    sched.start()
+    try:
+        sched.schedule(1, end)
+        deadline = time.time() + 5
+        while _status(engine)["SOON"] != "ENDED" and time.time() < deadline:
+            time.sleep(0.05)
+        assert _status(engine)["SOON"] == "ENDED" and sched.ended == 1
+    finally:
+        sched.stop()
+
+
+def test_scheduler_handles_feed_casing_and_retries_failed_updates(engine, monkeypatch):
+    end = datetime.fromtimestamp(NOW - 60, timezone.utc).isoformat()
+    with Session(engine) as s:
+        s.add(Car(vin="MIXED", auction_status="Live", end_time=end))
+        s.commit()
+    sched = auctions.AuctionScheduler(engine)
+    assert sched.load() == 1
+
+    def busy():
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as m:
+        m.setattr(engine, "begin", busy)
+        with pytest.raises(RuntimeError):
+            sched.run_due(NOW)
+    assert len(sched) == 1 and sched.next_due() == NOW - 60  # kept for the next run
+    assert sched.run_due(NOW) == [1]
+    assert _status(engine) == {"MIXED": "ENDED"}
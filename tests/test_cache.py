@@ -0,0 +1,50 @@
+import pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import cache
+
+
+def test_l1_and_shared_l2_keyed_by_version(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_a, worker_b = cache.PayloadCache(path), cache.PayloadCache(path)
+    payload = {"id": 1, "title": "Carrera " * 50, "time_left": "1h"}
+    assert worker_a.get("car:1", 5) is None
+    worker_a.put("car:1", 5, payload)
+
+    first = worker_a.get("car:1", 5)
+    assert first == payload and worker_a.hits["l1"] == 1
+    first["time_left"] = "mutated"  # every hit is a fresh copy
+    assert worker_a.get("car:1", 5)["time_left"] == "1h"
+
+    # Another worker (or a restarted one) finds it in L2, then in its own L1.
+    assert worker_b.get("car:1", 5) == payload and worker_b.hits["l2"] == 1
+    assert worker_b.get("car:1", 5) == payload and worker_b.hits["l1"] == 1
+
+    # A new catalog version misses, and its first write purges older entries.
+    assert worker_b.get("car:1", 6) is None
+    worker_b.put("car:2", 6, {"id": 2})
+    assert cache.PayloadCache(path).get("car:1", 5) is None
+
+    # After a restore from backup the log is behind the cache: drop the future.
+    worker_b.sync(3)
+    assert cache.PayloadCache(path).get("car:2", 6) is None
+
+
+def test_size_bounds(tmp_path, monkeypatch):
+    small = cache.PayloadCache(l1_bytes=300)
+    for i in range(20):
+        small.put(f"k{i}", 1, {"i": i, "pad": str(i) * 100})
+    assert small.stats()["l1_bytes"] <= 300 and small.get("k19", 1) is not None
+    assert small.get("k0", 1) is None
+
+    monkeypatch.setattr(cache, "PRUNE_EVERY", 10)
+    l2 = cache.PayloadCache(str(tmp_path / "c.db"), l1_bytes=0, l2_bytes=2000)
+    blob = bytes(range(256)).hex()  # incompressible enough
+    for i in range(40):
+        l2.put(f"k{i}", 1, {"i": i, "blob": blob + str(i)})
+    with l2.l2.connect() as conn:
+        sizes = [n for (n,) in conn.exec_driver_sql("SELECT size FROM payloads")]
+    assert sum(sizes) - sizes[-1] * 9 <= 2000  # pruned at most 9 puts ago
+    assert l2.get("k0", 1) is None and l2.get("k39", 1) is not None
@@ -13,6 +13,8 @@ settings = types.SimpleNamespace(
     ADMIN_DATABASE_URL="sqlite://",
     UPLOAD_DIR="uploads",
     SECRET_KEY="test",
+    CORS_ORIGINS=["*"],
+    CORS_ALLOW_CREDENTIALS=True,
 )
 sys.modules["backend_settings"] = types.SimpleNamespace(settings=settings)
 sys.path.append(str(ROOT))
@@ -61,6 +63,7 @@ def test_images_json_exposed():
 
     lst = app_module.list_cars()
     item = next(c for c in lst if c["id"] == cid)
-    assert item["images"] == ["a.jpg", "b.jpg"]
+    # the gallery is a detail field; listings carry only the hero image
+    assert item["images"] == ["a.jpg"]
     assert item["image_url"] == "a.jpg"
 
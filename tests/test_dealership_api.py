@@ -15,6 +15,8 @@ settings = types.SimpleNamespace(
     ADMIN_DATABASE_URL="sqlite://",
     UPLOAD_DIR="uploads",
     SECRET_KEY="test",
+    CORS_ORIGINS=["*"],
+    CORS_ALLOW_CREDENTIALS=True,
 )
 sys.modules['backend_settings'] = types.SimpleNamespace(settings=settings)
 sys.path.append(str(ROOT))
@@ -115,3 +117,23 @@ def test_remove_logo_from_dealership():
         d = s.get(Dealership, d1_id)
         assert d.logo_url is None
     assert not old.exists()
+
+
+def test_dealership_edit_invalidates_cached_car_payloads(monkeypatch):
+    from cache import PayloadCache
+    d1_id, _, c1_id, *_ = _seed()
+    monkeypatch.setattr(app_module, "payload_cache", PayloadCache())
+    assert app_module.get_car(str(c1_id))["dealership"]["name"] == "Dealer1"
+    assert len(app_module.list_cars()) == 3
+    req = types.SimpleNamespace(
+        session={"csrf_token": "tok", "admin_user": "admin"},
+        headers={},
+        client=types.SimpleNamespace(host="test"),
+    )
+    app_module.admin_dealership_update(
+        req, d1_id, csrf="tok", name="Renamed", logo=None, remove_logo=False, _=True
+    )
+    assert app_module.get_car(str(c1_id))["dealership"]["name"] == "Renamed"
+    car = next(c for c in app_module.list_cars() if c["id"] == c1_id)
+    assert car["dealership"]["name"] == "Renamed"
+    assert app_module.payload_cache.stats()["hits"]["l1"] == 0
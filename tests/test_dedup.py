@@ -0,0 +1,58 @@
+import pathlib, sys
+
+from sqlmodel import SQLModel, create_engine
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import backend.models  # noqa: F401  (registers tables)
+
+import dedup
+from ingest import CarImport
+
+DESC = (
+    "This 2014 Porsche Cayman S is finished in Basalt Black over black leather "
+    "and is powered by a 3.4 liter flat six paired with a seven speed PDK. "
+    "Equipment includes sport chrono, bi-xenon headlights and 20 inch wheels."
+)
+
+
+def _import(engine, items):
+    importer = CarImport(engine, [c.name for c in backend.models.Car.__table__.columns])
+    for item in items:
+        importer.add(item)
+    return importer.flush()
+
+
+def test_cross_source_near_duplicates_are_clustered(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dedup.db'}")
+    SQLModel.metadata.create_all(engine)
+    _import(engine, [
+        {"source": "carsandbids", "lot_number": "A1", "title": "2014 Porsche Cayman S",
+         "description": DESC, "year": 2014, "mileage": 41000},
+        {"source": "bat", "lot_number": "Z9", "title": "2012 Ford F-150 Raptor",
+         "description": "Lifted truck with a 6.2 liter V8, lots of aftermarket parts and new tires.",
+         "year": 2012, "mileage": 88000},
+    ])
+    # a later feed carries the same car with a slightly edited description
+    created, _ = _import(engine, [
+        {"source": "porsche_json", "lot_number": "P7", "title": "2014 Porsche Cayman S",
+         "description": DESC.replace("20 inch", "twenty-inch"), "year": 2014, "mileage": 41200},
+    ])
+    with engine.connect() as conn:
+        assert dedup.clusters(conn) == [[1, created[0][0]]]
+        # same listing text under two different VINs is not a duplicate
+        conn.exec_driver_sql("UPDATE cars SET vin = 'WP0AB29' WHERE id = 1")
+        conn.exec_driver_sql("UPDATE cars SET vin = 'WP0AB30' WHERE id = 3")
+        conn.exec_driver_sql("DELETE FROM car_duplicates")
+        dedup.index_rows(conn, [(3, {"title": "2014 Porsche Cayman S", "description": DESC,
+                                     "year": 2014, "mileage": 41200})])
+        assert dedup.clusters(conn) == []
+
+
+def test_similarity_estimates_jaccard():
+    a = dedup.shingles({"title": "2014 Porsche Cayman S", "description": DESC})
+    b = dedup.shingles({"title": "2012 Ford F-150 Raptor", "description": "A lifted truck."})
+    assert dedup.similarity(dedup.signature(a), dedup.signature(a)) == 1.0
+    assert dedup.similarity(dedup.signature(a), dedup.signature(b)) < 0.2
+    assert dedup.signature({"x"}) is None
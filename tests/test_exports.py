@@ -0,0 +1,58 @@
+import csv, gzip, io, json, pathlib, sys
+
+from sqlmodel import Session
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car
+
+import exports
+
+
+def _seed(engine):
+    with Session(engine) as s:
+        for i in range(7):
+            # several cars share a posted_at so the keyset must break ties by id
+            s.add(Car(vin=f"V{i}", make="Porsche" if i % 2 else "BMW", year=2000 + i,
+                      posted_at=f"2024-01-0{1 + i // 3}T00:00:00", description=f"desc {i}"))
+        s.commit()
+
+
+def test_keyset_chunks_cover_every_row_once(engine):
+    _seed(engine)
+    rows = list(exports.iter_rows(engine, ["id", "vin", "description"], chunk=2))
+    assert [r["id"] for r in rows] == [7, 6, 5, 4, 3, 2, 1]
+    assert rows[0]["description"] == "desc 6"
+    porsches = list(exports.iter_rows(engine, ["vin"], "make = :m", {"m": "Porsche"}, chunk=2))
+    assert [r["vin"] for r in porsches] == ["V5", "V3", "V1"]
+
+
+def test_formats_and_gzip(engine):
+    _seed(engine)
+    cols = exports.pick_columns(exports.car_columns(engine), "vin,year,bogus")
+    assert cols == ["vin", "year"]
+
+    def body(fmt, **kw):
+        return b"".join(exports.encode(exports.iter_rows(engine, cols, chunk=3), fmt, cols, **kw))
+
+    rows = list(csv.DictReader(io.StringIO(body("csv", flush_bytes=10).decode())))
+    assert len(rows) == 7 and rows[-1] == {"vin": "V0", "year": "2000"}
+    assert [json.loads(l)["vin"] for l in body("ndjson").splitlines()][:2] == ["V6", "V5"]
+    assert len(json.loads(body("json"))) == 7
+    zipped = b"".join(exports.gzip_stream(iter([body("ndjson")[:20], body("ndjson")[20:]])))
+    assert gzip.decompress(zipped) == body("ndjson")
+    empty = b"".join(exports.encode(iter(()), "json", cols))
+    assert json.loads(empty) == []
+
+
+def test_legacy_detail_columns_are_exported_once(engine):
+    _seed(engine)
+    with engine.begin() as conn:
+        # a database from before the car_details split keeps stale copies
+        conn.exec_driver_sql("ALTER TABLE cars ADD COLUMN description TEXT")
+        conn.exec_driver_sql("UPDATE cars SET description = 'stale'")
+    cols = exports.pick_columns(exports.car_columns(engine), None)
+    assert len(cols) == len(set(cols)) and cols.count("description") == 1
+    rows = list(exports.iter_rows(engine, cols))
+    assert rows[0]["description"] == "desc 6"
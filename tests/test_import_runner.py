@@ -0,0 +1,191 @@
+import json, pathlib, sys
+
+from sqlmodel import Session, select
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car, ImportJob
+
+import jobs
+
+
+def _queue(engine, source, input_path=None):
+    with Session(engine) as s:
+        job = ImportJob(source=source, status="queued", created="now", input_path=input_path)
+        s.add(job)
+        s.commit()
+        return job.id
+
+
+def test_runner_executes_queued_json_job(engine, tmp_path):
+    path = tmp_path / "cars.json"
+    path.write_text(json.dumps([{"vin": f"V{i}", "make": "M"} for i in range(3)] + [{"make": "no vin"}]))
+    jid = _queue(engine, "json", str(path))
+
+    runner = jobs.ImportRunner(engine)
+    assert runner.run_pending() == 1
+
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "finished"
+        assert (job.total_items, job.created_items) == (4, 3)
+        assert job.started_at and job.finished_at
+        assert "1 skipped" in job.log
+        assert len(s.exec(select(Car)).all()) == 3
+
+
+def test_claim_is_exclusive_and_respects_running_limit(engine):
+    first = _queue(engine, "json")
+    _queue(engine, "json")
+
+    job = jobs.claim_next(engine, max_running=1)
+    assert job["id"] == first
+    # the limit is global: nothing else may start while one job runs
+    assert jobs.claim_next(engine, max_running=1) is None
+    assert jobs.claim_next(engine, max_running=2)["id"] == first + 1
+
+
+def test_uploads_and_dead_jobs_do_not_hold_the_running_slot(engine, tmp_path):
+    path = tmp_path / "cars.json"
+    path.write_text("[]")
+    with Session(engine) as s:
+        s.add(ImportJob(source=jobs.UPLOAD_SOURCE, status="running", created="now",
+                        started_at="2020-01-01T00:00:00+00:00", cancellable=False))
+        s.add(ImportJob(source="json", status="running", created="now", input_path=str(path),
+                        heartbeat_at="2020-01-01T00:00:00+00:00"))
+        s.commit()
+    queued = _queue(engine, "json")
+    assert jobs.claim_next(engine, max_running=1)["id"] == queued
+
+    # At start-up the crashed job is requeued and the dead upload failed.
+    assert jobs.reap_stale(engine, 300) == (1, 1)
+    with Session(engine) as s:
+        assert [j.status for j in s.exec(select(ImportJob).order_by(ImportJob.id))] == [
+            "failed", "queued", "running",
+        ]
+
+
+def test_cancel_is_noticed_between_batches(engine):
+    jid = _queue(engine, "slow")
+    batches = []
+
+    def slow(ctx):
+        for n in range(10):
+            batches.append(n)
+            if n == 1:
+                with Session(engine) as s:
+                    job = s.get(ImportJob, ctx.job_id)
+                    job.status = "cancelled"
+                    s.add(job)
+                    s.commit()
+            ctx.progress(total_items=n + 1)
+
+    runner = jobs.ImportRunner(engine, handlers={"slow": slow})
+    runner.run_pending()
+    assert batches == [0, 1]
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "cancelled"
+        assert job.total_items == 2
+
+
+def test_unknown_source_fails_job(engine):
+    jid = _queue(engine, "mystery")
+    jobs.ImportRunner(engine).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "failed"
+        assert "Unknown import source" in job.errors
+
+
+def test_cancelled_job_resumes_from_checkpoint(engine, tmp_path, monkeypatch):
+    import functools
+    monkeypatch.setattr(jobs, "CarImport", functools.partial(jobs.CarImport, batch_size=10))
+    path = tmp_path / "cars.json"
+    path.write_text(json.dumps([{"vin": f"V{i}", "make": "Mé"} for i in range(25)], indent=1))
+    jid = _queue(engine, "json", str(path))
+
+    def cancel_after_first_batch(ctx, created, updated):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE import_jobs SET status = 'cancelled' WHERE id = ?", (ctx.job_id,))
+
+    jobs.ImportRunner(engine, on_batch=cancel_after_first_batch).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "cancelled"
+        assert job.total_items == 10 and job.checkpoint_offset > 0 and job.input_digest
+        job.status = "queued"
+        s.add(job)
+        s.commit()
+
+    jobs.ImportRunner(engine).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "finished"
+        assert (job.total_items, job.created_items) == (25, 25)
+        assert "Resumed after item 10" in job.log
+        assert len(s.exec(select(Car)).all()) == 25
+
+
+def test_resume_refuses_a_changed_file(engine, tmp_path):
+    path = tmp_path / "cars.json"
+    path.write_text(json.dumps([{"vin": "A"}, {"vin": "B"}]))
+    with Session(engine) as s:
+        job = ImportJob(source="json", status="queued", created="now", input_path=str(path),
+                        input_digest="stale", checkpoint_offset=12, total_items=1)
+        s.add(job)
+        s.commit()
+        jid = job.id
+    jobs.ImportRunner(engine).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "failed"
+        assert "changed since the checkpoint" in job.errors
+
+
+def test_resume_restores_every_counter(engine, tmp_path, monkeypatch):
+    import functools
+    monkeypatch.setattr(jobs, "CarImport", functools.partial(jobs.CarImport, batch_size=10))
+    with Session(engine) as s:
+        s.add_all([Car(vin=f"V{i}", make="M") for i in range(5)])
+        s.commit()
+    path = tmp_path / "cars.json"
+    items = [{"vin": f"V{i}", "make": "M"} for i in range(20)] + [{"make": "no vin"}] * 5
+    path.write_text(json.dumps(items, indent=1))
+    jid = _queue(engine, "json", str(path))
+
+    def cancel_after_first_batch(ctx, created, updated):
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE import_jobs SET status = 'cancelled' WHERE id = ?", (ctx.job_id,))
+
+    jobs.ImportRunner(engine, on_batch=cancel_after_first_batch).run_pending()
+    with engine.begin() as conn:
+        assert conn.exec_driver_sql(
+            "SELECT unchanged_items FROM import_jobs WHERE id = ?", (jid,)
+        ).scalar() == 5
+        conn.exec_driver_sql("UPDATE import_jobs SET status = 'queued' WHERE id = ?", (jid,))
+
+    jobs.ImportRunner(engine).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "finished"
+        assert (job.total_items, job.created_items, job.unchanged_items, job.skipped_items) == (25, 15, 5, 5)
+
+
+def test_heartbeat_keeps_a_slow_job_fresh(engine):
+    import time
+    jid = _queue(engine, "slow")
+    beats = []
+
+    def slow(ctx):
+        for _ in range(3):
+            time.sleep(0.1)
+            with Session(engine) as s:
+                beats.append(s.get(ImportJob, ctx.job_id).heartbeat_at)
+
+    jobs.ImportRunner(engine, handlers={"slow": slow}, stale_seconds=0.15).run_pending()
+    # No progress() calls, yet the heartbeat kept moving while the handler ran.
+    assert len(set(beats)) == 3
+    with Session(engine) as s:
+        assert s.get(ImportJob, jid).status == "finished"
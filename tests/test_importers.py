@@ -0,0 +1,146 @@
+import json, pathlib, sys
+
+from sqlmodel import Session, select
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car, ImportJob
+
+import importers
+import jobs
+
+SCRAPED = {
+    "url": "https://carsandbids.com/auctions/3oYB6aMa/2014-porsche-cayman?ref=x",
+    "title": "2014 Porsche Cayman S Black Edition",
+    "carMark": "Porsche",
+    "model": "Cayman",
+    "offer": {"currency": "USD", "price": "29,000"},
+    "mileage": "78,000",
+    "status": "Clean (CA)",
+    "location": {"address": "San Jose, CA 95112"},
+    "drivetrain": "Rear-wheel drive",
+    "transmission": "Automatic (7-Speed)",
+    "bodyStayle": "Coupe",
+    "highlightsList": ["One owner", " ", "PDK"],
+    "seller": {"name": "bob", "rating": "4.5", "reviews": "12"},
+    "images": ["a.jpg", "b.jpg"],
+}
+
+
+def test_shared_normalization():
+    row = importers.get_source("carsandbids")(SCRAPED)
+    assert (row["make"], row["model"], row["year"]) == ("Porsche", "Cayman", 2014)
+    assert (row["price"], row["mileage"]) == (29000.0, 78000)
+    assert (row["city"], row["state"]) == ("San Jose", "CA")
+    assert (row["drivetrain"], row["transmission"], row["body_type"]) == ("RWD", "automatic", "coupe")
+    assert row["trim"] == "S Black Edition"
+    assert row["lot_number"] == "3oYB6aMa"
+    assert row["highlights"] == "One owner • PDK"
+    assert (row["seller_rating"], row["seller_reviews"]) == (4.5, 12)
+    assert row["source"] == "carsandbids"
+    assert importers.get_source("carsandbids")({"title": "no price"}) is None
+
+
+def test_adapters_differ_only_where_the_feed_does():
+    porsche = importers.get_source("porsche")(dict(SCRAPED, carMark="Porshe"))
+    assert porsche["make"] == "Porsche" and porsche["source"] == "porsche_json"
+    plain = {"vin": "X1", "make": "Ford", "model": "Mustang"}
+    assert importers.get_source("json")(plain) is plain
+    assert importers.get_source("json")(SCRAPED)["source"] == "json_import"
+
+
+def test_db_sink_upserts(engine):
+    items = [SCRAPED, dict(SCRAPED, url="https://carsandbids.com/auctions/ZZ/x"), {"junk": 1}]
+    counts = importers.run("carsandbids", items, importers.DbSink(engine))
+    assert (counts["inserted"], counts["rejected"]) == (2, 1)
+    counts = importers.run("carsandbids", items, importers.DbSink(engine))
+    assert (counts["inserted"], counts["unchanged"]) == (0, 2)
+    with Session(engine) as s:
+        cars = s.exec(select(Car)).all()
+        assert len(cars) == 2
+        assert {c.image_url for c in cars} == {"a.jpg"}
+
+
+def test_every_adapter_is_a_job_source(engine, tmp_path):
+    assert set(importers.SOURCES) <= set(jobs.HANDLERS)
+    path = tmp_path / "dump.json"
+    path.write_text(json.dumps([SCRAPED, {"title": "incomplete"}]))
+    with Session(engine) as s:
+        job = ImportJob(source="porsche", status="queued", created="now", input_path=str(path))
+        s.add(job)
+        s.commit()
+        jid = job.id
+    jobs.ImportRunner(engine).run_pending()
+    with Session(engine) as s:
+        job = s.get(ImportJob, jid)
+        assert job.status == "finished"
+        assert (job.total_items, job.created_items) == (2, 1)
+        assert s.exec(select(Car)).one().make == "Porsche"
+
+
+class ListSink:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def close(self):
+        return {"inserted": len(self.rows)}
+
+
+def test_parallel_normalization_keeps_input_order():
+    items = [dict(SCRAPED, vin=f"V{i}") if i % 7 else {"junk": i} for i in range(250)]
+    serial, parallel = ListSink(), ListSink()
+    importers.run("carsandbids", items, serial)
+    stats = importers.StageStats(workers=2)
+    counts = importers.run("carsandbids", items, parallel, workers=2, chunk_size=16, stats=stats)
+    strip = lambda rows: [{k: v for k, v in r.items() if k != "posted_at"} for r in rows]
+    assert strip(parallel.rows) == strip(serial.rows)
+    assert counts == {"inserted": 214, "rejected": 36}
+    assert stats.items == 250
+    assert set(stats.rates()) == {"parse", "normalize", "write", "total"}
+
+
+def test_http_sink_retries_with_a_stable_batch_id():
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            rows = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            seen.append((self.headers["Idempotency-Key"], len(rows)))
+            if len(seen) == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps({"inserted": len(rows)}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *a):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        sink = importers.HttpSink(
+            f"http://127.0.0.1:{server.server_port}", batch_size=100, concurrency=2,
+            backoff=0.01, min_batch=10,
+        )
+        for i in range(250):
+            sink.add({"vin": f"V{i}"})
+        counts = sink.close()
+    finally:
+        server.shutdown()
+    assert counts["inserted"] == 250 and counts["failed"] == 0
+    assert counts["retries"] == 1
+    # the retried batch went out again under the same id
+    assert seen[0][0] in [key for key, _ in seen[1:]]
+    assert len({n for _, n in seen}) > 1  # batch size adapted (shrunk after the 503)
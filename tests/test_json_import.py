@@ -5,6 +5,8 @@ if 'sqlmodel' in sys.modules:
 real_sqlmodel = importlib.import_module("sqlmodel")
 sys.modules['sqlmodel'] = real_sqlmodel
 from sqlmodel import SQLModel, Session, create_engine, select
+from sqlalchemy import text
+from sqlalchemy.pool import StaticPool
 
 ROOT = pathlib.Path(__file__).resolve().parent.parent
 
@@ -15,6 +17,10 @@ settings = types.SimpleNamespace(
     ADMIN_DATABASE_URL="sqlite://",
     UPLOAD_DIR="uploads",
     SECRET_KEY="test",
+    CORS_ORIGINS=["*"],
+    CORS_ALLOW_CREDENTIALS=True,
+    LIVE_BUFFER_BYTES=256 << 10,
+    LIVE_HEARTBEAT_SECONDS=15.0,
 )
 sys.modules['backend_settings'] = types.SimpleNamespace(settings=settings)
 sys.path.append(str(ROOT))
@@ -23,7 +29,8 @@ sys.path.append(str(ROOT))
 (ROOT / "uploads").mkdir(exist_ok=True)
 (ROOT / "templates").mkdir(exist_ok=True)
 
-engine = create_engine("sqlite://", connect_args={"check_same_thread": False})
+# One shared connection: import batches are written from the threadpool.
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
 
 
 def _init_db():
@@ -97,3 +104,375 @@ def test_json_import_uses_images_field_for_hero_and_gallery():
         car = s.exec(select(Car)).first()
         assert car.image_url == "hero.jpg"
         assert json.loads(car.images_json) == ["gallery1.jpg", "gallery2.jpg"]
+
+
+def test_json_array_parser_handles_split_chunks():
+    from ingest import JSONArrayParser
+    data = json.dumps([{"vin": "A", "n": 12345}, 678, {"vin": "B", "t": "x,]"}])
+    parser = JSONArrayParser()
+    items = []
+    for i in range(0, len(data), 3):
+        items += parser.feed(data[i:i + 3])
+    items += parser.close()
+    assert items == [{"vin": "A", "n": 12345}, 678, {"vin": "B", "t": "x,]"}]
+
+
+def test_json_import_records_job_progress_and_audits_in_batches():
+    _init_db()
+    data = [{"vin": f"V{i}", "make": "M", "model": "X"} for i in range(5)] + ["junk"]
+    upload = app_module.UploadFile(filename="cars.json", file=io.BytesIO(json.dumps(data).encode("utf-8")))
+    asyncio.run(app_module.admin_cars_import(DummyRequest(), csrf="tok", file=upload, _=True))
+    from backend.models import ImportJob, AdminAudit
+    with Session(engine) as s:
+        job = s.exec(select(ImportJob)).one()
+        assert job.status == "finished"
+        assert job.total_items == 6
+        assert job.created_items == 5
+        audits = s.exec(select(AdminAudit).where(AdminAudit.table_name == "cars")).all()
+        assert len(audits) == 5
+
+
+def test_json_import_rejects_non_array():
+    _init_db()
+    upload = app_module.UploadFile(filename="cars.json", file=io.BytesIO(b'{"vin": "X"}'))
+    req = DummyRequest()
+    asyncio.run(app_module.admin_cars_import(req, csrf="tok", file=upload, _=True))
+    assert req.session["flash"][-1]["msg"] == "JSON must be an array of objects"
+    from backend.models import ImportJob
+    with Session(engine) as s:
+        assert s.exec(select(ImportJob)).one().status == "failed"
+
+
+def test_json_import_updates_only_changed_rows():
+    _init_db()
+    data = [
+        {"vin": "A1", "make": "Porsche", "model": "911", "price": 100000, "number_of_bids": 3},
+        {"vin": "B2", "make": "Porsche", "model": "Cayman", "price": 50000},
+    ]
+    upload = app_module.UploadFile(filename="cars.json", file=io.BytesIO(json.dumps(data).encode("utf-8")))
+    asyncio.run(app_module.admin_cars_import(DummyRequest(), csrf="tok", file=upload, _=True))
+
+    data[0]["price"] = 105000.0
+    data[0]["number_of_bids"] = 4
+    data[1]["model"] = " Cayman "  # whitespace-only difference
+    upload = app_module.UploadFile(filename="cars.json", file=io.BytesIO(json.dumps(data).encode("utf-8")))
+    req = DummyRequest()
+    asyncio.run(app_module.admin_cars_import(req, csrf="tok", file=upload, _=True))
+
+    from backend.models import ImportJob
+    with Session(engine) as s:
+        job = s.exec(select(ImportJob).order_by(ImportJob.id.desc())).first()
+        assert (job.created_items, job.updated_items) == (0, 1)
+        assert "1 unchanged" in job.log
+        a1 = s.exec(select(Car).where(Car.vin == "A1")).one()
+        assert a1.price == 105000 and a1.number_of_bids == 4
+        assert len(s.exec(select(Car)).all()) == 2
+
+
+class StreamRequest(DummyRequest):
+    def __init__(self, body: bytes, content_type="application/json"):
+        super().__init__()
+        self.headers = {"content-type": content_type}
+        self._body = body
+
+    async def stream(self):
+        for i in range(0, len(self._body), 7):
+            yield self._body[i:i + 7]
+
+
+def test_cars_bulk_upserts_by_natural_key():
+    _init_db()
+    rows = [
+        {"vin": "bv1", "make": "M", "price": 1},
+        {"source": "bat", "lot_number": "77", "make": "N"},
+        {"url": "https://ex.com/a?utm=1", "make": "O"},
+        {"make": "no key"},
+    ]
+    res = asyncio.run(app_module.cars_bulk(StreamRequest(json.dumps(rows).encode()), _=True))
+    assert res == {"inserted": 3, "updated": 0, "unchanged": 0, "skipped": 1}
+
+    rows[0]["vin"] = "BV1"  # same key, case-insensitive
+    rows[0]["price"] = 2
+    rows[2]["url"] = "https://ex.com/a"  # same key, but the stored url changes
+    body = "\n".join(json.dumps(r) for r in rows[:3]).encode()
+    res = asyncio.run(app_module.cars_bulk(StreamRequest(body, "application/x-ndjson"), _=True))
+    assert res == {"inserted": 0, "updated": 2, "unchanged": 1, "skipped": 0}
+    with Session(engine) as s:
+        cars = s.exec(select(Car)).all()
+        assert len(cars) == 3
+        assert next(c for c in cars if c.natural_key == "vin:BV1").price == 2
+
+
+def test_keys_keep_listing_ids_and_legacy_duplicates_stay_editable():
+    from ingest import natural_key
+    assert natural_key({"url": "https://ex.com/l?id=7&utm_source=x&fbclid=y#top"}) == "url:https://ex.com/l?id=7"
+    assert natural_key({"url": "https://ex.com/l?id=8"}) != natural_key({"url": "https://ex.com/l?id=7"})
+    _init_db()
+    with Session(engine) as s:
+        s.add(Car(vin="DUP", make="M", price=1))
+        s.commit()
+    with engine.begin() as conn:  # what backfill leaves for a legacy duplicate
+        conn.execute(text("INSERT INTO cars (vin, make, price, posted_ts, end_ts, deleted_ts) "
+                          "VALUES ('DUP', 'M', 2, 0, 0, 0)"))
+    with Session(engine) as s:
+        legacy = s.get(Car, 2)
+        legacy.auction_status = "SOLD"
+        s.commit()
+        assert legacy.natural_key is None and s.get(Car, 1).natural_key == "vin:DUP"
+
+
+def test_cars_bulk_rejects_invalid_payload():
+    _init_db()
+    res = asyncio.run(app_module.cars_bulk(StreamRequest(b'{"vin": "X"}'), _=True))
+    assert res.status_code == 400
+
+
+def test_cars_bulk_replays_a_retried_batch():
+    _init_db()
+    body = json.dumps([{"vin": "R1", "make": "M"}]).encode()
+    req = StreamRequest(body)
+    req.headers["idempotency-key"] = "batch-1"
+    first = asyncio.run(app_module.cars_bulk(req, _=True))
+    req = StreamRequest(body)
+    req.headers["idempotency-key"] = "batch-1"
+    again = asyncio.run(app_module.cars_bulk(req, _=True))
+    assert first["inserted"] == 1
+    assert json.loads(again.body)["inserted"] == 1
+    assert again.headers["idempotent-replayed"] == "true"
+
+
+def test_failed_import_job_can_be_resumed(tmp_path):
+    _init_db()
+    from backend.models import ImportJob
+    path = tmp_path / "cars.json"
+    path.write_text("[]")
+    with Session(engine) as s:
+        s.add(ImportJob(source="json", status="failed", created="now", input_path=str(path),
+                        checkpoint_offset=1, cancellable=False))
+        s.add(ImportJob(source="json", status="finished", created="now", input_path=str(path)))
+        s.commit()
+    req = DummyRequest()
+    app_module.admin_import_resume(req, 1, csrf="tok", _=True)
+    app_module.admin_import_resume(req, 2, csrf="tok", _=True)
+    assert [f["msg"] for f in req.session["flash"]] == ["Import resumed", "Job cannot be resumed"]
+    with Session(engine) as s:
+        job = s.get(ImportJob, 1)
+        assert job.status == "queued" and job.cancellable and job.checkpoint_offset == 1
+
+
+def test_merge_duplicates_fills_gaps_and_retires_the_rest():
+    _init_db()
+    import dedup
+    desc = "Numbers matching flat six, recent major service, clean carfax, two owners from new"
+    with Session(engine) as s:
+        s.add(Car(source="a", lot_number="1", title="1995 Porsche 993", description=desc, year=1995))
+        s.add(Car(source="b", lot_number="2", title="1995 Porsche 993", description=desc, year=1995,
+                  mileage=61000, exterior_color="Red"))
+        s.commit()
+    with engine.begin() as conn:
+        rows = conn.exec_driver_sql(
+            "SELECT id, title, description, year, mileage FROM cars JOIN car_details ON car_id = id"
+        ).mappings().all()
+        dedup.index_rows(conn, [(r["id"], r) for r in rows])
+        assert dedup.clusters(conn) == [[1, 2]]
+    app_module.admin_duplicates_merge(DummyRequest(), csrf="tok", ids="1,2", keep=1, _=True)
+    with Session(engine) as s:
+        kept, gone = s.get(Car, 1), s.get(Car, 2)
+        assert (kept.mileage, kept.exterior_color, kept.source) == (61000, "Red", "a")
+        assert kept.deleted_at is None and gone.deleted_at
+    with engine.connect() as conn:
+        assert dedup.clusters(conn) == []
+
+
+def test_change_feed_covers_every_write_path():
+    _init_db()
+    with Session(engine) as s:
+        s.add(Car(vin="C1", make="M"))
+        s.add(Car(vin="C2", make="M"))
+        s.commit()
+    feed = app_module.car_changes(since=0)
+    assert [c["vin"] for c in feed["upserted"]] == ["C1", "C2"]
+    assert feed["deleted"] == [] and not feed["more"]
+    since = feed["next"]
+
+    asyncio.run(app_module.cars_bulk(
+        StreamRequest(json.dumps([{"vin": "C2", "make": "N"}, {"vin": "C3"}]).encode()), _=True
+    ))
+    app_module.admin_car_delete(DummyRequest(), 1, _=True)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM cars WHERE vin = 'C3'")
+
+    page = app_module.car_changes(since=since, limit=2)
+    assert [c["make"] for c in page["upserted"]] == ["N"] and page["deleted"] == [1]
+    assert page["more"]
+    rest = app_module.car_changes(since=page["next"])
+    assert rest["upserted"] == [] and rest["deleted"] == [3] and not rest["more"]
+    assert app_module.car_changes(since=rest["next"])["next"] == rest["next"]
+
+
+def test_cars_stream_sends_ready_then_deltas():
+    async def scenario():
+        resp = await app_module.cars_stream(DummyRequest(), ids="1", status=None)
+        body = resp.body_iterator
+        ready = await body.__anext__()
+        app_module.broadcaster.on_changes({1: {"id": 1, "price": 5}, 2: {"id": 2, "price": 6}}, [], 9)
+        delta = await body.__anext__()
+        await body.aclose()
+        return ready, delta
+
+    ready, delta = asyncio.run(scenario())
+    assert "event: ready" in ready
+    assert delta.startswith("event: car") and '"id":1' in delta and '"id":2' not in delta
+    assert len(app_module.broadcaster) == 0
+
+
+def test_typed_columns_drive_listing_order_and_ranges():
+    _init_db()
+    with Session(engine) as s:
+        s.add(Car(vin="OLD", posted_at="2024-01-01T00:00:00", seller_rating="4.9", seller_reviews="1,200"))
+        s.add(Car(vin="NEW", posted_at="2025-01-01T00:00:00+00:00", seller_rating=3.0,
+                  end_time="2025-01-05T00:00:00Z"))
+        s.add(Car(vin="GONE", posted_at="2026-01-01T00:00:00", deleted_at="2026-02-01T00:00:00"))
+        s.commit()
+        old = s.exec(select(Car).where(Car.vin == "OLD")).one()
+        assert old.seller_rating == 4.9 and old.seller_reviews == 1200 and old.posted_ts == 1704067200
+        assert s.exec(select(Car).where(Car.vin == "GONE")).one().deleted_ts > 0
+    assert [c["vin"] for c in app_module.list_cars(dealership_id=None)] == ["NEW", "OLD"]
+    assert [c["vin"] for c in app_module.list_cars(None, posted_after="2024-06-01")] == ["NEW"]
+    assert [c["vin"] for c in app_module.list_cars(None, min_rating=4.0)] == ["OLD"]
+    assert [c["vin"] for c in app_module.list_cars(None, ends_before="1736200000")] == ["NEW"]
+
+
+def test_long_text_lives_in_car_details():
+    from ingest import CarImport, read_details
+    _init_db()
+    imp = CarImport(engine, Car.model_fields.keys())
+    imp.add({"vin": "D1", "title": "T", "description": "long " * 500, "images": ["h.jpg", "g.jpg"]})
+    imp.flush()
+    with engine.connect() as conn:
+        cols = {r[1] for r in conn.exec_driver_sql("PRAGMA table_info(cars)")}
+        assert "description" not in cols and "images_json" not in cols
+        assert read_details(conn, [1])[1]["images_json"] == '["g.jpg"]'
+    listed = app_module.list_cars(dealership_id=None)[0]
+    assert "description" not in listed and listed["images"] == ["h.jpg"]
+    full = app_module.get_car("1")
+    assert full["description"].startswith("long") and full["images"] == ["h.jpg", "g.jpg"]
+    with Session(engine) as s:
+        car = s.get(Car, 1)
+        old_hash = car.content_hash
+        car.description = "short"
+        s.commit()
+        assert car.content_hash != old_hash
+
+
+def test_partial_reimport_keeps_fields_it_leaves_out():
+    from ingest import CarImport, content_hash, read_details
+    _init_db()
+    full = {"vin": "P1", "make": "Porsche", "price": 90000, "description": "air cooled",
+            "seller_name": "Ann", "city": "Austin", "end_time": "2025-01-05T00:00:00Z"}
+    imp = CarImport(engine, Car.model_fields.keys())
+    imp.add(full)
+    imp.flush()
+    imp = CarImport(engine, Car.model_fields.keys())
+    imp.add({"vin": "P1", "price": 85000})
+    imp.flush()
+    assert imp.counts()["updated"] == 1
+    with Session(engine) as s:
+        car = s.exec(select(Car).where(Car.vin == "P1")).one()
+        assert (car.make, car.price, car.seller_name, car.city) == ("Porsche", 85000, "Ann", "Austin")
+        assert car.end_ts == 1736035200
+        with engine.connect() as conn:
+            assert read_details(conn, [car.id])[car.id]["description"] == "air cooled"
+        # The hash covers the merged row: a full import of the same data is a no-op.
+        assert car.content_hash == content_hash({**full, "price": 85000})
+    imp = CarImport(engine, Car.model_fields.keys())
+    imp.add({**full, "price": 85000})
+    imp.flush()
+    assert imp.counts()["unchanged"] == 1
+
+
+def test_admin_export_streams_with_filters(tmp_path, monkeypatch):
+    # the body is read on a worker thread, which an in-memory DB would not share
+    file_engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    SQLModel.metadata.create_all(file_engine)
+    monkeypatch.setattr(app_module, "engine", file_engine)
+    with Session(file_engine) as s:
+        s.add(Car(vin="E1", make="Porsche", year=1995, description="air cooled"))
+        s.add(Car(vin="E2", make="BMW", year=2001))
+        s.commit()
+
+    async def collect(resp):
+        return b"".join([chunk async for chunk in resp.body_iterator])
+
+    resp = app_module.admin_cars_export(fmt="ndjson", columns="vin,description", gzip=True, q="Porsche",
+                                        make_id=None, car_model_id=None, category_id=None, status=None,
+                                        year_min=None, year_max=None, _=True)
+    assert resp.media_type == "application/gzip"
+    import gzip
+    lines = gzip.decompress(asyncio.run(collect(resp))).decode().splitlines()
+    assert [json.loads(l) for l in lines] == [{"vin": "E1", "description": "air cooled"}]
+
+
+def test_market_analytics_filters_by_status_and_window():
+    _init_db()
+    with Session(engine) as s:
+        for i, status in enumerate(["SOLD", "SOLD", "LIVE"]):
+            s.add(Car(vin=f"M{i}", make="Porsche", model="911", year=1997, auction_status=status,
+                      price=50_000 + 10_000 * i, posted_at=f"2023-0{i + 1}-15T00:00:00"))
+        s.commit()
+    kw = dict(make="porsche", model=None, year_min=1990, year_max=None, posted_before=None,
+              ended_after=None, ended_before=None, min_count=1, limit=10)
+    group = app_module.market_analytics(status="sold", posted_after="2023-01-01", **kw)["groups"][0]
+    assert (group["count"], group["price_median"], group["sold_through"]) == (2, 55_000, 1.0)
+    group = app_module.market_analytics(status=None, posted_after="2023-02-01", **kw)["groups"][0]
+    assert (group["count"], group["live"], group["price_p90"]) == (2, 1, 69_000)
+
+
+def test_list_cars_filters_sorts_and_pages_with_or_without_columnar(monkeypatch):
+    import catalog
+    _init_db()
+    with Session(engine) as s:
+        for i, (make, price, trans) in enumerate(
+            [("Porsche", 30, "Manual"), ("BMW", 10, "Automatic"), ("Porsche", 20, "manual"), ("Porsche", None, "Manual")]
+        ):
+            s.add(Car(vin=f"L{i}", make=make, price=price, transmission=trans, posted_at=f"2024-0{i + 1}-01"))
+        s.commit()
+    index = catalog.ColumnarCatalog()
+    index.load(engine)
+    for idx in (None, index):
+        monkeypatch.setattr(app_module, "catalog_index", idx)
+        page = app_module.list_cars(None, make="porsche", transmission="MANUAL", sort="price_asc",
+                                    page=1, page_size=2)
+        assert [c["vin"] for c in page["items"]] == ["L2", "L0"] and page["total"] == 3
+        assert [c["vin"] for c in app_module.list_cars(None, price_max=25)] == ["L2", "L1"]
+        assert [c["vin"] for c in app_module.list_cars(None, q="BMW")] == ["L1"]
+
+
+def _legacy_schema(monkeypatch):
+    """A pre-split database after startup copied its details to car_details."""
+    import backend.db as real_db
+    from ingest import DETAIL_FIELDS
+    _init_db()
+    with engine.begin() as conn:
+        for f in DETAIL_FIELDS:
+            conn.exec_driver_sql(f"ALTER TABLE cars ADD COLUMN {f} TEXT")
+        conn.exec_driver_sql(
+            "INSERT INTO cars (vin, make, description, images_json) "
+            "VALUES ('OLD1', 'Porsche', 'legacy text', '[\"a.jpg\"]')"
+        )
+    monkeypatch.setattr(real_db, "engine", engine)
+    real_db.split_car_details()
+
+
+def test_reads_skip_legacy_detail_columns(monkeypatch):
+    _legacy_schema(monkeypatch)
+    since = app_module.car_changes(since=0)["next"]
+    with Session(engine) as s:
+        s.get(Car, 1).description = "edited text"
+        s.commit()
+    assert app_module.get_car("1")["description"] == "edited text"
+    changed = app_module.car_changes(since=since)["upserted"]
+    assert [c["vin"] for c in changed] == ["OLD1"] and "description" not in changed[0]
+    listed = app_module._list_cars_sql({}, "newest", 0, None)[0]
+    assert "description" not in listed[0] and "images_json" not in listed[0]
+    assert "description" not in app_module._cars_by_ids([1])[0]
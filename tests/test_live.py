@@ -0,0 +1,115 @@
+import asyncio, json, pathlib, sys, threading
+
+from sqlmodel import SQLModel, Session, create_engine
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car
+
+import live
+
+
+def _frames(text):
+    return [json.loads(line[6:]) for line in text.splitlines() if line.startswith("data: ")]
+
+
+def test_tailer_pushes_compact_deltas_to_matching_subscribers(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'live.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Car(vin="A", auction_status="LIVE", price=100, number_of_bids=1))
+        s.add(Car(vin="B", auction_status="SOLD", price=50))
+        s.commit()
+    tailer = live.ChangeTailer(engine)
+    bus = live.Broadcaster()
+    live.attach(tailer, bus)
+
+    async def scenario():
+        everything = bus.subscribe()
+        only_live = bus.subscribe(status="LIVE")
+        only_b = bus.subscribe(ids=[2])
+        # the tailer runs on its own thread in the app
+        await asyncio.to_thread(tailer.poll)
+        await everything.ready.wait()
+        first = _frames(everything.drain(tailer.seq))
+        assert [f["id"] for f in first] == [1, 2] and first[0]["price"] == 100
+        assert [f["id"] for f in _frames(only_live.drain(0))] == [1]
+        assert [f["id"] for f in _frames(only_b.drain(0))] == [2]
+        assert list(bus._last) == [1]  # only live auctions are diffed
+
+        with engine.begin() as conn:
+            conn.exec_driver_sql("UPDATE cars SET price = 110, number_of_bids = 2 WHERE id = 1")
+            conn.exec_driver_sql("UPDATE cars SET auction_status = 'ENDED' WHERE id = 1")
+            conn.exec_driver_sql("UPDATE cars SET deleted_at = 'now', deleted_ts = 1 WHERE id = 2")
+        await asyncio.to_thread(tailer.poll)
+        await everything.ready.wait()
+        assert _frames(everything.drain(tailer.seq)) == [
+            {"id": 1, "auction_status": "ENDED", "price": 110, "number_of_bids": 2},
+            {"id": 2, "deleted": True},
+        ]
+        # leaving the watched status is still reported
+        assert [f["id"] for f in _frames(only_live.drain(0))] == [1]
+        assert _frames(only_b.drain(0)) == [{"id": 2, "deleted": True}]
+        assert bus._last == {}
+        bus.unsubscribe(only_b)
+        assert len(bus) == 2
+
+    asyncio.run(scenario())
+
+
+def test_slow_subscriber_coalesces_then_resets():
+    async def scenario():
+        sub = live.Subscriber(budget=200)
+        for price in range(50):
+            delta = {"id": 1, "price": price}
+            sub.push(1, delta, json.dumps(delta))
+        assert len(sub.pending) == 1 and _frames(sub.drain(7)) == [{"id": 1, "price": 49}]
+        for i in range(50):
+            delta = {"id": i, "price": i}
+            sub.push(i, delta, json.dumps(delta))
+        assert sub.overflowed and sub.size == 0
+        frame = sub.drain(7)
+        assert frame.startswith("event: reset") and _frames(frame) == [{"seq": 7}]
+        sub.push(3, {"id": 3}, '{"id":3}')
+        assert _frames(sub.drain(7)) == [{"id": 3}]
+
+    asyncio.run(scenario())
+
+
+def test_status_filter_ignores_feed_casing():
+    async def scenario():
+        bus = live.Broadcaster()
+        only_live = bus.subscribe(status="LIVE")
+        bus.on_changes({1: {"auction_status": "Live", "price": 1}, 2: {"auction_status": "Sold"}}, [], 1)
+        await asyncio.wait_for(only_live.ready.wait(), 1)
+        first = _frames(only_live.drain(1))
+        assert [(f["id"], f["auction_status"]) for f in first] == [(1, "Live")]
+        bus.on_changes({1: {"auction_status": "sold", "price": 1}}, [], 2)
+        await asyncio.wait_for(only_live.ready.wait(), 1)
+        assert _frames(only_live.drain(2)) == [{"id": 1, "auction_status": "sold"}]
+        assert bus._last == {}
+
+    asyncio.run(scenario())
+
+
+def test_tailer_compacts_the_change_log(engine):
+    with Session(engine) as s:
+        s.add(Car(vin="A", auction_status="LIVE", price=100))
+        s.commit()
+    with engine.begin() as conn:
+        for price in range(101, 111):
+            conn.exec_driver_sql(f"UPDATE cars SET price = {price}")
+    tailer = live.ChangeTailer(engine, compact_interval=0.01)
+    tailer.start(since=0)
+    try:
+        for _ in range(200):
+            with engine.connect() as conn:
+                rows = conn.exec_driver_sql("SELECT seq FROM car_changes").all()
+            if len(rows) == 1:
+                break
+            tailer.poke()
+            threading.Event().wait(0.01)
+    finally:
+        tailer.stop()
+    assert rows == [(11,)]
@@ -0,0 +1,38 @@
+import asyncio, pathlib, sys
+
+from starlette.middleware.sessions import SessionMiddleware
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from middleware import PathScoped
+
+
+def test_session_only_under_scoped_prefixes():
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen[scope["path"]] = "session" in scope
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    stack = PathScoped(app, SessionMiddleware, ("/admin", "/stats/runtime"), secret_key="k")
+
+    async def get(path):
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            pass
+
+        await stack({"type": "http", "method": "GET", "path": path, "headers": []}, receive, send)
+
+    async def scenario():
+        for path in ("/admin", "/admin/cars", "/stats/runtime", "/cars", "/administrator", "/assets/a.js"):
+            await get(path)
+
+    asyncio.run(scenario())
+    assert seen == {
+        "/admin": True, "/admin/cars": True, "/stats/runtime": True,
+        "/cars": False, "/administrator": False, "/assets/a.js": False,
+    }
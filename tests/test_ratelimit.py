@@ -0,0 +1,68 @@
+import asyncio, pathlib, sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+import ratelimit
+
+TRUSTED = ratelimit.networks(["127.0.0.1", "10.0.0.0/8"])
+
+
+def test_client_ip_follows_only_trusted_hops():
+    ip = ratelimit.client_ip
+    assert ip("203.0.113.5", None, TRUSTED) == "203.0.113.5"
+    # An untrusted peer cannot pick its own address.
+    assert ip("203.0.113.5", "1.2.3.4", TRUSTED) == "203.0.113.5"
+    assert ip("127.0.0.1", "198.51.100.7", TRUSTED) == "198.51.100.7"
+    # A spoofed hop in front of the real client is ignored.
+    assert ip("127.0.0.1", "1.2.3.4, 198.51.100.7, 10.1.2.3", TRUSTED) == "198.51.100.7"
+    assert ip("127.0.0.1", "10.0.0.9, 10.1.2.3", TRUSTED) == "10.0.0.9"
+    assert ip("test", "1.2.3.4", TRUSTED) == "test"
+
+
+def test_buckets_are_shared_between_limiters(tmp_path):
+    path = str(tmp_path / "rl.db")
+    limits = {"list": (2.0, 3), "login": (0.1, 1)}
+    a = ratelimit.RateLimiter(path, limits)
+    b = ratelimit.RateLimiter(path, limits)  # another worker
+    t = 1000.0
+    assert [a.hit("list", "1.1.1.1", t), b.hit("list", "1.1.1.1", t), a.hit("list", "1.1.1.1", t)] == [0, 0, 0]
+    assert b.hit("list", "1.1.1.1", t) == 0.5  # empty; one token every half second
+    assert a.hit("list", "2.2.2.2", t) == 0  # per IP
+    assert a.hit("admin", "1.1.1.1", t) == 0  # unlimited group
+    assert a.hit("list", "1.1.1.1", t + 0.5) == 0  # refilled
+    assert a.hit("list", "1.1.1.1", t + 0.5) > 0
+    assert a.hit("login", "1.1.1.1", t) == 0 and a.hit("login", "1.1.1.1", t) == 10
+    assert b.stats() == {"limited": {"list": 1, "login": 0}}
+    assert ratelimit.RateLimiter(None, limits).hit("list", "1.1.1.1") == 0
+
+
+def test_middleware_answers_429_with_retry_after(tmp_path):
+    limiter = ratelimit.RateLimiter(str(tmp_path / "rl.db"), {"login": (0.5, 1)}, TRUSTED)
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append(scope["path"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    mw = ratelimit.RateLimit(app, limiter)
+
+    async def call(peer, forwarded=None):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        scope = {"type": "http", "method": "POST", "path": "/admin/login", "client": (peer, 1), "headers": headers}
+        await mw(scope, None, send)
+        return sent[0]
+
+    async def scenario():
+        assert (await call("127.0.0.1", "198.51.100.7"))["status"] == 200
+        refused = await call("127.0.0.1", "198.51.100.7")
+        assert refused["status"] == 429 and dict(refused["headers"])[b"retry-after"] == b"2"
+        assert (await call("127.0.0.1", "198.51.100.8"))["status"] == 200
+        assert len(seen) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,54 @@
+import pathlib, sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, Session, create_engine
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car, Dealership
+
+import rollups
+
+
+def _snapshot(conn):
+    return {
+        (r.dim, r.key): (r.cars, r.priced, round(r.price_sum, 2))
+        for r in conn.execute(text("SELECT * FROM car_rollups WHERE cars != 0"))
+    }
+
+
+def test_triggers_track_every_write_and_match_a_rebuild(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'r.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as s:
+        s.add(Dealership(id=1, name="Lot"))
+        s.add(Car(vin="A", source="bat", price=100, auction_status="LIVE", dealership_id=1,
+                  posted_at="2024-05-01T10:00:00"))
+        s.add(Car(vin="B", source="bat", price=300, auction_status="SOLD", posted_at="2024-05-02T10:00:00"))
+        s.add(Car(vin="C", source="cab", price=None, posted_at="2024-05-02T11:00:00"))
+        s.commit()
+        a, c = s.get(Car, 1), s.get(Car, 3)
+        a.price, a.source = 200, "cab"
+        c.deleted_at = "2024-06-01T00:00:00"
+        s.commit()
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE cars SET auction_status = 'ENDED' WHERE vin = 'A'"))
+        conn.execute(text("DELETE FROM cars WHERE vin = 'B'"))
+        conn.execute(text("INSERT INTO cars (vin, source, price, posted_ts, deleted_ts) VALUES ('D', 'bat', 50, 0, 0)"))
+
+    with engine.begin() as conn:
+        live = _snapshot(conn)
+        assert live[("all", "")] == (2, 2, 250)
+        assert live[("source", "cab")] == (1, 1, 200) and live[("source", "bat")] == (1, 1, 50)
+        assert live[("status", "ENDED")] == (1, 1, 200) and ("status", "SOLD") not in live
+        assert live[("day", "2024-05-01")] == (1, 1, 200) and ("day", "2024-05-02") not in live
+        rollups.rebuild(conn)
+        assert _snapshot(conn) == live
+
+        stats = rollups.summary(conn, days=30, now=datetime(2024, 5, 5, tzinfo=timezone.utc))
+    assert (stats["total"], stats["avg_price"], stats["new_7d"]) == (2, 125, 1)
+    assert stats["latest"] == "2024-05-01T10:00:00"
+    assert stats["by_day"] == [{"key": "2024-05-01", "cars": 1, "avg_price": 200}]
+    assert {"key": "1", "cars": 1, "avg_price": 200, "name": "Lot"} in stats["by_dealership"]
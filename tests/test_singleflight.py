@@ -0,0 +1,60 @@
+import pathlib, sys, threading, time
+
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from singleflight import SingleFlight
+
+
+def _burst(flights, key, fn, n=20):
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flights.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, errors
+
+
+def test_identical_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    runs = []
+    release = threading.Event()
+
+    def slow():
+        runs.append(1)
+        release.wait(2)
+        return {"id": 1}
+
+    threading.Timer(0.2, release.set).start()
+    results, errors = _burst(flights, "car:1", slow)
+    assert not errors and len(runs) == 1
+    assert len(results) == 20 and all(r is results[0] for r in results)
+    assert flights.stats() == {"executed": 1, "coalesced": 19, "in_flight": 0}
+
+    # Finished flights are not cached: the next call runs again.
+    assert flights.do("car:1", lambda: "again") == "again"
+    assert flights.stats()["executed"] == 2
+
+
+def test_errors_reach_every_waiter_and_keys_are_independent():
+    flights = SingleFlight()
+
+    def boom():
+        time.sleep(0.1)
+        raise LookupError("nope")
+
+    results, errors = _burst(flights, "car:404", boom, n=5)
+    assert not results and len(errors) == 5 and all(isinstance(e, LookupError) for e in errors)
+    with pytest.raises(ValueError):
+        flights.do("other", lambda: int("x"))
+    assert flights.do("other", lambda: 3) == 3
@@ -0,0 +1,100 @@
+import pathlib, sys
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+from sqlalchemy import text
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT))
+
+from backend.models import Car
+
+import textpack
+from ingest import DETAIL_FIELDS, read_details, write_details
+
+BOILERPLATE = (
+    "This car is offered on a clean title. The seller reports no accidents. "
+    "Service records are included. Please review the photos and inspection report.\n"
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 't.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    textpack.configure("off")
+
+
+def test_pack_roundtrip_and_small_values():
+    textpack.configure("zlib")
+    try:
+        long = BOILERPLATE * 5
+        packed = textpack.pack(long)
+        assert isinstance(packed, bytes) and len(packed) < len(long)
+        assert textpack.unpack(packed) == long
+        assert textpack.pack("short") == "short"
+        assert textpack.unpack("plain text") == "plain text"
+    finally:
+        textpack.configure("off")
+    assert textpack.pack(long) == long
+
+
+def test_orm_details_are_stored_compressed(engine):
+    textpack.configure("zlib", engine=engine)
+    with Session(engine) as s:
+        s.add(Car(vin="Z1", description=BOILERPLATE * 10))
+        s.commit()
+    with engine.connect() as conn:
+        kind, = conn.execute(text("SELECT typeof(description) FROM car_details")).one()
+        assert kind == "blob"
+        assert read_details(conn, [1])[1]["description"] == BOILERPLATE * 10
+    with Session(engine) as s:
+        assert s.get(Car, 1).description == BOILERPLATE * 10
+
+
+def test_dictionary_mode_and_repack(engine):
+    with Session(engine) as s:
+        for i in range(20):
+            s.add(Car(vin=f"V{i}", source="feed", description=f"Lot {i}. " + BOILERPLATE))
+        s.commit()
+    textpack.configure("dict", engine=engine)
+    dict_id = textpack.train(engine, "feed", DETAIL_FIELDS)
+    assert dict_id
+    rows, before, after = textpack.repack(engine, DETAIL_FIELDS)
+    assert rows == 20 and after < before / 2
+    with engine.begin() as conn:
+        raw, = conn.execute(text("SELECT description FROM car_details WHERE car_id = 3")).one()
+        assert raw[:1] == b"\x02"
+        write_details(conn, [(21, {"source": "feed", "description": "Lot 21. " + BOILERPLATE})])
+    # a fresh process only knows dictionaries by id
+    textpack._dicts.clear()
+    textpack._by_source.clear()
+    with engine.connect() as conn:
+        got = read_details(conn, [3, 21])
+    assert got[3]["description"] == "Lot 2. " + BOILERPLATE
+    assert got[21]["description"].startswith("Lot 21.")
+
+
+def test_orm_writes_use_the_source_dictionary(engine):
+    with Session(engine) as s:
+        for i in range(20):
+            s.add(Car(vin=f"V{i}", source="feed", description=f"Lot {i}. " + BOILERPLATE))
+        s.commit()
+    textpack.configure("dict", engine=engine)
+    assert textpack.train(engine, "feed", DETAIL_FIELDS)
+    with Session(engine) as s:
+        s.add(Car(vin="NEW", source="feed", description="Lot 99. " + BOILERPLATE))
+        edited = s.get(Car, 1)
+        edited.description = "Lot 0, relisted. " + BOILERPLATE
+        s.commit()
+        # The session keeps seeing text, not the stored bytes.
+        assert edited.details.description.startswith("Lot 0, relisted.")
+    with engine.connect() as conn:
+        stored = dict(conn.execute(text("SELECT car_id, description FROM car_details WHERE car_id IN (1, 21)")).all())
+        assert stored[1][:1] == stored[21][:1] == b"\x02"
+        # Untouched rows are not rewritten.
+        raw, = conn.execute(text("SELECT description FROM car_details WHERE car_id = 2")).one()
+        assert isinstance(raw, str)
+    with Session(engine) as s:
+        assert s.get(Car, 21).description == "Lot 99. " + BOILERPLATE